@@ -22,6 +22,8 @@ from nupic.support.consoleprinter import ConsolePrinterMixin
 from nupic.bindings.math import Random
 from nupic.bindings.algorithms import isSegmentActive, getSegmentActivityLevel
 
+from htmresearch.support.temporal_memory_stats import StreamingPredictionStats
+
 # Default verbosity while running unit tests
 VERBOSITY = 0
 
@@ -38,6 +40,12 @@ class TM(ConsolePrinterMixin):
   a column confidence measure.
   """
 
+  # Instances pickled before the segment update queue could be bounded
+  maxSegmentUpdates = None
+
+  # Weight of the newest prediction in the moving averages of getStats()
+  statsDecay = 0.01
+
   ##############################################################################
   # todo: Have some higher level flags for fast learning, HiLo, Pooling, etc.
   def __init__(self,
@@ -55,6 +63,7 @@ class TM(ConsolePrinterMixin):
                maxAge = 1,
                globalDecay=0.05,
                segUpdateValidDuration =5,
+               maxSegmentUpdates =None,
                burnIn =2,             # Used for evaluating the prediction score
                collectStats =False,    # If true, collect training and inference stats
                seed =42,
@@ -97,6 +106,10 @@ class TM(ConsolePrinterMixin):
                   good predictor in the last maxAge iterations. All the synapses
                   will be decreased by globalDecay
 
+    @param maxSegmentUpdates Maximal number of pending segment updates. When the
+                  queue is full the oldest updates are dropped first. None
+                  means unbounded.
+
     @param burnIn Used for evaluating the prediction score. Default is 2.
 
     @param collectStats If True, collect training / inference stats. Default is
@@ -130,6 +143,7 @@ class TM(ConsolePrinterMixin):
     self.globalDecay = numpy.float32(globalDecay)
     self.activationThreshold = activationThreshold
     self.segUpdateValidDuration = segUpdateValidDuration
+    self.maxSegmentUpdates = maxSegmentUpdates
     self.burnIn = burnIn
     self.collectStats = collectStats
     self.seed = seed
@@ -205,8 +219,12 @@ class TM(ConsolePrinterMixin):
     """
     return [
       'segmentUpdates',
+      '_segmentUpdateBuckets',
+      '_numSegmentUpdates',
       '_internalStats',
       '_stats',
+      '_streamingStats',
+      '_predictState',
       ]
 
   #############################################################################
@@ -219,10 +237,14 @@ class TM(ConsolePrinterMixin):
     # later during learning, when the cell gets bottom-up activation.
     # We store one list per cell. The lists are identified with a hash key which
     # is a tuple (column index, cell index).
-    self.segmentUpdates = {}
+    self._resetSegmentUpdates()
 
     self.sequenceSignatures = []
 
+    # Scratch copies of the dynamic state used by predict(), allocated on first
+    # use
+    self._predictState = None
+
     # Allocate and reset all stats
     self.resetStats()
 
@@ -322,7 +344,7 @@ class TM(ConsolePrinterMixin):
     self.confidence['t'].fill(0)
 
     # Flush the segment update queue
-    self.segmentUpdates = {}
+    self._resetSegmentUpdates()
 
     self._internalStats['nInfersSinceReset'] = 0
 
@@ -376,6 +398,10 @@ class TM(ConsolePrinterMixin):
     self._internalStats['totalMissing'] = 0
     self._internalStats['totalExtra'] = 0
 
+    # Per column counters and moving averages, updated with the totals above
+    self._streamingStats = StreamingPredictionStats(self.numberOfCols,
+                                                    self.statsDecay)
+
     # Sequence signature statistics. Note that we don't reset the sequence
     # signature list itself.
     self._internalStats['prevSequenceSignature'] = None
@@ -417,6 +443,11 @@ class TM(ConsolePrinterMixin):
       prevSequenceSignature:  signature for the sequence immediately preceding the
                               last reset. 'None' if collectSequenceStats is False
 
+      predictionScoreEma, falseNegativeEma, falsePositiveEma, pctMissingEma,
+      pctExtraEma:            exponential moving averages of the per prediction
+                              scores, see statsDecay
+
+    Per column counters are returned by getStatsSnapshot().
     """
 
     if not self.collectStats:
@@ -449,9 +480,29 @@ class TM(ConsolePrinterMixin):
     # This will be None if collectSequenceStats is False
     self._stats['prevSequenceSignature'] = self._internalStats['prevSequenceSignature']
 
+    for name, value in self._streamingStats.averages.iteritems():
+      self._stats[name + 'Ema'] = value
+
     return self._stats
 
 
+  ################################################################################
+  def getStatsSnapshot(self):
+    """ Return a copy of the streaming prediction stats collected since the
+    last resetStats(), or None if collectStats is False. This is a dict with:
+
+      numUpdates:       the number of predictions, as nPredictions in getStats()
+      averages:         dict of exponential moving averages, by score name
+      activeCounts, predictedCounts, correctCounts:
+                        per column counts of how often the column was active,
+                        predicted, and both.
+    """
+    if not self.collectStats:
+      return None
+
+    return self._streamingStats.snapshot()
+
+
   ################################################################################
   def _updateStatsInferEnd(self, stats, bottomUpNZ, predictedState, confidence):
     """ Called at the end of learning and inference, this routine will update
@@ -472,14 +523,28 @@ class TM(ConsolePrinterMixin):
 
 
     # Compute the prediction score, how well the prediction from the last
-    #  time step predicted the current bottom-up input
-    patternsToCheck = [bottomUpNZ]
-    (numExtra2, numMissing2, confidences2) = self.checkPrediction2(
-                                  patternNZs = [bottomUpNZ],
-                                  output = predictedState,
-                                  confidence = confidence)
-    predictionScore, positivePredictionScore, negativePredictionScore = \
-                                                          confidences2[0]
+    #  time step predicted the current bottom-up input. This gives the same
+    #  scores as checkPrediction2(), but only indexes the active and predicted
+    #  columns.
+    activeColumns = numpy.unique(numpy.asarray(bottomUpNZ, dtype=numpy.int64))
+    predictedColumns = numpy.flatnonzero(predictedState.any(axis=1))
+    numCorrect = len(numpy.intersect1d(activeColumns, predictedColumns,
+                                       assume_unique=True))
+    numExtra2 = len(predictedColumns) - numCorrect
+    numMissing2 = len(activeColumns) - numCorrect
+
+    colConfidence = self.columnConfidences(confidence)
+    positivePredictionSum = colConfidence[activeColumns].sum()
+    negativePredictionSum = colConfidence.sum() - positivePredictionSum
+    negativeColumnCount = len(colConfidence) - len(activeColumns)
+
+    positivePredictionScore = 0.0
+    if len(activeColumns) != 0:
+      positivePredictionScore = positivePredictionSum / len(activeColumns)
+    negativePredictionScore = 0.0
+    if negativeColumnCount != 0:
+      negativePredictionScore = negativePredictionSum / negativeColumnCount
+    predictionScore = positivePredictionScore - negativePredictionScore
 
     # Store the stats that don't depend on burn-in
     stats['curPredictionScore2'] = float(predictionScore)
@@ -502,27 +567,38 @@ class TM(ConsolePrinterMixin):
     # Burn-in related stats
     stats['nPredictions'] += 1
     numExpected = max(1.0, float(len(bottomUpNZ)))
+    pctExtra = 100.0 * numExtra2 / numExpected
+    pctMissing = 100.0 * numMissing2 / numExpected
 
     stats['totalMissing'] += numMissing2
     stats['totalExtra'] += numExtra2
-    stats['pctExtraTotal'] += 100.0 * numExtra2 / numExpected
-    stats['pctMissingTotal'] += 100.0 * numMissing2 / numExpected
+    stats['pctExtraTotal'] += pctExtra
+    stats['pctMissingTotal'] += pctMissing
     stats['predictionScoreTotal2'] += float(predictionScore)
     stats['falseNegativeScoreTotal'] += 1.0 - float(positivePredictionScore)
     stats['falsePositiveScoreTotal'] += float(negativePredictionScore)
 
+    self._streamingStats.update(
+      activeColumns, predictedColumns,
+      predictionScore=float(predictionScore),
+      falseNegative=1.0 - float(positivePredictionScore),
+      falsePositive=float(negativePredictionScore),
+      pctMissing=pctMissing,
+      pctExtra=pctExtra)
+
     if self.collectSequenceStats:
       # Collect cell confidences for every cell that correctly predicted current
-      # bottom up input. Normalize confidence across each column
-      cc = self.confidence['t-1'] * self.activeState['t']
+      # bottom up input. Normalize confidence across each column. Only the
+      # active columns can have active cells.
+      cc = self.confidence['t-1'][activeColumns] * \
+           self.activeState['t'][activeColumns]
       sconf = cc.sum(axis=1)
-      for c in range(self.numberOfCols):
-        if sconf[c] > 0:
-          cc[c,:] /= sconf[c]
+      normalized = sconf > 0
+      cc[normalized] /= sconf[normalized, numpy.newaxis]
 
       # Update cell confidence histogram: add column-normalized confidence
       # scores to the histogram
-      self._internalStats['confHistogram'] += cc
+      self._internalStats['confHistogram'][activeColumns] += cc
 
 
   ################################################################################
@@ -837,6 +913,25 @@ class TM(ConsolePrinterMixin):
              + ", seq seg=" + str(self.sequenceSegment) \
              + ", phase1=" + str(self.phase1Flag)
 
+  ################################################################################
+  def _resetSegmentUpdates(self):
+    """
+    Empty the segment update queue.
+
+    Pending updates are indexed twice. self.segmentUpdates maps each cell to its
+    list of (creationDate, SegmentUpdate), oldest first. The ring
+    self._segmentUpdateBuckets holds one [creationDate, set of cells] bucket per
+    learning iteration that can still have live updates, so expiring or
+    evicting old updates only visits the cells that have them. Buckets are
+    cleaned up lazily: a cell may stay in a bucket after its updates from that
+    iteration were applied.
+    """
+    self.segmentUpdates = {}
+    self._segmentUpdateBuckets = [[None, set()] for _ in
+                                  xrange(self.segUpdateValidDuration + 2)]
+    self._numSegmentUpdates = 0
+
+
   ################################################################################
   def addToSegmentUpdates(self, c, i, segUpdate):
     """
@@ -849,14 +944,92 @@ class TM(ConsolePrinterMixin):
     if segUpdate is None or len(segUpdate.activeSynapses) == 0:
       return
 
+    self._queueSegmentUpdate(c, i, segUpdate)
+
+
+  ################################################################################
+  def _queueSegmentUpdate(self, c, i, segUpdate):
+    """
+    Append a segment update to the queue, dated with the current learning
+    iteration, dropping the oldest updates if the queue is over
+    maxSegmentUpdates.
+    """
     key = (c,i) # key = (column index, cell index in column)
+    createDate = self.lrnIterationIdx
 
     # todo: scan list of updates for that cell and consolidate?
     # But watch out for dates!
-    if self.segmentUpdates.has_key(key):
-      self.segmentUpdates[key] += [(self.lrnIterationIdx, segUpdate)]
+    self.segmentUpdates.setdefault(key, []).append((createDate, segUpdate))
+    self._numSegmentUpdates += 1
+
+    bucket = self._segmentUpdateBuckets[createDate %
+                                        len(self._segmentUpdateBuckets)]
+    if bucket[0] != createDate:
+      # The ring holds one more iteration than an update stays valid, so
+      # anything left in this slot is from an iteration that has expired
+      self._expireSegmentUpdateBucket(bucket)
+      bucket[0] = createDate
+    bucket[1].add(key)
+
+    if self.maxSegmentUpdates is not None:
+      while self._numSegmentUpdates > self.maxSegmentUpdates:
+        self._dropOldestSegmentUpdate()
+
+
+  ################################################################################
+  def _setSegmentUpdates(self, key, updateList):
+    """Replace the pending updates of a cell, keeping the count in sync."""
+    self._numSegmentUpdates += (len(updateList) -
+                                len(self.segmentUpdates.get(key, ())))
+    if updateList:
+      self.segmentUpdates[key] = updateList
     else:
-      self.segmentUpdates[key] = [(self.lrnIterationIdx, segUpdate)]
+      self.segmentUpdates.pop(key, None)
+
+
+  ################################################################################
+  def _expireSegmentUpdateBucket(self, bucket):
+    """
+    Drop the updates created on or before the iteration of a bucket from the
+    cells in it, and empty the bucket.
+    """
+    createDate, keys = bucket
+    for key in keys:
+      updateList = self.segmentUpdates.get(key)
+      if updateList is not None and updateList[0][0] <= createDate:
+        self._setSegmentUpdates(key, [update for update in updateList
+                                      if update[0] > createDate])
+    bucket[0] = None
+    keys.clear()
+
+
+  ################################################################################
+  def _expireSegmentUpdates(self):
+    """Drop the updates older than segUpdateValidDuration."""
+    if self._numSegmentUpdates == 0:
+      return
+
+    for bucket in self._segmentUpdateBuckets:
+      if (bucket[0] is not None and
+          self.iterationIdx - bucket[0] > self.segUpdateValidDuration):
+        self._expireSegmentUpdateBucket(bucket)
+
+
+  ################################################################################
+  def _dropOldestSegmentUpdate(self):
+    """Drop one update from the oldest iteration that still has any."""
+    for bucket in sorted((b for b in self._segmentUpdateBuckets
+                          if b[0] is not None), key=lambda b: b[0]):
+      createDate, keys = bucket
+      while keys:
+        key = keys.pop()
+        updateList = self.segmentUpdates.get(key)
+        if updateList is not None and updateList[0][0] <= createDate:
+          self._setSegmentUpdates(key, updateList[1:])
+          if len(updateList) > 1 and updateList[1][0] <= createDate:
+            keys.add(key)
+          return
+      bucket[0] = None
 
 
   ################################################################################
@@ -874,7 +1047,9 @@ class TM(ConsolePrinterMixin):
     # Key is stored in segUpdate itself...
     key = (segUpdate.columnIdx, segUpdate.cellIdx)
 
-    self.segmentUpdates[key].remove(updateInfo)
+    updateList = list(self.segmentUpdates[key])
+    updateList.remove(updateInfo)
+    self._setSegmentUpdates(key, updateList)
 
   #############################################################################
   def computeOutput(self):
@@ -927,7 +1102,7 @@ class TM(ConsolePrinterMixin):
     from the current TP state. The TP is returned to its original state at the
     end before returning.
 
-    1) We save the TP state.
+    1) We fork the TP state.
     2) Loop for nSteps
           a) Turn-on with lateral support from the current active cells
           b) Set the predicted cells as the next step's active cells. This step
@@ -935,6 +1110,11 @@ class TM(ConsolePrinterMixin):
              We don't use any input here.
     3) Revert back the TP state to the time before prediction
 
+    Only the state that changes during the lookahead (active and predicted
+    states, and confidences) is forked, into reused scratch arrays. Segments
+    and the learn state are only read and are shared. Reverting just points
+    the TP back at its original arrays.
+
     Parameters:
     --------------------------------------------
     nSteps:      The number of future time steps to be predicted
@@ -945,49 +1125,76 @@ class TM(ConsolePrinterMixin):
 
     """
 
-    # Save the TP dynamic state, we will use to revert back in the end
-    pristineTPDynamicState = self._getTPDynamicState()
-
     assert (nSteps>0)
 
     # multiStepColumnPredictions holds all the future prediction.
     multiStepColumnPredictions = numpy.zeros((nSteps, self.numberOfCols),
                                              dtype="float32")
 
-    # This is a (nSteps-1)+half loop. Phase 2 in both learn and infer methods
-    # already predicts for timestep (t+1). We use that prediction for free and save
-    # the half-a-loop of work.
+    # Phase 2 in both learn and infer methods already predicts for timestep
+    # (t+1). We use that prediction for free, without touching the state.
+    # We get the prediction for the columns in the next time step from
+    # the topDownCompute method. It internally uses confidences.
+    multiStepColumnPredictions[0,:] = self.topDownCompute()
+    if nSteps == 1:
+      return multiStepColumnPredictions
 
-    step = 0
-    while True:
+    # Fork the TP dynamic state, we will revert back to the original in the end
+    pristineTPDynamicState = self._forkTPDynamicState()
 
-      # We get the prediction for the columns in the next time step from
-      # the topDownCompute method. It internally uses confidences.
-      multiStepColumnPredictions[step,:] = self.topDownCompute()
+    try:
+      for step in xrange(1, nSteps):
+        # Copy t-1 into t
+        self.activeState['t-1'][:,:] = self.activeState['t'][:,:]
+        self.predictedState['t-1'][:,:] = self.predictedState['t'][:,:]
+        self.confidence['t-1'][:,:] = self.confidence['t'][:,:]
 
-      # Cleanest way in python to handle one and half loops
-      if step == nSteps-1:
-        break
-      step += 1
+        # Predicted state at "t-1" becomes the active state at "t"
+        self.activeState['t'][:,:] = self.predictedState['t-1'][:,:]
 
-      # Copy t-1 into t
-      self.activeState['t-1'][:,:] = self.activeState['t'][:,:]
-      self.predictedState['t-1'][:,:] = self.predictedState['t'][:,:]
-      self.confidence['t-1'][:,:] = self.confidence['t'][:,:]
+        # Predicted state and confidence are set in phase2.
+        self.predictedState['t'].fill(0)
+        self.confidence['t'].fill(0.0)
+        self.computePhase2(doLearn=False)
 
-      # Predicted state at "t-1" becomes the active state at "t"
-      self.activeState['t'][:,:] = self.predictedState['t-1'][:,:]
+        multiStepColumnPredictions[step,:] = self.topDownCompute()
 
-      # Predicted state and confidence are set in phase2.
-      self.predictedState['t'].fill(0)
-      self.confidence['t'].fill(0.0)
-      self.computePhase2(doLearn=False)
+    finally:
+      # Revert the dynamic state to the original state
+      self.__dict__.update(pristineTPDynamicState)
 
-    # Revert the dynamic state to the saved state
-    self._setTPDynamicState(pristineTPDynamicState)
+    return multiStepColumnPredictions
 
 
-    return multiStepColumnPredictions
+  #############################################################################
+  def _forkTPDynamicState(self):
+    """
+    Point the dynamic state variables that predict() changes at scratch
+    arrays. Only the 't' arrays are copied over; the lookahead overwrites the
+    't-1' arrays before reading them.
+
+    Parameters:
+    --------------------------------------------
+    retval:       A dict with the forked variable names as keys and the
+                  original state dicts as values.
+    """
+    variableNames = ["activeState", "predictedState", "confidence"]
+
+    if self._predictState is None:
+      self._predictState = dict(
+        (variableName, dict((key, numpy.empty_like(value)) for key, value
+                            in self.__dict__[variableName].iteritems()))
+        for variableName in variableNames)
+
+    pristineTPDynamicState = dict()
+    for variableName in variableNames:
+      pristine = self.__dict__[variableName]
+      fork = self._predictState[variableName]
+      fork['t'][:] = pristine['t']
+      pristineTPDynamicState[variableName] = pristine
+      self.__dict__[variableName] = fork
+
+    return pristineTPDynamicState
 
   #############################################################################
   def _getTPDynamicStateVariableNames(self,):
@@ -1520,12 +1727,11 @@ class TM(ConsolePrinterMixin):
     and that situation doesn't occur, by construction.
     todo: check if that situation occurs.
     """
-    for key, updateList in self.segmentUpdates.iteritems():
-      c,i = key[0], key[1]
-      if c == col and i == cellIdx:
-        for update in updateList:
-          if update[1].segment == seg:
-            self.removeSegmentUpdate(update)
+    key = (col, cellIdx)
+    if key in self.segmentUpdates:
+      self._setSegmentUpdates(key, [update for update
+                                    in self.segmentUpdates[key]
+                                    if update[1].segment != seg])
 
   ################################################################################
   def finishLearning(self):
@@ -1927,37 +2133,19 @@ class TM(ConsolePrinterMixin):
     """
 
     # =================================================================
-    # The segmentUpdates dict has keys which are the column,cellIdx of the
-    #  owner cell. The values are lists of segment updates for that cell
-    removeKeys = []
-    trimSegments = []
-    for key, updateList in self.segmentUpdates.iteritems():
-
-      # Get the column number and cell index of the owner cell
-      c,i = key[0], key[1]
+    # Expired updates are dropped a whole iteration at a time from the ring
+    # of buckets, so only the cells below have to be looked at
+    self._expireSegmentUpdates()
 
-      # Should we positively or negatively re-enforce the predicting synapses?
-      positiveReinforcement = None
-      if self.learnState['t'][c,i] == 1:
-        positiveReinforcement = True
-      elif self.predictedState['t'][c,i] == 0 \
-                                and self.predictedState['t-1'][c,i] == 1:
-        positiveReinforcement = False
+    trimSegments = []
+    for key, positiveReinforcement in self._getSegmentUpdateReinforcements():
 
       # Process each segment for this cell. Each segment entry contains
       #  [creationDate, SegmentInfo]
       updateListKeep = []
-      for (createDate, segUpdate) in updateList:
-
-        # Decide whether to apply the update now. If update has expired, then
-        # delete it. If update was created in Phase1 then apply immediately.
-        # Otherwise, if update was not created during this pass then apply now.
+      for (createDate, segUpdate) in self.segmentUpdates[key]:
 
-        if self.iterationIdx - createDate > self.segUpdateValidDuration:
-          # This segment has expired. Ignore this update (and hence remove it from list)
-          pass
-        elif (segUpdate.phase1Flag or
-             self.iterationIdx > createDate) and (positiveReinforcement is not None):
+        if self._isSegmentUpdateDue(createDate, segUpdate):
           trimSegment = self.adaptSegment(segUpdate, positiveReinforcement)
           if trimSegment:
             trimSegments.append((segUpdate.columnIdx, segUpdate.cellIdx,
@@ -1966,15 +2154,7 @@ class TM(ConsolePrinterMixin):
           # Keep all updates that don't match the above criteria
           updateListKeep.append((createDate,segUpdate))
 
-      self.segmentUpdates[key] = updateListKeep
-      if len(updateListKeep) == 0:
-        removeKeys.append(key)
-
-
-    # =====================================================================
-    # Clean out empty segment updates
-    for key in removeKeys:
-      self.segmentUpdates.pop(key)
+      self._setSegmentUpdates(key, updateListKeep)
 
     # =====================================================================
     # Trim segments that had synapses go to 0
@@ -1984,6 +2164,42 @@ class TM(ConsolePrinterMixin):
 
 
 
+  ################################################################################
+  def _getSegmentUpdateReinforcements(self):
+    """
+    Find the cells whose pending updates should be applied in this iteration.
+    Updates are positively re-enforced when the cell's learnState is set, and
+    negatively re-enforced when its predicted state just turned off.
+
+    @return (list) ((column index, cell index), positiveReinforcement) pairs
+                   for the cells with pending updates, in the order of
+                   self.segmentUpdates
+    """
+    if not self.segmentUpdates:
+      return []
+
+    learning = self.learnState['t'] == 1
+    turnedOff = ((self.predictedState['t'] == 0) &
+                 (self.predictedState['t-1'] == 1))
+
+    # Walk the queue rather than the cells so that updates are applied in the
+    # same order as before, which decides the ids of the segments they create
+    reinforcements = []
+    for key in self.segmentUpdates:
+      if learning[key] or turnedOff[key]:
+        reinforcements.append((key, bool(learning[key])))
+    return reinforcements
+
+
+  ################################################################################
+  def _isSegmentUpdateDue(self, createDate, segUpdate):
+    """
+    If an update was created in Phase1 then apply it immediately. Otherwise,
+    only apply it if it was not created during this pass.
+    """
+    return segUpdate.phase1Flag or self.iterationIdx > createDate
+
+
   ################################################################################
   def adaptSegment(self, segUpdate, positiveReinforcement):
     """This function applies segment update information to a segment in a
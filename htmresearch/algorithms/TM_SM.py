@@ -13,6 +13,7 @@ from numpy import *
 import sys
 import time
 import cPickle as pickle
+from collections import defaultdict
 from itertools import product
 import pprint
 import copy
@@ -36,6 +37,9 @@ class TM_SM(TM):
   TM_SM is a child class of TM, which implements pure sequence learning
   """
 
+  # Default for TM_SMs pickled before the sparse segment activity existed
+  sparseSegmentActivity = True
+
   ##############################################################################
   # todo: Have some higher level flags for fast learning, HiLo, Pooling, etc.
   def __init__(self,
@@ -55,6 +59,7 @@ class TM_SM(TM):
                maxAge = 1,
                globalDecay=0.05,
                segUpdateValidDuration =5,
+               maxSegmentUpdates =None,
                learnLateralConnections = False,
                learnDistalInputs = True,
                burnIn =2,             # Used for evaluating the prediction score
@@ -62,6 +67,7 @@ class TM_SM(TM):
                seed =42,
                learnOnOneCell=False,
                verbosity =VERBOSITY,
+               sparseSegmentActivity =True,
                ):
     """
     Construct the TM
@@ -102,6 +108,10 @@ class TM_SM(TM):
                   good predictor in the last maxAge iterations. All the synapses
                   will be decreased by globalDecay
 
+    @param maxSegmentUpdates Maximal number of pending segment updates. When the
+                  queue is full the oldest updates are dropped first. None
+                  means unbounded.
+
     @param burnIn Used for evaluating the prediction score. Default is 2.
 
     @param collectStats If True, collect training / inference stats. Default is
@@ -122,6 +132,12 @@ class TM_SM(TM):
 
     @param seed   seed for random number generator
 
+    @param sparseSegmentActivity If True, segment activity is only computed for
+                  the segments that have synapses from the active cells and
+                  distal inputs, found through an inverted index of the
+                  synapses. If False, every segment is scanned, as before the
+                  index existed. Both give the same results.
+
     """
 
     ConsolePrinterMixin.__init__(self, verbosity)
@@ -150,6 +166,7 @@ class TM_SM(TM):
     self.globalDecay = numpy.float32(globalDecay)
     self.activationThreshold = activationThreshold
     self.segUpdateValidDuration = segUpdateValidDuration
+    self.maxSegmentUpdates = maxSegmentUpdates
     self.burnIn = burnIn
     self.collectStats = collectStats
     self.seed = seed
@@ -159,6 +176,7 @@ class TM_SM(TM):
     self.learnDistalInputs = learnDistalInputs
     self.segUpdateValidDuration = 1
     self.learnOnOneCell = learnOnOneCell
+    self.sparseSegmentActivity = sparseSegmentActivity
 
     #---------------------------------------------------------------------------------
     # Create data structures
@@ -231,6 +249,32 @@ class TM_SM(TM):
     self._initEphemerals()
 
 
+  ################################################################################
+  def _getEphemeralMembers(self):
+    return TM._getEphemeralMembers(self) + [
+      '_presynapticIndex',
+      '_segmentCells',
+      '_activeDistalInputs',
+      ]
+
+
+  ################################################################################
+  def _initEphemerals(self):
+    TM._initEphemerals(self)
+
+    # Inverted index of the synapses, built from the cells on first use. See
+    # _getPresynapticIndex().
+    self._presynapticIndex = None
+    self._segmentCells = None
+
+    # Indices of the active distal inputs, derived once per compute from
+    # distalDendriticInput and shared by all the phases
+    self._activeDistalInputs = {}
+    for timeStep in ('t', 't-1'):
+      self._activeDistalInputs[timeStep] = numpy.flatnonzero(
+        self.distalDendriticInput[timeStep])
+
+
   ################################################################################
   def reset(self,):
     """ Reset the state of all cells.
@@ -253,9 +297,11 @@ class TM_SM(TM):
     self.confidence['t'].fill(0)
     self.distalDendriticInput['t-1'].fill(0)
     self.distalDendriticInput['t'].fill(0)
+    self._activeDistalInputs['t-1'] = numpy.zeros(0, dtype=numpy.int64)
+    self._activeDistalInputs['t'] = numpy.zeros(0, dtype=numpy.int64)
 
     # Flush the segment update queue
-    self.segmentUpdates = {}
+    self._resetSegmentUpdates()
 
     self._internalStats['nInfersSinceReset'] = 0
 
@@ -286,181 +332,6 @@ class TM_SM(TM):
     # record when the most recent reset
     self.iterationIdxreset = self.iterationIdx
 
-  ################################################################################
-  def resetStats(self):
-    """ Reset the learning and inference stats. This will usually be called by
-    user code at the start of each inference run (for a particular data set).
-    """
-    self._stats = dict()
-    self._internalStats = dict()
-
-    self._internalStats['nInfersSinceReset'] = 0
-    self._internalStats['nPredictions'] = 0
-
-    #New prediction score
-    self._internalStats['curPredictionScore2']     = 0
-    self._internalStats['predictionScoreTotal2']   = 0
-    self._internalStats['curFalseNegativeScore']   = 0
-    self._internalStats['falseNegativeScoreTotal'] = 0
-    self._internalStats['curFalsePositiveScore']   = 0
-    self._internalStats['falsePositiveScoreTotal'] = 0
-
-    self._internalStats['pctExtraTotal'] = 0
-    self._internalStats['pctMissingTotal'] = 0
-    self._internalStats['curMissing'] = 0
-    self._internalStats['curExtra'] = 0
-    self._internalStats['totalMissing'] = 0
-    self._internalStats['totalExtra'] = 0
-
-    # Sequence signature statistics. Note that we don't reset the sequence
-    # signature list itself.
-    self._internalStats['prevSequenceSignature'] = None
-    if self.collectSequenceStats:
-      self._internalStats['confHistogram'] = \
-          numpy.zeros((self.numberOfCols, self.cellsPerColumn), dtype="float32")
-
-
-  ################################################################################
-  def getStats(self):
-    """ Return the current learning and inference stats. This returns a dict
-    containing all the learning and inference stats we have collected since the
-    last resetStats(). If collectStats is False, then None is returned.
-
-    The following keys are returned in the dict when collectStats is True:
-
-      nPredictions:           the number of predictions. This is the total number
-                              of inferences excluding burn-in and the last
-                              inference.
-
-      curPredictionScore:     the score for predicting the current input (predicted
-                              during the previous inference)
-
-      curMissing:             the number of bits in the current input that were
-                              not predicted to be on.
-
-      curExtra:               the number of bits in the predicted output that are
-                              not in the next input
-
-      predictionScoreTotal:   the sum of every prediction score to date
-
-      predictionScoreAvg:     predictionScoreTotal / nPredictions
-
-      pctMissingTotal:        the total number of bits that were missed over all
-                              predictions
-
-      pctMissingAvg:          pctMissingTotal / nPredictions
-
-      prevSequenceSignature:  signature for the sequence immediately preceding the
-                              last reset. 'None' if collectSequenceStats is False
-
-    """
-
-    if not self.collectStats:
-      return None
-
-    self._stats['nPredictions'] = self._internalStats['nPredictions']
-    self._stats['curMissing'] = self._internalStats['curMissing']
-    self._stats['curExtra'] = self._internalStats['curExtra']
-    self._stats['totalMissing'] = self._internalStats['totalMissing']
-    self._stats['totalExtra'] = self._internalStats['totalExtra']
-
-    nPredictions = max(1, self._stats['nPredictions'])
-
-    #New prediction score
-    self._stats['curPredictionScore2'] = self._internalStats['curPredictionScore2']
-    self._stats['predictionScoreAvg2'] = self._internalStats['predictionScoreTotal2'] \
-                                         / nPredictions
-    self._stats['curFalseNegativeScore'] = self._internalStats['curFalseNegativeScore']
-    self._stats['falseNegativeAvg'] = self._internalStats['falseNegativeScoreTotal'] \
-                                      / nPredictions
-    self._stats['curFalsePositiveScore'] = self._internalStats['curFalsePositiveScore']
-    self._stats['falsePositiveAvg'] = self._internalStats['falsePositiveScoreTotal'] \
-                                      / nPredictions
-
-    self._stats['pctExtraAvg'] = self._internalStats['pctExtraTotal'] \
-                                   / nPredictions
-    self._stats['pctMissingAvg'] = self._internalStats['pctMissingTotal'] \
-                                   / nPredictions
-
-    # This will be None if collectSequenceStats is False
-    self._stats['prevSequenceSignature'] = self._internalStats['prevSequenceSignature']
-
-    return self._stats
-
-
-  ################################################################################
-  def _updateStatsInferEnd(self, stats, bottomUpNZ, predictedState, confidence):
-    """ Called at the end of learning and inference, this routine will update
-    a number of stats in our _internalStats dictionary, including:
-      1. Our computed prediction score
-      2. ...
-
-    Parameters:
-    ------------------------------------------------------------------
-    bottomUpNZ: list of the active bottom-up inputs
-
-    """
-
-    # Return if not collecting stats
-    if not self.collectStats:
-      return
-    stats['nInfersSinceReset'] += 1
-
-
-    # Compute the prediction score, how well the prediction from the last
-    #  time step predicted the current bottom-up input
-    patternsToCheck = [bottomUpNZ]
-    (numExtra2, numMissing2, confidences2) = self.checkPrediction2(
-                                  patternNZs = [bottomUpNZ],
-                                  output = predictedState,
-                                  confidence = confidence)
-    predictionScore, positivePredictionScore, negativePredictionScore = \
-                                                          confidences2[0]
-
-    # Store the stats that don't depend on burn-in
-    stats['curPredictionScore2'] = float(predictionScore)
-    stats['curFalseNegativeScore'] = 1.0 - float(positivePredictionScore)
-    stats['curFalsePositiveScore'] = float(negativePredictionScore)
-
-    stats['curMissing'] = numMissing2
-    stats['curExtra'] = numExtra2
-
-
-    # ----------------------------------------------------------------------
-    # If we are passed the burn-in period, update the accumulated stats
-    # Here's what various burn-in values mean:
-    #   0: try to predict the first element of each sequence and all subsequent
-    #   1: try to predict the second element of each sequence and all subsequent
-    #   etc.
-    if stats['nInfersSinceReset'] <= self.burnIn:
-      return
-
-    # Burn-in related stats
-    stats['nPredictions'] += 1
-    numExpected = max(1.0, float(len(bottomUpNZ)))
-
-    stats['totalMissing'] += numMissing2
-    stats['totalExtra'] += numExtra2
-    stats['pctExtraTotal'] += 100.0 * numExtra2 / numExpected
-    stats['pctMissingTotal'] += 100.0 * numMissing2 / numExpected
-    stats['predictionScoreTotal2'] += float(predictionScore)
-    stats['falseNegativeScoreTotal'] += 1.0 - float(positivePredictionScore)
-    stats['falsePositiveScoreTotal'] += float(negativePredictionScore)
-
-    if self.collectSequenceStats:
-      # Collect cell confidences for every cell that correctly predicted current
-      # bottom up input. Normalize confidence across each column
-      cc = self.confidence['t-1'] * self.activeState['t']
-      sconf = cc.sum(axis=1)
-      for c in range(self.numberOfCols):
-        if sconf[c] > 0:
-          cc[c,:] /= sconf[c]
-
-      # Update cell confidence histogram: add column-normalized confidence
-      # scores to the histogram
-      self._internalStats['confHistogram'] += cc
-
-
   ################################################################################
   # The following print functions for debugging.
   ################################################################################
@@ -623,32 +494,7 @@ class TM_SM(TM):
       and len(segUpdate.activeDistalSynapses)==0):
       return
 
-    key = (c,i) # key = (column index, cell index in column)
-
-    # todo: scan list of updates for that cell and consolidate?
-    # But watch out for dates!
-    if self.segmentUpdates.has_key(key):
-      self.segmentUpdates[key] += [(self.lrnIterationIdx, segUpdate)]
-    else:
-      self.segmentUpdates[key] = [(self.lrnIterationIdx, segUpdate)]
-
-
-  ################################################################################
-  def removeSegmentUpdate(self, updateInfo):
-    """Remove a segment update (called when seg update expires or is processed)
-
-    Parameters:
-    --------------------------------------------------------------
-    updateInfo:     (creationDate, SegmentUpdate)
-    """
-
-    # An updateInfo contains (creationDate, SegmentUpdate)
-    (creationDate, segUpdate) = updateInfo
-
-    # Key is stored in segUpdate itself...
-    key = (segUpdate.columnIdx, segUpdate.cellIdx)
-
-    self.segmentUpdates[key].remove(updateInfo)
+    self._queueSegmentUpdate(c, i, segUpdate)
 
 
   #############################################################################
@@ -668,39 +514,39 @@ class TM_SM(TM):
     # - if a segment has enough activity, either due to horizontal or distal
     # dendritic input, it's set to be predicting, and we queue up the segment
     #   for reinforcement,
-    for c in xrange(self.numberOfCols):
-
-      # Iterate over each cell in column
-      for i in xrange(self.cellsPerColumn):
-
-        # Iterate over each of the segments of this cell
-        maxConfidence = 0
-        for s in self.cells[c][i]:
-
-          # sum(connected synapses) >= activationThreshold?
-          if self.isSegmentActive(s, self.activeState['t'],
-                                  self.distalDendriticInput['t']):
-
-            self.predictedState['t'][c,i] = 1
-
-            if doLearn:
-              s.totalActivations += 1    # increment activationFrequency
-              s.lastActiveIteration = self.iterationIdx
-              # mark this segment for learning
-              activeUpdate = self.getSegmentActiveSynapses(c, i, s, 't')
-              activeUpdate.phase1Flag = False
-              self.addToSegmentUpdates(c, i, activeUpdate)
-
-            # if doLearn:
-            #   # penalize false alarm
-            #   if self.predictedState['t-1'][c][i]==1 and self.activeState['t'][c][i]==0:
-            #     activeUpdate = self.getSegmentActiveSynapses(c, i, s, 't-1')
-            #     activeUpdate.phase1Flag = False
-            #     self.addToSegmentUpdates(c, i, activeUpdate)
-
-        # Store the max confidence seen among all the weak and strong segments
-        #  as the cell's confidence.
-        self.confidence['t'][c,i] = maxConfidence
+    # Active segments come in column, cell and segment order either way
+    if self.sparseSegmentActivity:
+      activeSegments = self._getActiveSegments()
+    else:
+      activeSegments = ((c, i, s)
+                        for c, i in product(xrange(self.numberOfCols),
+                                            xrange(self.cellsPerColumn))
+                        for s in self.cells[c][i]
+                        if self.isSegmentActive(s, self.activeState['t'],
+                                                self.distalDendriticInput['t']))
+
+    for c, i, s in activeSegments:
+
+      self.predictedState['t'][c,i] = 1
+
+      if doLearn:
+        s.totalActivations += 1    # increment activationFrequency
+        s.lastActiveIteration = self.iterationIdx
+        # mark this segment for learning
+        activeUpdate = self.getSegmentActiveSynapses(c, i, s, 't')
+        activeUpdate.phase1Flag = False
+        self.addToSegmentUpdates(c, i, activeUpdate)
+
+      # if doLearn:
+      #   # penalize false alarm
+      #   if self.predictedState['t-1'][c][i]==1 and self.activeState['t'][c][i]==0:
+      #     activeUpdate = self.getSegmentActiveSynapses(c, i, s, 't-1')
+      #     activeUpdate.phase1Flag = False
+      #     self.addToSegmentUpdates(c, i, activeUpdate)
+
+    # Segment duty cycles aren't used as confidences here, so every cell has a
+    # confidence of 0
+    self.confidence['t'].fill(0)
 
 
   def compute(self, bottomUpInput, distalDendriticInput, enableLearn, computeInfOutput=None):
@@ -756,13 +602,12 @@ class TM_SM(TM):
     self.predictedState['t-1'][:,:] = self.predictedState['t'][:,:]
     self.confidence['t-1'][:,:] = self.confidence['t'][:,:]
     self.learnState['t-1'][:,:] = self.learnState['t'][:,:]
-    self.distalDendriticInput['t-1'][:,:] = self.distalDendriticInput['t'][:,:]
 
     self.activeState['t'].fill(0)
     self.predictedState['t'].fill(0)
     self.confidence['t'].fill(0.0)
     self.learnState['t'][:,:] = 0
-    self.distalDendriticInput['t'][:,0] = distalDendriticInput
+    self._shiftDistalInput(distalDendriticInput)
 
     # Phase 1: calculate current state for each cell
     # For each column (winning in the SP):
@@ -773,6 +618,9 @@ class TM_SM(TM):
     activeColumns = bottomUpInput.nonzero()[0]
     numUnpredictedColumns = 0
 
+    # Activity of the segments at t-1, for the columns that aren't predicted
+    prevSegmentOverlaps = None
+
     for c in activeColumns:
 
       # todo: cache this list when building it in iteration at t
@@ -808,8 +656,11 @@ class TM_SM(TM):
           i = self.getSeqLearnCell(c)
 
         if not i:
+          if prevSegmentOverlaps is None and self.sparseSegmentActivity:
+            prevSegmentOverlaps = self._getSegmentOverlaps('t-1')
           i,s = self.getBestMatchingCell(c,self.activeState['t-1'],
-                                         self.distalDendriticInput['t-1'])
+                                         self.distalDendriticInput['t-1'],
+                                         prevSegmentOverlaps)
 
           if s is not None and s.isSequenceSegment():
             s.totalActivations += 1      # activationFrequency
@@ -911,13 +762,12 @@ class TM_SM(TM):
     self.predictedState['t-1'][:,:] = self.predictedState['t'][:,:]
     self.confidence['t-1'][:,:] = self.confidence['t'][:,:]
     self.learnState['t-1'][:,:] = self.learnState['t'][:,:]
-    self.distalDendriticInput['t-1'][:,:] = self.distalDendriticInput['t'][:,:]
 
     self.activeState['t'].fill(0)
     self.predictedState['t'].fill(0)
     self.confidence['t'].fill(0.0)
     self.learnState['t'][:,:] = 0
-    self.distalDendriticInput['t'][:,0] = distalDendriticInput
+    self._shiftDistalInput(distalDendriticInput)
 
     # Phase 1: compute current state for each cell
     # For each column (winning in the SP):
@@ -933,6 +783,9 @@ class TM_SM(TM):
     activeColumns = bottomUpInput.nonzero()[0]
     numUnpredictedColumns = 0
 
+    # Activity of the segments at t-1, for the columns that aren't predicted
+    prevSegmentOverlaps = None
+
     for c in activeColumns:
 
       # todo: cache this list when building it in iteration at t
@@ -971,8 +824,11 @@ class TM_SM(TM):
           i = self.getSeqLearnCell(c)
 
         if not i:
+          if prevSegmentOverlaps is None and self.sparseSegmentActivity:
+            prevSegmentOverlaps = self._getSegmentOverlaps('t-1')
           i,s = self.getBestMatchingCell(c,self.activeState['t-1'],
-                                         self.distalDendriticInput['t-1'])
+                                         self.distalDendriticInput['t-1'],
+                                         prevSegmentOverlaps)
 
           if s is not None and s.isSequenceSegment():
             s.totalActivations += 1      # activationFrequency
@@ -985,8 +841,11 @@ class TM_SM(TM):
         else:
           # If we get back i, then we should find its best matching segment
           # if it exists
+          if prevSegmentOverlaps is None and self.sparseSegmentActivity:
+            prevSegmentOverlaps = self._getSegmentOverlaps('t-1')
           s = self.getBestMatchingSegment(c, i, self.activeState['t-1'],
-                                         self.distalDendriticInput['t-1'])
+                                         self.distalDendriticInput['t-1'],
+                                         prevSegmentOverlaps)
 
 
         self.learnState['seq'][c,i] = 1
@@ -1050,6 +909,9 @@ class TM_SM(TM):
           self.cleanUpdatesList(c,i,seg)
           self.cells[c][i].remove(seg)
 
+      # Rebuild the synapse index when it's next needed
+      self._presynapticIndex = None
+
 
     # Update the prediction score stats
     # Learning always includes inference
@@ -1114,6 +976,7 @@ class TM_SM(TM):
           for syn in dsynsToDel: # remove some synapses on segment
             segment.dsyns.remove(syn)
             ndSynsRemoved += 1
+        self._unindexSynapses(segment, synsToDel, dsynsToDel)
         if len(segment.syns)+len(segment.dsyns) < minNumSyns:
           segsToDel.append(segment)
 
@@ -1123,6 +986,7 @@ class TM_SM(TM):
     for seg in segsToDel: # remove some segments of this cell
       self.cleanUpdatesList(colIdx, cellIdx, seg)
       self.cells[colIdx][cellIdx].remove(seg)
+      self._unindexSegment(seg)
       nSynsRemoved += len(seg.syns)
 
     return nSegsRemoved, nSynsRemoved, ndSynsRemoved
@@ -1165,24 +1029,6 @@ class TM_SM(TM):
 
     return totalSegsRemoved, totalSynsRemoved
 
-  ################################################################################
-  def cleanUpdatesList(self, col, cellIdx, seg):
-    """
-    Removes any update that would be for the given col, cellIdx, segIdx.
-    NOTE: logically, we need to do this when we delete segments, so that if
-    an update refers to a segment that was just deleted, we also remove
-    that update from the update list. However, I haven't seen it trigger
-    in any of the unit tests yet, so it might mean that it's not needed
-    and that situation doesn't occur, by construction.
-    todo: check if that situation occurs.
-    """
-    for key, updateList in self.segmentUpdates.iteritems():
-      c,i = key[0], key[1]
-      if c == col and i == cellIdx:
-        for update in updateList:
-          if update[1].segment == seg:
-            self.removeSegmentUpdate(update)
-
   ################################################################################
   def finishLearning(self):
     """Called when learning has been completed. This method just calls
@@ -1342,6 +1188,136 @@ class TM_SM(TM):
 
     return lateralActivity+distalActivity
 
+
+  ##############################################################################
+  def _getPresynapticIndex(self):
+    """
+    Inverted index of the synapses of all the segments. Sources are numbered
+    with the cells first (column * cellsPerColumn + cell index) and then the
+    distal inputs. It's built from the cells on first use, and then kept up to
+    date as synapses and segments are added and removed.
+
+    @return (defaultdict) Source -> dict of segment -> number of synapses of
+                          the segment from that source.
+    """
+    if self._presynapticIndex is None:
+      self._presynapticIndex = defaultdict(dict)
+      self._segmentCells = {}
+      for c, i in product(xrange(self.numberOfCols),
+                          xrange(self.cellsPerColumn)):
+        for segment in self.cells[c][i]:
+          self._indexSynapses(c, i, segment, segment.syns, segment.dsyns)
+
+    return self._presynapticIndex
+
+
+  def _indexSynapses(self, c, i, segment, lateralSynapses, distalSynapses):
+    """
+    Add new synapses of a segment to the index. (c, i) is the cell of the
+    segment, if it's a new one.
+
+    @param lateralSynapses (list) (column, cell index, ...) of the sources.
+    @param distalSynapses  (list) (distal input index, ...) of the sources.
+    """
+    if self._presynapticIndex is None:
+      # All the synapses get indexed when the index is built
+      return
+
+    # Segment updates can be queued on another cell than the segment's, which
+    # stays the segment's cell
+    self._segmentCells.setdefault(segment, (c, i))
+    for syn in lateralSynapses:
+      counts = self._presynapticIndex[int(syn[0]) * self.cellsPerColumn +
+                                      int(syn[1])]
+      counts[segment] = counts.get(segment, 0) + 1
+    for syn in distalSynapses:
+      counts = self._presynapticIndex[self._numberOfCells + int(syn[0])]
+      counts[segment] = counts.get(segment, 0) + 1
+
+
+  def _unindexSynapses(self, segment, lateralSynapses, distalSynapses):
+    """Remove synapses of a segment from the index, see _indexSynapses()."""
+    if self._presynapticIndex is None:
+      return
+
+    sources = ([int(syn[0]) * self.cellsPerColumn + int(syn[1])
+                for syn in lateralSynapses] +
+               [self._numberOfCells + int(syn[0]) for syn in distalSynapses])
+    for source in sources:
+      counts = self._presynapticIndex[source]
+      counts[segment] -= 1
+      if counts[segment] == 0:
+        del counts[segment]
+
+
+  def _unindexSegment(self, segment):
+    """Remove a segment and all its synapses from the index."""
+    if self._presynapticIndex is None:
+      return
+
+    self._unindexSynapses(segment, segment.syns, segment.dsyns)
+    del self._segmentCells[segment]
+
+
+  def _shiftDistalInput(self, distalDendriticInput):
+    """
+    Move the distal input at t to t-1 and store the new one, both as dense
+    array and as indices of the active inputs.
+    """
+    self.distalDendriticInput['t-1'][:,:] = self.distalDendriticInput['t'][:,:]
+    self.distalDendriticInput['t'][:,0] = distalDendriticInput
+
+    self._activeDistalInputs['t-1'] = self._activeDistalInputs['t']
+    self._activeDistalInputs['t'] = numpy.flatnonzero(
+      self.distalDendriticInput['t'])
+
+
+  def _getSegmentOverlaps(self, timeStep):
+    """
+    Count the synapses of each segment from the cells and distal inputs active
+    at timeStep, connected or not, from the synapse index. This is the
+    activity level of getSegmentActivityLevel() with connectedSynapsesOnly
+    False, for every segment that has any.
+
+    @return (defaultdict) Segment -> number of active synapses.
+    """
+    index = self._getPresynapticIndex()
+    activeSources = numpy.concatenate((
+      numpy.flatnonzero(self.activeState[timeStep]),
+      self._activeDistalInputs[timeStep] + self._numberOfCells))
+
+    overlaps = defaultdict(int)
+    for source in activeSources.tolist():
+      counts = index.get(source)
+      if counts:
+        for segment, numSynapses in counts.iteritems():
+          overlaps[segment] += numSynapses
+    return overlaps
+
+
+  def _getActiveSegments(self):
+    """
+    Find the active segments at t. Only the segments with more active synapses
+    than activationThreshold, connected or not, can be active, so the
+    connected synapses are only counted for those.
+
+    @return (list) (column, cell index, segment) of the active segments, in
+                   the order of the cells and of their segments.
+    """
+    activeState = self.activeState['t']
+    distalDendriticInput = self.distalDendriticInput['t']
+
+    activeSegments = set()
+    activeCells = set()
+    for segment, overlap in self._getSegmentOverlaps('t').iteritems():
+      if (overlap > self.activationThreshold and
+          self.isSegmentActive(segment, activeState, distalDendriticInput)):
+        activeSegments.add(segment)
+        activeCells.add(self._segmentCells[segment])
+
+    return [(c, i, s) for c, i in sorted(activeCells)
+            for s in self.cells[c][i] if s in activeSegments]
+
   ##############################################################################
   def getSegmentActiveSynapses(self, c,i,s, timeStep, newSynapses =False):
 
@@ -1425,26 +1401,25 @@ class TM_SM(TM):
     if n <= 0:
       return []
 
-    tmpCandidates = [] # tmp because we'll refine just below with activeSynapses
-
+    # (input index, 0) of the active distal inputs
     if timeStep == 't-1':
-      tmpCandidates = numpy.where(self.distalDendriticInput['t-1'] == 1)
+      tmpCandidates = self._activeDistalInputs['t-1'].tolist()
     else:
-      tmpCandidates = numpy.where(self.distalDendriticInput['t'] == 1)
+      tmpCandidates = self._activeDistalInputs['t'].tolist()
 
     # Candidates can be empty at this point, in which case we return
     # an empty segment list. adaptSegments will do nothing when getting
     # that list.
-    if len(tmpCandidates[0]) == 0:
+    if len(tmpCandidates) == 0:
       return []
 
     if s is None: # new segment
-      cands = [syn for syn in zip(tmpCandidates[0], tmpCandidates[1])]
+      cands = [(j, 0) for j in tmpCandidates]
     else:
       # We exclude any synapse that is already in this segment.
       synapsesAlreadyInSegment = set((syn[0], syn[1]) for syn in s.dsyns)
-      cands = [syn for syn in zip(tmpCandidates[0], tmpCandidates[1]) \
-               if (syn[0], syn[1]) not in synapsesAlreadyInSegment]
+      cands = [(j, 0) for j in tmpCandidates
+               if (j, 0) not in synapsesAlreadyInSegment]
 
     if n == 1: # so that we don't shuffle if only one is needed
       idx = self._random.getUInt32(len(cands))
@@ -1458,7 +1433,8 @@ class TM_SM(TM):
     return [cands[j] for j in tmp]
 
 
-  def getBestMatchingCell(self, c, activeState, distalDendriticInput):
+  def getBestMatchingCell(self, c, activeState, distalDendriticInput,
+                          segmentOverlaps=None):
     """Find weakly activated cell in column.
     Activity of Cell = maximal activity of all segment
     Consider all synapses (connected and unconnected) when calculate activity
@@ -1466,6 +1442,9 @@ class TM_SM(TM):
       Returns index of the most active cell and most activated segment
     Otherwise
       Return (None, None)
+
+    segmentOverlaps, if given, holds the activity of the segments for
+    activeState and distalDendriticInput, see _getSegmentOverlaps().
     """
     # Collect all cells in column c that have at least minThreshold in the most
     # activated segment
@@ -1481,8 +1460,11 @@ class TM_SM(TM):
       for j,s in enumerate(self.cells[c][i]):
 
         # todo: add lateral inputs here?
-        activity = self.getSegmentActivityLevel(s, activeState,
-                  distalDendriticInput, connectedSynapsesOnly=False)
+        if segmentOverlaps is None:
+          activity = self.getSegmentActivityLevel(s, activeState,
+                    distalDendriticInput, connectedSynapsesOnly=False)
+        else:
+          activity = segmentOverlaps.get(s, 0)
 
         if self.verbosity >= 6:
           print " Segment Activity for column ", c, " cell ", i, \
@@ -1506,20 +1488,25 @@ class TM_SM(TM):
       return bestCellInCol, self.cells[c][bestCellInCol][bestSegIdxInCol]
 
 
-  def getBestMatchingSegment(self, c, i, activeState, distalDendriticInput):
+  def getBestMatchingSegment(self, c, i, activeState, distalDendriticInput,
+                             segmentOverlaps=None):
     """For the given cell, find the segment with the largest number of active
     synapses. This routine is aggressive in finding the best match. The
     permanence value of synapses is allowed to be below connectedPerm. The number
     of active synapses is allowed to be below activationThreshold, but must be
     above minThreshold. The routine returns the segment object. If no
     segments are found, then None is returned.
+    segmentOverlaps is as in getBestMatchingCell().
     """
     maxActivity = self.minThreshold
     bestSegment = None
 
     for j,s in enumerate(self.cells[c][i]):
-      activity = self.getSegmentActivityLevel(s, activeState,
-                distalDendriticInput, connectedSynapsesOnly=False)
+      if segmentOverlaps is None:
+        activity = self.getSegmentActivityLevel(s, activeState,
+                  distalDendriticInput, connectedSynapsesOnly=False)
+      else:
+        activity = segmentOverlaps.get(s, 0)
 
       if activity >= maxActivity:
         maxActivity = activity
@@ -1528,76 +1515,29 @@ class TM_SM(TM):
     return bestSegment
 
   ################################################################################
-  def processSegmentUpdates(self):
-    """ Go through the list of accumulated segment updates and process them
-    as follows:
-
-    if the segment update is too old, remove the update
-    elseif the cell that an update belongs to has it's learnState currently
-          set to True (because it was predicted and just received bottom-up), then
-          positively re-enforce the synapses that predicted it and remove the update.
-    elseif the cell than an update belongs to just had it's predicted state
-          turn off, then negatively re-enforce the synapses that predicted it
-          and remove the update.
-    else leave the update in the queue.
-
+  def _getSegmentUpdateReinforcements(self):
     """
+    Every pending update is applied in each iteration. It is negatively
+    re-enforced if the cell's predicted state just turned off without the cell
+    learning, and positively re-enforced otherwise.
 
-    # =================================================================
-    # The segmentUpdates dict has keys which are the column,cellIdx of the
-    #  owner cell. The values are lists of segment updates for that cell
-    removeKeys = []
-    trimSegments = []
-    for key, updateList in self.segmentUpdates.iteritems():
-
-      # Get the column number and cell index of the owner cell
-      c,i = key[0], key[1]
-
-      # Should we positively or negatively re-enforce the predicting synapses?
-      positiveReinforcement = True
-      if self.learnState['t'][c,i] == 1:
-        positiveReinforcement = True
-      elif self.predictedState['t'][c,i] == 0 \
-                                and self.predictedState['t-1'][c,i] == 1:
-        # print " Negative Reinforcement ****** "
-        positiveReinforcement = False
-
-      # Process each segment for this cell. Each segment entry contains
-      #  [creationDate, SegmentInfo]
-      updateListKeep = []
-      for (createDate, segUpdate) in updateList:
-
-        # Decide whether to apply the update now. If update has expired, then
-        # delete it. If update was created in Phase1 then apply immediately.
-        # Otherwise, if update was not created during this pass then apply now.
-
-        if self.iterationIdx - createDate > self.segUpdateValidDuration:
-          # This segment has expired. Ignore this update (and hence remove it from list)
-          pass
-        elif (positiveReinforcement is not None):
-          trimSegment = self.adaptSegment(segUpdate, positiveReinforcement)
-          if trimSegment:
-            trimSegments.append((segUpdate.columnIdx, segUpdate.cellIdx,
-                                    segUpdate.segment))
-        else:
-          # Keep all updates that don't match the above criteria
-          updateListKeep.append((createDate,segUpdate))
-
-      self.segmentUpdates[key] = updateListKeep
-      if len(updateListKeep) == 0:
-        removeKeys.append(key)
-
+    @return (list) ((column index, cell index), positiveReinforcement) pairs
+                   for the cells with pending updates, in the order of
+                   self.segmentUpdates
+    """
+    reinforcements = []
+    for key in self.segmentUpdates:
+      c, i = key
+      turnedOff = (self.learnState['t'][c,i] != 1 and
+                   self.predictedState['t'][c,i] == 0 and
+                   self.predictedState['t-1'][c,i] == 1)
+      reinforcements.append((key, not turnedOff))
+    return reinforcements
 
-    # =====================================================================
-    # Clean out empty segment updates
-    for key in removeKeys:
-      self.segmentUpdates.pop(key)
 
-    # =====================================================================
-    # Trim segments that had synapses go to 0
-    for (c, i, segment) in trimSegments:
-      self.trimSegmentsInCell(c, i, [segment], minPermanence = 0.00001,
-              minNumSyns = 0)
+  ################################################################################
+  def _isSegmentUpdateDue(self, createDate, segUpdate):
+    return True
 
 
 
@@ -1688,6 +1628,8 @@ class TM_SM(TM):
         for newSyn in DistalSynsToAdd:
           segment.addDistalSynapse(newSyn[0], 0, self.initialPerm)
 
+        self._indexSynapses(c, i, segment, LateralSynsToAdd, DistalSynsToAdd)
+
         if self.verbosity >= 4:
           print "            after",
           segment.printSegment()
@@ -1729,6 +1671,8 @@ class TM_SM(TM):
         newSegment.printSegment()
 
       self.cells[c][i].append(newSegment)
+      self._indexSynapses(c, i, newSegment, activeLateralSynapses,
+                          activeDistalSynapses)
 
 
     return trimSegment
@@ -38,6 +38,11 @@ class ExtendedTemporalMemory(TemporalMemory):
   look for a new winner cell until a reset() is called.
   """
 
+  segmentAttributes = dict(
+    TemporalMemory.segmentAttributes,
+    activeApicalSegments="apicalConnections",
+    matchingApicalSegments="apicalConnections")
+
   # ==============================
   # Main functions
   # ==============================
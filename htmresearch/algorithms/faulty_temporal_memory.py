@@ -22,6 +22,9 @@
 """
 Faulty Temporal Memory implementation in Python.
 """
+import copy
+import functools
+
 import numpy
 from collections import defaultdict
 from htmresearch.algorithms.temporal_memory_phases import TemporalMemory
@@ -35,9 +38,20 @@ class FaultyTemporalMemory(TemporalMemory):
   robustness of the Temporal Memory algorithm under such situations. Such is the
   price of progress.
 
+  Whole columns, segments and synapses can be killed too. Faults are masks on
+  top of the connections: apart from the segments of cells killed by killCells
+  without keepSegments, nothing is destroyed, so the same trained TM can be
+  evaluated at several fault levels (see sweepFaults).
+
   And by the way, we're not actually killing anything real.
   """
 
+  # Dead segments and synapses are renumbered with the Connections by
+  # checkpoints
+  segmentAttributes = dict(TemporalMemory.segmentAttributes,
+                           deadSegments="connections")
+  synapseAttributes = {"deadSynapses": "connections"}
+
   # ==============================
   # Main functions
   # ==============================
@@ -51,26 +65,41 @@ class FaultyTemporalMemory(TemporalMemory):
                                       # will be killed
     self.numDead = 0
 
+    # deadCells and deadCellMask include the cells of the dead columns,
+    # killedCellMask only has the cells killed by killCells
+    self.deadCellMask = numpy.zeros(self.numberOfCells(), dtype=bool)
+    self.killedCellMask = numpy.zeros(self.numberOfCells(), dtype=bool)
+    self.deadColumnMask = numpy.zeros(self.numberOfColumns(), dtype=bool)
+    self.deadSegments = set()
+    self.deadSynapses = set()
 
-  def killCells(self, percent = 0.05):
+
+  def killCells(self, percent = 0.05, keepSegments=False):
     """
     Changes the percentage of cells that are now considered dead. The first
     time you call this method a permutation list is set up. Calls change the
     number of cells considered dead.
+
+    The segments of dead cells are destroyed, so cells revived by a later call
+    with a lower percentage start without segments. With keepSegments they are
+    kept but can't become active or matching, and revived cells get them back.
+    While the cells are dead, both give the same predictions.
     """
     if self.zombiePermutation is None:
       self.zombiePermutation = numpy.random.permutation(self.numberOfCells())
 
-    self.numDead = round(percent * self.numberOfCells())
-    if self.numDead > 0:
-      self.deadCells = set(self.zombiePermutation[0:self.numDead])
-    else:
-      self.deadCells = set()
+    self.numDead = int(round(percent * self.numberOfCells()))
+    self.killedCellMask[:] = False
+    self.killedCellMask[self.zombiePermutation[0:self.numDead]] = True
+    self._updateDeadCells()
 
     print "Total number of dead cells=",len(self.deadCells)
 
+    if keepSegments:
+      return
+
     numSegmentDeleted = 0
-    for cell in self.deadCells:
+    for cell in numpy.flatnonzero(self.killedCellMask).tolist():
       segmentsPerCell = list(self.connections.segmentsForCell(cell))
       for segment in segmentsPerCell:
         self.connections.destroySegment(segment)
@@ -79,6 +108,158 @@ class FaultyTemporalMemory(TemporalMemory):
     print "Total number of segments removed=", numSegmentDeleted
 
 
+  def killColumns(self, percent=0.05):
+    """
+    Changes the percentage of columns whose cells are all dead. Columns are
+    killed or revived at random, keeping the others, so increasing percentages
+    kill nested sets of columns.
+    """
+    self._setFaultLevel(self.deadColumnMask, percent)
+    self._updateDeadCells()
+
+
+  def killSegments(self, percent=0.05):
+    """
+    Changes the percentage of the current segments that are dead. Dead segments
+    can't become active or matching and aren't picked for learning. Segments
+    are killed or revived at random, as in killColumns.
+    """
+    segments = self._allSegments()
+    self.deadSegments = self._setFaultLevelForIndices(segments,
+                                                      self.deadSegments,
+                                                      percent)
+
+
+  def killSynapses(self, percent=0.05):
+    """
+    Changes the percentage of the current synapses that are dead. Dead synapses
+    don't count towards segment activity. Synapses are killed or revived at
+    random, as in killColumns.
+    """
+    synapses = numpy.array(sorted(
+      synapse
+      for segment in self._allSegments().tolist()
+      for synapse in self.connections.synapsesForSegment(segment)),
+      dtype=numpy.int64)
+    self.deadSynapses = self._setFaultLevelForIndices(synapses,
+                                                      self.deadSynapses,
+                                                      percent)
+
+
+  def clearFaults(self):
+    """
+    Revive all the cells, columns, segments and synapses.
+    """
+    self.numDead = 0
+    self.killedCellMask[:] = False
+    self.deadColumnMask[:] = False
+    self.deadSegments = set()
+    self.deadSynapses = set()
+    self._updateDeadCells()
+
+
+  def sweepFaults(self, percents, evaluate, faultType="cells",
+                  copyModel=False):
+    """
+    Evaluates this trained TM at several fault levels, without training a TM
+    for each of them. Faults of the given type are set to each level in turn,
+    which kills nested sets for increasing levels. The faults the TM had before
+    are restored at the end.
+
+    @param percents  (list)     Fault levels, as fractions.
+    @param evaluate  (callable) Called with the faulty TM at each level, after
+                                a reset. Its results are returned.
+    @param faultType (str)      "cells", "columns", "segments" or "synapses".
+    @param copyModel (bool)     If True, evaluate gets a copy of the TM at each
+                                level, so it can learn. Otherwise it gets this
+                                TM, and must not learn.
+
+    @return (list) Results of evaluate, one per fault level.
+    """
+    killMethods = {"cells": functools.partial(self.killCells,
+                                              keepSegments=True),
+                   "columns": self.killColumns,
+                   "segments": self.killSegments,
+                   "synapses": self.killSynapses}
+    if faultType not in killMethods:
+      raise ValueError("Unknown fault type: {}".format(faultType))
+
+    faults = (self.numDead, self.killedCellMask.copy(),
+              self.deadColumnMask.copy(), self.deadSegments, self.deadSynapses)
+
+    results = []
+    try:
+      for percent in percents:
+        killMethods[faultType](percent)
+        tm = copy.deepcopy(self) if copyModel else self
+        tm.reset()
+        results.append(evaluate(tm))
+    finally:
+      (self.numDead, self.killedCellMask, self.deadColumnMask,
+       self.deadSegments, self.deadSynapses) = faults
+      self._updateDeadCells()
+      self.reset()
+
+    return results
+
+
+  def _updateDeadCells(self):
+    self.deadCellMask = (self.killedCellMask |
+                         numpy.repeat(self.deadColumnMask, self.cellsPerColumn))
+    self.deadCells = set(numpy.flatnonzero(self.deadCellMask).tolist())
+
+
+  def _allSegments(self):
+    """
+    @return (numpy array) Sorted indices of all the segments.
+    """
+    return numpy.array(sorted(
+      segment
+      for cell in xrange(self.numberOfCells())
+      for segment in self.connections.segmentsForCell(cell)),
+      dtype=numpy.int64)
+
+
+  @staticmethod
+  def _setFaultLevel(deadMask, percent):
+    """
+    Kills random live elements, or revives random dead ones, until the given
+    percentage of the mask is dead.
+
+    @param deadMask (numpy array) Bool mask of dead elements, updated in place.
+    @param percent  (float)       Fraction of elements that should be dead.
+    """
+    numDead = int(round(percent * len(deadMask)))
+    dead = numpy.flatnonzero(deadMask)
+
+    if numDead > len(dead):
+      live = numpy.flatnonzero(~deadMask)
+      deadMask[numpy.random.choice(live, numDead - len(dead),
+                                   replace=False)] = True
+    elif numDead < len(dead):
+      deadMask[numpy.random.choice(dead, len(dead) - numDead,
+                                   replace=False)] = False
+
+
+  @classmethod
+  def _setFaultLevelForIndices(cls, indices, dead, percent):
+    """
+    Same as _setFaultLevel for a set of dead segment or synapse indices. Dead
+    indices that no longer exist are dropped.
+
+    @param indices (numpy array) Sorted indices of the existing elements.
+    @param dead    (set)         Indices of the dead elements.
+    @param percent (float)       Fraction of elements that should be dead.
+
+    @return (set) Indices of the dead elements.
+    """
+    deadMask = numpy.in1d(indices,
+                          numpy.fromiter(dead, dtype=numpy.int64,
+                                         count=len(dead)))
+    cls._setFaultLevel(deadMask, percent)
+    return set(indices[deadMask].tolist())
+
+
   def activateCorrectlyPredictiveCells(self,
                                        prevPredictiveCells,
                                        prevMatchingCells,
@@ -162,37 +343,35 @@ class FaultyTemporalMemory(TemporalMemory):
                       `matchingSegments` (set),
                       `matchingCells`    (set)
     """
-    numActiveConnectedSynapsesForSegment = defaultdict(lambda: 0)
-    numActiveSynapsesForSegment = defaultdict(lambda: 0)
-    activeSegments = set()
-    predictiveCells = set()
-
-    matchingSegments = set()
-    matchingCells = set()
+    # Count the active synapses per segment, leaving out dead synapses. Dead
+    # segments and the segments of dead cells are only left out once they
+    # reach a threshold.
+    numActiveConnectedSynapsesForSegment = defaultdict(int)
+    numActiveSynapsesForSegment = defaultdict(int)
+    deadSynapses = self.deadSynapses
+    countMatching = self.predictedSegmentDecrement > 0
 
     for cell in activeCells:
-      assert(not (cell in self.deadCells))
-      for synapseData in connections.synapsesForPresynapticCell(cell).values():
-        segment = synapseData.segment
-        permanence = synapseData.permanence
-        postSynapticCell = connections.cellForSegment(segment)
-
-        if not(postSynapticCell in self.deadCells):
-          if permanence >= self.connectedPermanence:
-            numActiveConnectedSynapsesForSegment[segment] += 1
-
-            if (numActiveConnectedSynapsesForSegment[segment] >=
-                self.activationThreshold):
-              activeSegments.add(segment)
-              predictiveCells.add(connections.cellForSegment(segment))
-
-          if permanence > 0 and self.predictedSegmentDecrement > 0:
-            numActiveSynapsesForSegment[segment] += 1
-
-            if numActiveSynapsesForSegment[segment] >= self.minThreshold:
-              matchingSegments.add(segment)
-              matchingCells.add(connections.cellForSegment(segment))
+      for synapse, synapseData in (
+          connections.synapsesForPresynapticCell(cell).iteritems()):
+        if synapse in deadSynapses:
+          continue
 
+        permanence = synapseData.permanence
+        if permanence >= self.connectedPermanence:
+          numActiveConnectedSynapsesForSegment[synapseData.segment] += 1
+        if permanence > 0 and countMatching:
+          numActiveSynapsesForSegment[synapseData.segment] += 1
+
+    activeSegments, predictiveCells = self._liveSegmentsAndCells(
+      [segment for segment, count
+       in numActiveConnectedSynapsesForSegment.iteritems()
+       if count >= self.activationThreshold],
+      connections)
+    matchingSegments, matchingCells = self._liveSegmentsAndCells(
+      [segment for segment, count in numActiveSynapsesForSegment.iteritems()
+       if count >= self.minThreshold],
+      connections)
 
     return activeSegments, predictiveCells, matchingSegments, matchingCells
 
@@ -267,6 +446,63 @@ class FaultyTemporalMemory(TemporalMemory):
     return activeCells, winnerCells, learningSegments
 
 
+  def _liveSegmentsAndCells(self, segments, connections):
+    """
+    Leaves out the dead segments and the segments of dead cells.
+
+    @param segments    (list)        Segment indices
+    @param connections (Connections) Connectivity of layer
+
+    @return (tuple) Contains:
+                      `segments` (set),
+                      `cells`    (set)
+    """
+    if not segments:
+      return set(), set()
+
+    segments = numpy.array(segments, dtype=numpy.int64)
+    cells = numpy.array([connections.cellForSegment(segment)
+                         for segment in segments.tolist()], dtype=numpy.int64)
+    live = ~self.deadCellMask[cells]
+    if self.deadSegments:
+      live &= ~numpy.in1d(segments, list(self.deadSegments))
+
+    return set(segments[live].tolist()), set(cells[live].tolist())
+
+
+  def bestMatchingSegment(self, cell, activeCells, connections):
+    """
+    Same as TemporalMemory.bestMatchingSegment, but dead segments and synapses
+    don't count.
+    """
+    if not (self.deadSegments or self.deadSynapses):
+      return super(FaultyTemporalMemory, self).bestMatchingSegment(
+        cell, activeCells, connections)
+
+    maxSynapses = self.minThreshold
+    bestSegment = None
+    bestNumActiveSynapses = None
+
+    for segment in connections.segmentsForCell(cell):
+      if segment in self.deadSegments:
+        continue
+
+      numActiveSynapses = 0
+      for synapse in connections.synapsesForSegment(segment):
+        synapseData = connections.dataForSynapse(synapse)
+        if (synapse not in self.deadSynapses and
+            synapseData.presynapticCell in activeCells and
+            synapseData.permanence > 0):
+          numActiveSynapses += 1
+
+      if numActiveSynapses >= maxSynapses:
+        maxSynapses = numActiveSynapses
+        bestSegment = segment
+        bestNumActiveSynapses = numActiveSynapses
+
+    return bestSegment, bestNumActiveSynapses
+
+
   #########################################################################
   #
   # Debugging routines
@@ -276,10 +512,8 @@ class FaultyTemporalMemory(TemporalMemory):
     """
     Print statistics for the dead cells
     """
-    columnCasualties = numpy.zeros(self.numberOfColumns())
-    for cell in self.deadCells:
-      col = self.columnForCell(cell)
-      columnCasualties[col] += 1
+    columnCasualties = self.deadCellMask.reshape(
+      self.numberOfColumns(), self.cellsPerColumn).sum(axis=1)
     for col in range(self.numberOfColumns()):
       print col,columnCasualties[col]
 
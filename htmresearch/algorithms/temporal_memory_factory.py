@@ -53,26 +53,44 @@ class TemporalMemoryTypes(object):
 
     for attrName in dir(cls):
       attrValue = getattr(cls, attrName)
-      if (isinstance(attrValue, type)):
+      # Skip __class__, which dir() lists and is a type too
+      if isinstance(attrValue, type) and not attrName.startswith("__"):
         yield attrName # attrName is an acceptable model name and
 
 
-def createModel(modelName, **kwargs):
+def createModel(modelName, profiler=None, **kwargs):
   """
   Return a classification model of the appropriate type. The model could be any
   supported subclass of ClassficationModel based on modelName.
 
-  @param modelName (str)  A supported temporal memory type
+  @param modelName (str)  A supported temporal memory type, or "auto" for the
+                          fastest type that learns like the reference one with
+                          these arguments. "auto" doesn't run the benchmarks,
+                          it gives the reference type until these arguments
+                          are profiled. See
+                          temporal_memory_benchmark.selectModel().
+
+  @param profiler  (TemporalMemoryProfiler) Optional profiler to attach to the
+                          new model, to record the time spent in its phases.
 
   @param kwargs    (dict) Constructor argument for the class that will be
                           instantiated. Keyword parameters specific to each
                           model type should be passed in here.
   """
 
+  if modelName == "auto":
+    # Imported here since the benchmarks create their models with this module
+    from htmresearch.support import temporal_memory_benchmark
+    modelName = temporal_memory_benchmark.selectModel(kwargs)
+
   if modelName not in TemporalMemoryTypes.getTypes():
     raise RuntimeError("Unknown model type: " + modelName)
 
-  return getattr(TemporalMemoryTypes, modelName)(**kwargs)
+  model = getattr(TemporalMemoryTypes, modelName)(**kwargs)
+  if profiler is not None:
+    profiler.attach(model)
+
+  return model
 
 
 def getConstructorArguments(modelName):
@@ -30,20 +30,54 @@ happen in a different order.
 from collections import defaultdict, namedtuple
 from operator import mul
 
+import numpy
+
 from nupic.bindings.math import Random
 from nupic.research.connections import Connections
 
+from htmresearch.support import temporal_memory_checkpoint
+
 
 
 EPSILON = 0.000001
 
 
 
+class SegmentCountingConnections(Connections):
+  """
+  Connections that also keep the number of segments on every cell in an int
+  array, so the least used cell of a column is found without querying the
+  segments of each of its cells.
+  """
+
+  def __init__(self, numCells, **kwargs):
+    Connections.__init__(self, numCells, **kwargs)
+    self.segmentCounts = numpy.zeros(numCells, dtype="int32")
+
+
+  def createSegment(self, cell):
+    segment = Connections.createSegment(self, cell)
+    # Creating a segment may also destroy one on a full cell
+    self.segmentCounts[cell] = len(self.segmentsForCell(cell))
+    return segment
+
+
+  def destroySegment(self, segment):
+    cell = self.cellForSegment(segment)
+    Connections.destroySegment(self, segment)
+    self.segmentCounts[cell] = len(self.segmentsForCell(cell))
+
+
+
 class TemporalMemory(object):
   """
   Class implementing the Temporal Memory algorithm.
   """
 
+  # Attributes holding sets of segments, and the Connections they belong to
+  segmentAttributes = {"activeSegments": "connections",
+                       "matchingSegments": "connections"}
+
   def __init__(self,
                columnDimensions=(2048,),
                cellsPerColumn=32,
@@ -98,9 +132,10 @@ class TemporalMemory(object):
     self.permanenceDecrement = permanenceDecrement
     self.predictedSegmentDecrement = predictedSegmentDecrement
     # Initialize member variables
-    self.connections = Connections(self.numberOfCells(),
-                                   maxSegmentsPerCell=maxSegmentsPerCell,
-                                   maxSynapsesPerSegment=maxSynapsesPerSegment)
+    self.connections = SegmentCountingConnections(
+      self.numberOfCells(),
+      maxSegmentsPerCell=maxSegmentsPerCell,
+      maxSynapsesPerSegment=maxSynapsesPerSegment)
     self._random = Random(seed)
 
     self.activeCells = set()
@@ -503,21 +538,20 @@ class TemporalMemory(object):
     @param connections (Connections) Connectivity of layer
     @return (int) Cell index
     """
-    leastUsedCells = set()
-    minNumSegments = float("inf")
+    cells = numpy.fromiter(cells, dtype="int64", count=len(cells))
+    cells.sort()
 
-    for cell in cells:
-      numSegments = len(connections.segmentsForCell(cell))
-
-      if numSegments < minNumSegments:
-        minNumSegments = numSegments
-        leastUsedCells = set()
+    segmentCounts = getattr(connections, "segmentCounts", None)
+    if segmentCounts is None:
+      numSegments = numpy.array([len(connections.segmentsForCell(cell))
+                                 for cell in cells])
+    else:
+      numSegments = segmentCounts[cells]
 
-      if numSegments == minNumSegments:
-        leastUsedCells.add(cell)
+    leastUsedCells = cells[numSegments == numSegments.min()]
 
     i = self._random.getUInt32(len(leastUsedCells))
-    return sorted(leastUsedCells)[i]
+    return int(leastUsedCells[i])
 
 
   @staticmethod
@@ -587,22 +621,24 @@ class TemporalMemory(object):
     # Remove cells that are already synapsed on by this segment
     for synapse in connections.synapsesForSegment(segment):
       synapseData = connections.dataForSynapse(synapse)
-      presynapticCell = synapseData.presynapticCell
+      candidates.discard(synapseData.presynapticCell)
 
-      if presynapticCell in candidates:
-        candidates.remove(presynapticCell)
+    # Sorted, so the picks only depend on the random draws
+    candidates = numpy.fromiter(candidates, dtype=numpy.int64,
+                                count=len(candidates))
+    candidates.sort()
+    candidates = candidates.tolist()
+    numCandidates = len(candidates)
+    n = min(n, numCandidates)
 
-    n = min(n, len(candidates))
-    candidates = sorted(candidates)
-    cells = set()
+    # Partial Fisher-Yates shuffle: each draw picks one of the candidates
+    # that haven't been picked yet and swaps it to the end of those
+    for k in xrange(n):
+      last = numCandidates - 1 - k
+      i = self._random.getUInt32(last + 1)
+      candidates[i], candidates[last] = candidates[last], candidates[i]
 
-    # Pick n cells randomly
-    for _ in range(n):
-      i = self._random.getUInt32(len(candidates))
-      cells.add(candidates[i])
-      del candidates[i]
-
-    return cells
+    return set(candidates[numCandidates - n:])
 
 
   def columnForCell(self, cell):
@@ -761,6 +797,30 @@ class TemporalMemory(object):
     return tm
 
 
+  def writeCheckpoint(self, path):
+    """
+    Writes a flat binary checkpoint, see
+    `htmresearch.support.temporal_memory_checkpoint`. Much faster to write and
+    load than the proto serialization for large numbers of synapses.
+    @param path (str) Output path, should end in ".npz"
+    """
+    temporal_memory_checkpoint.writeCheckpoint(self, path)
+
+
+  @classmethod
+  def readCheckpoint(cls, path):
+    """
+    Reads a checkpoint written by `writeCheckpoint`
+    @param path (str) Checkpoint path
+    @return (TemporalMemory) Instance of the class that was saved
+    """
+    tm = temporal_memory_checkpoint.readCheckpoint(path)
+    if not isinstance(tm, cls):
+      raise TypeError("Checkpoint {} holds a {}, not a {}".format(
+        path, type(tm).__name__, cls.__name__))
+    return tm
+
+
   def __eq__(self, other):
     """
     Equality operator for TemporalMemory instances.
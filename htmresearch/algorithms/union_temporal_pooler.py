@@ -149,6 +149,12 @@ class UnionTemporalPooler(SpatialPooler):
     # Indices of active cells from spatial pooler
     self._activeCells = numpy.array([], dtype=UINT_DTYPE)
 
+    # Dense input buffers filled in by compute() when given active indices
+    self._activeInputBuffer = numpy.zeros(self.getNumInputs(),
+                                          dtype=REAL_DTYPE)
+    self._predictedActiveInputBuffer = numpy.zeros(self.getNumInputs(),
+                                                   dtype=REAL_DTYPE)
+
     # lowest possible pooling activation level
     self._poolingActivationlowerBound = 0.1
 
@@ -178,13 +184,21 @@ class UnionTemporalPooler(SpatialPooler):
     self.setBoostFactors(numpy.ones(self.getNumColumns(), dtype=REAL_DTYPE))
 
 
-  def compute(self, activeInput, predictedActiveInput, learn):
+  def compute(self, activeInput, predictedActiveInput, learn,
+              inputIndices=False):
     """
     Computes one cycle of the Union Temporal Pooler algorithm.
     @param activeInput            (numpy array) A numpy array of 0's and 1's that comprises the input to the union pooler
     @param predictedActiveInput   (numpy array) A numpy array of 0's and 1's that comprises the correctly predicted input to the union pooler
     @param learn                  (boolen)      A boolen value indicating whether learning should be performed
+    @param inputIndices           (bool)        If True, activeInput and predictedActiveInput are the indices of the active inputs instead
     """
+    if inputIndices:
+      activeInput = self._fillInputBuffer(self._activeInputBuffer,
+                                          activeInput)
+      predictedActiveInput = self._fillInputBuffer(
+        self._predictedActiveInputBuffer, predictedActiveInput)
+
     assert numpy.size(activeInput) == self.getNumInputs()
     assert numpy.size(predictedActiveInput) == self.getNumInputs()
     self._updateBookeepingVars(learn)
@@ -247,6 +261,16 @@ class UnionTemporalPooler(SpatialPooler):
     return self._unionSDR
 
 
+  @staticmethod
+  def _fillInputBuffer(inputBuffer, indices):
+    """
+    Overwrite a preallocated dense input buffer with the given active indices.
+    """
+    inputBuffer.fill(0)
+    inputBuffer[indices] = 1
+    return inputBuffer
+
+
   def _decayPoolingActivation(self):
     """
     Decrements pooling activation of all cells
@@ -22,16 +22,13 @@ import itertools
 import numpy
 import os
 
-import random
-
 from cortipy.cortical_client import CorticalClient, RETINA_SIZES
 from cortipy.exceptions import UnsuccessfulEncodingError
 from htmresearch.encoders import EncoderTypes
+from htmresearch.encoders.fingerprint_store import CorticalClientBackend
 from htmresearch.encoders.language_encoder import LanguageEncoder
 from htmresearch.support.text_preprocess import TextPreprocess
 
-from nupic.bindings.math import SparseMatrix
-
 
 DEFAULT_RETINA = "en_synonymous"
 
@@ -49,7 +46,7 @@ class CioEncoder(LanguageEncoder):
   def __init__(self, retina=DEFAULT_RETINA, retinaScaling=1.0, cacheDir=None,
                verbosity=0, fingerprintType=EncoderTypes.document,
                unionSparsity=0.20, apiKey=None,
-               maxSparsity=0.50):
+               maxSparsity=0.50, fingerprintStore=None):
     """
     @param retina          (str)      Cortical.io retina, either "en_synonymous"
                                       or "en_associative".
@@ -64,14 +61,28 @@ class CioEncoder(LanguageEncoder):
                                       bitmap. If the percentage of bits in the
                                       encoding is > maxSparsity, it will be
                                       randomly subsampled.
+    @param fingerprintStore (FingerprintStore) Optional persistent store for
+                                      word fingerprints. When given, word
+                                      bitmaps are read from the store instead
+                                      of queried term by term through cortipy.
+                                      If the store has no backend and there is
+                                      an API key, the cortipy client becomes
+                                      its backend. Without an API key, only
+                                      word fingerprint encodings are
+                                      available, from the store; document
+                                      encodings, decode(), compare() and
+                                      createCategory() need the API.
 
     TODO: replace enum with a simple string
     """
-    if apiKey is None and "CORTICAL_API_KEY" not in os.environ:
+    if apiKey is None and "CORTICAL_API_KEY" not in os.environ and (
+        fingerprintStore is None or fingerprintType != EncoderTypes.word):
       print ("Missing CORTICAL_API_KEY environment variable. If you have a "
         "key, set it with $ export CORTICAL_API_KEY=api_key\n"
         "You can retrieve a key by registering for the REST API at "
-        "http://www.cortical.io/resources_apikey.html")
+        "http://www.cortical.io/resources_apikey.html\n"
+        "Without a key, only word fingerprint encodings from a "
+        "fingerprintStore are available.")
       raise OSError("Missing API key.")
 
     super(CioEncoder, self).__init__(unionSparsity=unionSparsity)
@@ -81,10 +92,19 @@ class CioEncoder(LanguageEncoder):
       root = os.path.dirname(os.path.realpath(__file__))
       cacheDir = os.path.join(root, "CioCache")
 
-    self.apiKey = apiKey if apiKey else os.environ["CORTICAL_API_KEY"]
+    self.apiKey = apiKey if apiKey else os.environ.get("CORTICAL_API_KEY")
     self.retina = retina
 
-    self.client = CorticalClient(self.apiKey, retina=retina, cacheDir=cacheDir)
+    if self.apiKey is not None:
+      self.client = CorticalClient(self.apiKey, retina=retina,
+                                   cacheDir=cacheDir)
+    else:
+      self.client = None
+
+    self.fingerprintStore = fingerprintStore
+    if (fingerprintStore is not None and fingerprintStore.backend is None and
+        self.client is not None):
+      fingerprintStore.backend = CorticalClientBackend(self.client)
 
     self._setDimensions(retinaScaling)
 
@@ -117,9 +137,10 @@ class CioEncoder(LanguageEncoder):
       # Only set cacheDir if value explicitly provided
       self._cacheDir = value
       # Re-init the encoder's Cio client for the new cacheDir
-      self.client = CorticalClient(self.apiKey,
-                                   retina=self.retina,
-                                   cacheDir=value)
+      if self.apiKey is not None:
+        self.client = CorticalClient(self.apiKey,
+                                     retina=self.retina,
+                                     cacheDir=value)
 
 
   def __setstate__(self, state):
@@ -129,7 +150,7 @@ class CioEncoder(LanguageEncoder):
     CorticalClient instance includes a cacheDir that does not exist, which is
     likely the case when a model is trained on one machine for reuse elsewhere.
     """
-    if "_cacheDir" not in state:
+    if "_cacheDir" not in state and state["client"] is not None:
       state["client"] = CorticalClient(state["apiKey"],
                                        retina=state["client"].retina,
                                        cacheDir=self.cacheDir)
@@ -167,13 +188,13 @@ class CioEncoder(LanguageEncoder):
 
     try:
       if self.fingerprintType == EncoderTypes.document:
-        encoding = self.client.getTextBitmap(text)
+        encoding = self._getClient().getTextBitmap(text)
 
       elif self.fingerprintType == EncoderTypes.word:
         encoding = self.getUnionEncoding(text)
 
       else:
-        encoding = self.client.getTextBitmap(text)
+        encoding = self._getClient().getTextBitmap(text)
 
     except UnsuccessfulEncodingError:
       if self.verbosity > 0:
@@ -192,32 +213,28 @@ class CioEncoder(LanguageEncoder):
     @param  tokens  (sequence) A sequence of tokens
     @return         (sequence) Bitmap
     """
-    # Accumulate counts by inplace-adding sparse matrices
-    counts = SparseMatrix()
-    counts.resize(1, self.width*self.height)
-
-    # Pre-allocate buffer sparse matrix
-    sparseBitmap = SparseMatrix()
-    sparseBitmap.resize(1, self.width*self.height)
-
-    for t in tokens:
-      bitmap = self._getWordBitmap(t)
-      sparseBitmap.setRowFromSparse(0, bitmap, [1]*len(bitmap))
-      counts += sparseBitmap
+    bitmaps = [numpy.asarray(self._getWordBitmap(t), dtype=numpy.int64)
+               for t in tokens]
+    if not bitmaps:
+      return ()
 
-    numNonZeros = counts.nNonZerosOnRow(0)
-
-    # Add some jitter to aid in tie-breaking during sort
-    jitterValues = tuple((random.random()/100)+0.1
-                         for _ in xrange(numNonZeros))
-    sparseBitmap.setRowFromSparse(0, counts.nonZeroCols(), jitterValues)
-    counts += sparseBitmap
+    # Count how many tokens hit each bit in a single pass
+    counts = numpy.bincount(numpy.concatenate(bitmaps), minlength=self.n)
+    positions = numpy.flatnonzero(counts)
+    numNonZeros = len(positions)
 
     maxSparsity = int(self.unionSparsity * self.n)
     w = min(numNonZeros, maxSparsity)
+    if w == 0:
+      return ()
 
-    # Return top w most popular positions
-    return  tuple(x[1] for x in counts.getNonZerosSorted())[:w]
+    # Add some jitter to aid in tie-breaking during sort
+    scores = counts[positions] + (numpy.random.random(numNonZeros)/100 + 0.1)
+
+    # Return top w most popular positions, without sorting all of them
+    top = numpy.argpartition(-scores, w - 1)[:w]
+    top = top[numpy.argsort(-scores[top])]
+    return tuple(positions[top].tolist())
 
 
   def getUnionEncoding(self, text):
@@ -267,30 +284,52 @@ class CioEncoder(LanguageEncoder):
       print ("Although the encoder type is not set for words, the window "
         "encodings use word-level fingerprints.")
 
-    bitmaps = tuple(numpy.array(self._getWordBitmap(t)) for t in tokens)
+    bitmaps = [numpy.asarray(self._getWordBitmap(t), dtype=numpy.int64)
+               for t in tokens]
+    bitmapSizes = [len(bitmap) for bitmap in bitmaps]
+    n = float(self.n)
+
+    # For every bit, the index of the most recent token that has it on, and for
+    # every token, the number of bits it was the most recent token for. The
+    # size of the union of tokens j..t is then the sum of lastCounts[j:t+1], so
+    # sizing the window of a new token costs O(len(bitmap)) plus O(1) per
+    # window step. Reading out the union of a returned window scans lastSeen,
+    # which is O(n) per window, but one vectorized pass over n bits is cheaper
+    # than sorting the bits of the bitmaps in the window.
+    numBits = max([self.n] + [b.max() + 1 for b in bitmaps if b.size])
+    lastSeen = numpy.full(numBits, -1, dtype=numpy.int64)
+    lastCounts = numpy.zeros(len(bitmaps), dtype=numpy.int64)
 
     windowBitmaps = []
-    for tokenIndex, windowBitmap in enumerate(bitmaps):
+    for tokenIndex, bitmap in enumerate(bitmaps):
+      previous = lastSeen[bitmap]
+      previous = previous[previous >= 0]
+      numpy.subtract.at(lastCounts, previous, 1)
+      lastSeen[bitmap] = tokenIndex
+      lastCounts[tokenIndex] = bitmap.size
+
       # Each index in the tokens list is the end of a possible window.
+      windowSize = bitmap.size
+      windowStart = tokenIndex
+      textStart = 0
       for i in reversed(xrange(tokenIndex)):
         # From the current token, increase the window by successively adding the
         # previous tokens.
-        windowSparsity = len(windowBitmap) / float(self.n)
-        nextSparsity = len(bitmaps[i]) / float(self.n)
-        if windowSparsity + nextSparsity > self.unionSparsity:
+        textStart = i
+        if windowSize / n + bitmapSizes[i] / n > self.unionSparsity:
           # stopping criterion reached -- window is full
           break
-        else:
-          # add bitmap to the current window bitmap
-          windowBitmap = numpy.union1d(windowBitmap, bitmaps[i])
+        # add bitmap to the current window bitmap
+        windowSize += lastCounts[i]
+        windowStart = i
 
-      sparsity = len(windowBitmap) / float(self.n)
+      sparsity = windowSize / n
       if sparsity > minSparsity:
         # only include windows of sufficient density
         windowBitmaps.append(
-          {"text": tokens[i:tokenIndex+1],
+          {"text": tokens[textStart:tokenIndex+1],
            "sparsity": sparsity,
-           "bitmap": numpy.array(windowBitmap)})
+           "bitmap": numpy.flatnonzero(lastSeen >= windowStart)})
 
     return windowBitmaps
 
@@ -328,7 +367,35 @@ class CioEncoder(LanguageEncoder):
     Return a bitmap for the word. If the Cortical.io API can't encode, cortipy
     will use a random encoding for the word.
     """
-    return self.client.getBitmap(term)["fingerprint"]["positions"]
+    store = getattr(self, "fingerprintStore", None)
+    if store is not None:
+      return store.getPositions(term)
+    return self._getClient().getBitmap(term)["fingerprint"]["positions"]
+
+
+  def _getClient(self):
+    """
+    @return (CorticalClient) The client, for the operations that need the
+                             Cortical.io API.
+    """
+    if self.client is None:
+      raise OSError("Missing API key. This operation queries the Cortical.io "
+                    "API; without a key, the encoder only encodes words from "
+                    "its fingerprint store.")
+    return self.client
+
+
+  def prefetch(self, terms):
+    """
+    Load the word fingerprints for all the given terms into the fingerprint
+    store in bulk, e.g. with the vocabulary of a corpus before training. Does
+    nothing if the encoder has no fingerprint store.
+
+    @param terms    (iterable)        Tokens to fetch fingerprints for.
+    """
+    store = getattr(self, "fingerprintStore", None)
+    if store is not None:
+      store.prefetch(terms)
 
 
   def encodeIntoArray(self, inputText, output):
@@ -357,7 +424,7 @@ class CioEncoder(LanguageEncoder):
     @return                 (list)            List of dictionaries, where keys
                                               are terms and likelihood scores.
     """
-    terms = self.client.bitmapToTerms(encoding, numTerms=numTerms)
+    terms = self._getClient().bitmapToTerms(encoding, numTerms=numTerms)
     # Convert cortipy response to list of tuples (term, weight)
     return [(term["term"], term["score"]) for term in terms]
 
@@ -371,10 +438,11 @@ class CioEncoder(LanguageEncoder):
     """
     try:
       if method == "df":
+        client = self._getClient()
         tokens = list(itertools.chain.from_iterable(
-          [t.split(",") for t in self.client.tokenize(text)]))
+          [t.split(",") for t in client.tokenize(text)]))
         encoding = min(
-          [self.client.getBitmap(t) for t in tokens], key=lambda x: x["df"])
+          [client.getBitmap(t) for t in tokens], key=lambda x: x["df"])
       elif method == "keyword":
         encoding = self.getUnionEncoding(text)
       else:
@@ -409,7 +477,7 @@ class CioEncoder(LanguageEncoder):
     if not isinstance(bitmap1 and bitmap2, list):
       raise TypeError("Comparison bitmaps must be lists.")
 
-    return self.client.compare(bitmap1, bitmap2)
+    return self._getClient().compare(bitmap1, bitmap2)
 
 
   def createCategory(self, label, positives, negatives=None):
@@ -428,7 +496,8 @@ class CioEncoder(LanguageEncoder):
     if not isinstance(positives and negatives, list):
       raise TypeError("Input bitmaps must be lists.")
 
-    return self.client.createClassification(label, positives, negatives)
+    return self._getClient().createClassification(label, positives,
+                                                  negatives)
 
 
   def getWidth(self):
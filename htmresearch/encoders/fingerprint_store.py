@@ -0,0 +1,237 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Persistent term -> fingerprint store for the language encoders.
+
+All fingerprints live in a single SQLite file as packed uint32 position arrays,
+with an in-process LRU cache in front of it. Terms missing from the file are
+fetched from a pluggable backend (the Cortical.io REST API, or an offline
+backend for tests and air-gapped runs) and written back in one transaction.
+"""
+
+import hashlib
+import os
+import sqlite3
+
+from collections import OrderedDict
+
+import numpy
+
+
+
+# SQLite limits the number of host parameters in a single statement
+_MAX_QUERY_TERMS = 500
+
+
+
+class CorticalClientBackend(object):
+  """Fetches word fingerprints one term at a time through a cortipy client."""
+
+  def __init__(self, client):
+    self.client = client
+
+
+  def getPositions(self, term):
+    return self.client.getBitmap(term)["fingerprint"]["positions"]
+
+
+
+class RandomFingerprintBackend(object):
+  """
+  Offline backend that returns a deterministic pseudo-random fingerprint for
+  every term. The positions depend only on the term, n, w and seed, so the
+  same vocabulary always maps to the same SDRs without a network connection.
+  """
+
+  def __init__(self, n, w, seed=42):
+    """
+    @param n      (int)     Total number of bits in a fingerprint.
+    @param w      (int)     Number of active bits in a fingerprint.
+    @param seed   (int)     Mixed into the per-term random seed.
+    """
+    if w > n:
+      raise ValueError("Number of active bits w must not exceed n.")
+    self.n = n
+    self.w = w
+    self.seed = seed
+
+
+  def getPositions(self, term):
+    if isinstance(term, unicode):
+      term = term.encode("utf-8")
+    digest = hashlib.md5("{}:{}".format(self.seed, term)).hexdigest()
+    rng = numpy.random.RandomState(int(digest[:8], 16))
+    return numpy.sort(rng.choice(self.n, self.w, replace=False))
+
+
+
+class FingerprintStore(object):
+  """
+  Maps terms to fingerprint positions, backed by a single SQLite file.
+
+  Lookups first hit an in-memory LRU cache, then the SQLite file, and only then
+  the backend. Use prefetch() with the full vocabulary of a corpus to resolve
+  every term with a handful of bulk queries before encoding starts.
+  """
+
+  def __init__(self, path, backend=None, cacheSize=100000):
+    """
+    @param path       (str)     SQLite file holding the fingerprints; created
+                                if it does not exist.
+    @param backend    (object)  Provides getPositions(term) for terms not yet
+                                in the store. If None, unknown terms raise a
+                                KeyError.
+    @param cacheSize  (int)     Max number of fingerprints kept in memory.
+    """
+    self.path = path
+    self.backend = backend
+    self.cacheSize = cacheSize
+
+    self._cache = OrderedDict()
+    self._connection = None
+
+
+  def __getstate__(self):
+    # SQLite connections can't be pickled; reopen lazily after unpickling
+    state = self.__dict__.copy()
+    state["_connection"] = None
+    state["_cache"] = OrderedDict()
+    return state
+
+
+  def _connect(self):
+    if self._connection is None:
+      directory = os.path.dirname(os.path.abspath(self.path))
+      if not os.path.exists(directory):
+        os.makedirs(directory)
+      self._connection = sqlite3.connect(self.path)
+      self._connection.execute(
+        "CREATE TABLE IF NOT EXISTS fingerprints "
+        "(term TEXT PRIMARY KEY, positions BLOB)")
+    return self._connection
+
+
+  def close(self):
+    if self._connection is not None:
+      self._connection.close()
+      self._connection = None
+
+
+  def __len__(self):
+    return self._connect().execute(
+      "SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+
+
+  def __contains__(self, term):
+    if term in self._cache:
+      return True
+    row = self._connect().execute(
+      "SELECT 1 FROM fingerprints WHERE term = ?", (term,)).fetchone()
+    return row is not None
+
+
+  def getPositions(self, term):
+    """
+    @param term       (str)           Single token.
+    @return           (numpy.array)   Sorted uint32 fingerprint positions.
+    """
+    positions = self._cache.get(term)
+    if positions is not None:
+      # Mark as most recently used
+      del self._cache[term]
+      self._cache[term] = positions
+      return positions
+
+    row = self._connect().execute(
+      "SELECT positions FROM fingerprints WHERE term = ?", (term,)).fetchone()
+    if row is not None:
+      positions = self._unpack(row[0])
+    else:
+      positions = self._fetch([term])[term]
+
+    self._remember(term, positions)
+    return positions
+
+
+  def prefetch(self, terms):
+    """
+    Resolve every term in the iterable up front. Duplicates are removed, terms
+    already in the file are loaded with bulk queries, and only the remainder is
+    requested from the backend and stored in a single transaction.
+
+    @param terms      (iterable)      Tokens, e.g. a corpus vocabulary.
+    @return           (int)           Number of terms fetched from the backend.
+    """
+    pending = set(terms)
+    pending.difference_update(self._cache)
+    pending = sorted(pending)
+
+    connection = self._connect()
+    missing = set(pending)
+    for start in xrange(0, len(pending), _MAX_QUERY_TERMS):
+      chunk = pending[start:start + _MAX_QUERY_TERMS]
+      query = "SELECT term, positions FROM fingerprints WHERE term IN ({})"
+      rows = connection.execute(
+        query.format(",".join("?" * len(chunk))), chunk)
+      for term, blob in rows:
+        missing.discard(term)
+        self._remember(term, self._unpack(blob))
+
+    fetched = self._fetch(sorted(missing))
+    for term, positions in fetched.iteritems():
+      self._remember(term, positions)
+
+    return len(fetched)
+
+
+  def _fetch(self, terms):
+    """Get fingerprints from the backend and persist them."""
+    if not terms:
+      return {}
+    if self.backend is None:
+      raise KeyError("No fingerprint stored for '{}' and no backend to fetch "
+                     "it from.".format(terms[0]))
+
+    fetched = OrderedDict()
+    for term in terms:
+      fetched[term] = numpy.sort(
+        numpy.asarray(self.backend.getPositions(term), dtype=numpy.uint32))
+
+    connection = self._connect()
+    with connection:
+      connection.executemany(
+        "INSERT OR REPLACE INTO fingerprints (term, positions) VALUES (?, ?)",
+        ((term, sqlite3.Binary(positions.tobytes()))
+         for term, positions in fetched.iteritems()))
+
+    return fetched
+
+
+  def _remember(self, term, positions):
+    self._cache[term] = positions
+    while len(self._cache) > self.cacheSize:
+      self._cache.popitem(last=False)
+
+
+  @staticmethod
+  def _unpack(blob):
+    return numpy.frombuffer(blob, dtype=numpy.uint32)
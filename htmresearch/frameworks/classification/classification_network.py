@@ -23,7 +23,6 @@
 The methods here are a factory to create a classification network
 of any of sensor, SP, TM, TP, and classifier regions.
 """
-import copy
 import simplejson as json
 import logging
 import numpy
@@ -371,59 +370,149 @@ def _stopLearning(network, trainedRegionNames, recordNumber):
 
 
 
+def _getPartitionSchedule(networkPartitions, numRecords):
+  """
+  Work out up front at which records the learning phases change.
+
+  A partition takes effect after the record at its index has been run, and
+  only once every partition before it has; partitions whose index is not
+  after the previous one's never take effect, and neither do the ones after
+  them. The test partition, always the last one, stays in effect.
+
+  @param networkPartitions: (list of tuples) Region names and index at which
+    the region is to begin learning, including a test partition (the last
+    entry).
+  @param numRecords: (int) Number of records of the input dataset.
+  @return schedule: (list of tuples) (record number, partition name) for each
+    partition that takes effect, in order.
+  """
+  schedule = []
+  lastRecord = -1
+  for partitionName, index in networkPartitions:
+    if index <= lastRecord or index >= numRecords:
+      break
+    schedule.append((index, partitionName))
+    lastRecord = index
+    if partitionName == TEST_PARTITION_NAME:
+      break
+
+  return schedule
+
+
+
+class _OutputCapture(object):
+  """
+  Collects one output of a region after every record into a preallocated
+  array. The output buffer is fetched once and copied from directly, as long
+  as the Network API hands back a view of it.
+  """
+
+  def __init__(self, region, outputName, numRecords):
+    self.region = region
+    self.outputName = outputName
+
+    output = region.getOutputData(outputName)
+    self.values = numpy.zeros((numRecords, output.size), dtype=output.dtype)
+    self._numCaptured = 0
+
+    # Only keep the buffer if getOutputData() returns views of it
+    self._buffer = output
+    if not numpy.may_share_memory(output, region.getOutputData(outputName)):
+      self._buffer = None
+
+
+  def capture(self):
+    if self._buffer is None:
+      output = self.region.getOutputData(self.outputName)
+    else:
+      output = self._buffer
+    self.values[self._numCaptured] = output
+    self._numCaptured += 1
+
+
+
+def _applyPartition(network, trainedRegionNames, partitionName, recordNumber):
+  if partitionName == TEST_PARTITION_NAME:
+    _stopLearning(network, trainedRegionNames, recordNumber)
+  else:
+    trainedRegionNames.append(partitionName)
+    _enableRegionLearning(network,
+                          trainedRegionNames,
+                          partitionName,
+                          recordNumber)
+
+
+
 def trainNetwork(network, networkConfig, networkPartitions, numRecords):
   """
   Train the network.
 
+  The records between partition boundaries are run with a single
+  network.run() call each. In the test partition the network is stepped
+  record by record, and only the sensor categories and classifier outputs are
+  copied out; the inferences are computed for all test records at the end.
+
   @param network: (Network) a Network instance to run.
   @param networkConfig: (dict) params for network regions.
   @param networkPartitions: (list of tuples) Region names and index at which the
    region is to begin learning, including a test partition (the last entry).
   @param numRecords: (int) Number of records of the input dataset.
   """
-  
-  partitions = copy.deepcopy(networkPartitions) # preserve original partitions
-  
   sensorRegion = network.regions[
     networkConfig["sensorRegionConfig"].get("regionName")]
   classifierRegion = network.regions[
     networkConfig["classifierRegionConfig"].get("regionName")]
 
+  schedule = dict(_getPartitionSchedule(networkPartitions, numRecords))
+  testIndex = max(networkPartitions[-1][1], 0)
+
   # Keep track of the regions that have been trained.
   trainedRegionNames = []
-  numCorrect = 0
-  numTestRecords = 0
-  for recordNumber in xrange(numRecords):
-    # Run the network for a single iteration.
-    network.run(1)
 
-    if recordNumber == partitions[0][1]:
-      # end of the current partition
-      partitionName = partitions[0][0]
-
-      if partitionName == TEST_PARTITION_NAME:
-        _stopLearning(network, trainedRegionNames, recordNumber)
+  # Training: run the network up to each partition boundary in one go
+  recordNumber = 0
+  for boundary in sorted(schedule):
+    if boundary >= testIndex:
+      break
+    network.run(boundary + 1 - recordNumber)
+    recordNumber = boundary + 1
+    _applyPartition(network, trainedRegionNames, schedule[boundary], boundary)
+
+  if recordNumber < min(testIndex, numRecords):
+    network.run(min(testIndex, numRecords) - recordNumber)
+    recordNumber = min(testIndex, numRecords)
+
+  # Testing: step through the remaining records, capturing the outputs
+  numTestRecords = numRecords - recordNumber
+  actualCapture = inferenceCapture = None
+  for recordNumber in xrange(recordNumber, numRecords):
+    network.run(1)
 
-      else:
-        partitions.pop(0)
-        trainedRegionNames.append(partitionName)
-        _enableRegionLearning(network,
-                              trainedRegionNames,
-                              partitionName,
-                              recordNumber)
+    if recordNumber in schedule:
+      _applyPartition(network, trainedRegionNames, schedule[recordNumber],
+                      recordNumber)
 
-    if recordNumber >= partitions[-1][1]:
-      # evaluate the predictions on the test set
-      # classifierConfig = networkConfig["classifierRegionConfig"]
+    if actualCapture is None:
       classifierRegion.setParameter("inferenceMode", True)
+      actualCapture = _OutputCapture(sensorRegion, "categoryOut",
+                                     numTestRecords)
+      inferenceCapture = _OutputCapture(classifierRegion, "categoriesOut",
+                                        numTestRecords)
+    actualCapture.capture()
+    inferenceCapture.capture()
 
-      actualValue = sensorRegion.getOutputData("categoryOut")[0]
-      inferredValue = _getClassifierInference(classifierRegion)
-      if actualValue == inferredValue:
-        numCorrect += 1
-      _LOGGER.debug("recordNum=%s, actualValue=%s, inferredValue=%s"
-               % (recordNumber, actualValue, inferredValue))
-      numTestRecords += 1
+  numCorrect = 0
+  if numTestRecords > 0:
+    actualValues = actualCapture.values[:, 0]
+    inferredValues = _getClassifierInferences(classifierRegion,
+                                              inferenceCapture.values)
+    numCorrect = int(numpy.sum(actualValues == inferredValues))
+
+    if _LOGGER.isEnabledFor(logging.DEBUG):
+      for i, (actualValue, inferredValue) in enumerate(
+          zip(actualValues, inferredValues)):
+        _LOGGER.debug("recordNum=%s, actualValue=%s, inferredValue=%s"
+                 % (testIndex + i, actualValue, inferredValue))
 
   classificationAccuracy = round(100.0 * numCorrect / numTestRecords, 2)
 
@@ -439,15 +528,26 @@ def trainNetwork(network, networkConfig, networkPartitions, numRecords):
 
 def _getClassifierInference(classifierRegion):
   """Return output categories from the classifier region."""
+  return _getClassifierInferences(
+    classifierRegion, classifierRegion.getOutputData("categoriesOut")[None])[0]
+
+
+
+def _getClassifierInferences(classifierRegion, categoriesOut):
+  """
+  Return the inferred category of each row of captured classifier outputs.
+
+  @param classifierRegion: (Region) the classifier region.
+  @param categoriesOut: (numpy.array) one categoriesOut output per row.
+  """
   if classifierRegion.type == "py.KNNClassifierRegion":
     # The use of numpy.lexsort() here is to first sort by labelFreq, then
     # sort by random values; this breaks ties in a random manner.
-    inferenceValues = classifierRegion.getOutputData("categoriesOut")
-    randomValues = numpy.random.random(inferenceValues.size)
-    return numpy.lexsort((randomValues, inferenceValues))[-1]
+    randomValues = numpy.random.random(categoriesOut.shape)
+    return numpy.lexsort((randomValues, categoriesOut))[:, -1]
 
   elif classifierRegion.type == "py.CLAClassifierRegion":
-    return classifierRegion.getOutputData("categoriesOut")[0]
+    return categoriesOut[:, 0]
 
 
 
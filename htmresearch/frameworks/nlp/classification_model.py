@@ -29,6 +29,45 @@ from htmresearch.support.text_preprocess import TextPreprocess
 
 
 
+class PartitionIndex(object):
+  """
+  Groups the patterns of a classifier by partition (prototype) id, so the
+  minimum distance to each partition can be computed with a single
+  numpy.minimum.reduceat() rather than a lookup per partition.
+  """
+
+  def __init__(self, idList):
+    """
+    @param idList (list) Partition id of each stored pattern, in the order of
+                         the distances returned by the classifier.
+    """
+    self.idList = list(idList)
+    ids = numpy.array(self.idList)
+
+    # Stable sort so patterns stay in classifier order within a partition
+    self.permutation = ids.argsort(kind="mergesort")
+    sortedIds = ids[self.permutation]
+    groupStarts = numpy.ones(len(sortedIds), dtype=bool)
+    groupStarts[1:] = sortedIds[1:] != sortedIds[:-1]
+    self.offsets = numpy.flatnonzero(groupStarts)
+    self.ids = sortedIds[self.offsets].tolist()
+
+
+  def matches(self, idList):
+    return self.idList == idList
+
+
+  def minDistances(self, distances):
+    """
+    @param distances (numpy array) Distance to each stored pattern.
+    @return          (numpy array) Minimum distance for each id in self.ids.
+    """
+    if not len(self.offsets):
+      return numpy.zeros(0)
+    return numpy.minimum.reduceat(distances[self.permutation], self.offsets)
+
+
+
 class ClassificationModel(object):
   """
   Base class for NLP models of classification tasks. When inheriting from this
@@ -394,6 +433,19 @@ class ClassificationModel(object):
     pass
 
 
+  def _getPartitionIndex(self, idList):
+    """
+    Return the PartitionIndex for the prototype ids returned by inferToken(),
+    reusing the previous one while the classifier's stored prototypes are
+    unchanged; any learning changes idList, so the index is rebuilt then.
+    """
+    partitions = getattr(self, "_partitionIndex", None)
+    if partitions is None or not partitions.matches(idList):
+      partitions = PartitionIndex(idList)
+      self._partitionIndex = partitions
+    return partitions
+
+
   def _inferDocumentDetailed(self, tokenList, sortResults=True):
     """
     Run inference on the model with this list of tokens and return classification
@@ -422,7 +474,9 @@ class ClassificationModel(object):
 
     classifier = self.getClassifier()
     lastTokenIndex = len(tokenList) - 1
-    distancesForEachId = defaultdict(float)
+    partitions = None
+    distanceTotals = None
+    carriedDistances = defaultdict(float)
     voteTotals = numpy.zeros(self.numLabels)
     count = 0
     for i, token in enumerate(tokenList):
@@ -441,31 +495,43 @@ class ClassificationModel(object):
           # We only care about 0 distances (exact matches), disregard all others
           distances[numpy.where(distances != 0)] = 1.0
 
+        if partitions is None or not partitions.matches(idList):
+          if partitions is not None:
+            # The stored prototypes changed mid-document; keep what we have
+            for protoId, dist in zip(partitions.ids, distanceTotals):
+              carriedDistances[protoId] += dist
+          partitions = self._getPartitionIndex(idList)
+          distanceTotals = numpy.zeros(len(partitions.ids))
+
         # For each prototype id (in the classifier), add the distance to this
         # inference token. When there are multiple prototypes per id, we use the
         # total add the minimum distance among the prototypes
-        for protoId in set(idList):
-          patternIds = classifier.getPatternIndicesWithPartitionId(protoId)
-          distancesForEachId[protoId] += distances[patternIds].min()
+        distanceTotals += partitions.minDistances(distances)
+
+    # Distance from each prototype id to this document, in a numpy array
+    # ordered consistently with a list of protoIds
+    if partitions is None:
+      protoIdList = []
+      distanceToProtoIds = numpy.zeros(0)
+    elif not carriedDistances:
+      protoIdList = list(partitions.ids)
+      distanceToProtoIds = distanceTotals
+    else:
+      for protoId, dist in zip(partitions.ids, distanceTotals):
+        carriedDistances[protoId] += dist
+      protoIdList = carriedDistances.keys()
+      distanceToProtoIds = numpy.array(carriedDistances.values())
 
     if count:
       # Normalize for the number of inferred tokens that yielded results
       normalizedVotes = voteTotals / float(count)
-      for protoId, dist in distancesForEachId.iteritems():
-        distancesForEachId[protoId] = dist / float(count)
+      distanceToProtoIds = distanceToProtoIds / float(count)
     else:
       normalizedVotes = voteTotals
 
-    # Put distance from each prototype id to this document into a numpy array
-    # ordered consistently with a list of protoIds
-    protoIdList = distancesForEachId.keys()
-    distanceToProtoIds = numpy.zeros(len(protoIdList))
-    for i, protoId in enumerate(protoIdList):
-      distanceToProtoIds[i] = distancesForEachId.get(protoId, numpy.inf)
-
     # Sort the results if requested
     if sortResults:
-      sortedIndices = distanceToProtoIds.argsort()
+      sortedIndices = distanceToProtoIds.argsort(kind="mergesort")
       sortedDistances = distanceToProtoIds[sortedIndices]
       sortedIdList = [protoIdList[i] for i in sortedIndices]
 
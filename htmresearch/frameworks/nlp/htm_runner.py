@@ -50,6 +50,7 @@ class HTMRunner(Runner):
                votingMethod="most",
                classificationFile="",
                seed=42,
+               networkDataFormat="csv",
                **kwargs):
     """
     @param networkConfigPath  (str)    Path to JSON specifying network params.
@@ -57,6 +58,9 @@ class HTMRunner(Runner):
     @param votingMethod       (str)    Classify with "last" token's score or
                                        "most" frequent of the sequence.
     @param classificationFile (str)    Path to JSON that maps labels to ids.
+    @param networkDataFormat  (str)    Format of generated network data files:
+                                       "csv" for FileRecordStream, or "npz" for
+                                       the binary network_data_file format.
 
     See base class constructor for the other parameters.
     """
@@ -75,6 +79,10 @@ class HTMRunner(Runner):
     if classificationFile == "" and not generateData:
       raise ValueError("Must give classificationFile if not generating data")
     self.classificationFile = classificationFile
+    if networkDataFormat not in ("csv", "npz"):
+      raise ValueError("Unknown network data format '{}'."
+                       .format(networkDataFormat))
+    self.networkDataFormat = networkDataFormat
 
     # Setup data now in order to init the network model. If you want to
     # specify data params, just call setupNetData() again later.
@@ -153,15 +161,22 @@ class HTMRunner(Runner):
     filename, ext = os.path.splitext(self.dataPath)
     self.classificationFile = "{}_categories.json".format(filename)
 
+    if self.networkDataFormat == "npz":
+      ext = ".npz"
+
     # Generate one data file for each experiment iteration.
     if self.experimentType == "k-folds" and not self.orderedSplit:
       # only randomize the data order once for k-folds cross validation
       ndg.randomizeData(seed)
+    reshuffle = self.experimentType != "k-folds" and not self.orderedSplit
     for i in xrange(splits):
-      if self.experimentType != "k-folds" and not self.orderedSplit:
+      if reshuffle:
         ndg.randomizeData(seed)
         seed += 1
-      # ext='.csv'
+      elif i > 0:
+        # The record order is the same for every iteration, so share the file
+        self.dataFiles.append(self.dataFiles[0])
+        continue
       dataFile = "{}_network_{}{}".format(filename, i, ext)
       ndg.saveData(dataFile, self.classificationFile)
       self.dataFiles.append(dataFile)
@@ -196,9 +211,11 @@ class HTMRunner(Runner):
 
     # Convert the dict of strings -> ids to a list of strings ordered by id
     self.labelRefs = zip(*sorted(labelToId.iteritems(), key=lambda x: x[1]))[0]
+    labelIndices = {label: i for i, label in enumerate(self.labelRefs)}
     for recordNumber, data in self.dataDict.iteritems():
       self.dataDict[recordNumber] = (data[0], numpy.array(
-        [self.labelRefs.index(label) for label in data[1]]), data[2])
+        [labelIndices[label] for label in data[1]], dtype=numpy.int32),
+        data[2])
 
 
   def resetModel(self, trial=0):
@@ -211,7 +228,7 @@ class HTMRunner(Runner):
     #   otherwise you're creating a new model instance twice each experiment
 
 
-  def setupData(self, _):
+  def setupData(self, _, cacheData=False):
     """Passthrough b/c network data generation was done upfront."""
     pass
 
@@ -46,7 +46,7 @@ from tqdm import tqdm
 
 from htmresearch.encoders import EncoderTypes
 from htmresearch.frameworks.nlp.classification_model import ClassificationModel
-from htmresearch.support.csv_helper import readCSV
+from htmresearch.support.csv_helper import CSVCache, readCSV
 from htmresearch.support.register_regions import registerAllResearchRegions
 from htmresearch.frameworks.nlp.model_factory import (
   ClassificationModelTypes,
@@ -132,13 +132,14 @@ class ImbuModels(object):
 
 
   def __init__(self, dataPath, cacheRoot=None, modelSimilarityMetric=None,
-      apiKey=None, retina=None):
+      apiKey=None, retina=None, cacheData=False):
 
     if not dataPath:
       raise RuntimeError("Imbu needs a CSV datafile to run.")
 
     self.dataPath = dataPath
     self.cacheRoot = cacheRoot
+    self.cacheData = cacheData
     self.modelSimilarityMetric = (
       modelSimilarityMetric or self.defaultSimilarityMetric
     )
@@ -258,10 +259,22 @@ class ImbuModels(object):
 
   def _loadData(self):
     """ Load data, returning a dict of text data objects.
-    Keys are line numbers at which the text appears in the CSV file.
+    Keys are line numbers at which the text appears in the CSV file. With
+    cacheData the dict is a CSVCache, whose columnar cache is kept under
+    cacheRoot if given, else next to the CSV.
     """
-    return readCSV(self.dataPath,
-                   numLabels=0) # 0 to train models in unsupervised fashion
+    if not self.cacheData:
+      return readCSV(self.dataPath,
+                     numLabels=0) # 0 to train models in unsupervised fashion
+
+    cacheDir = None
+    if self.cacheRoot is not None:
+      cacheDir = os.path.join(
+        self.cacheRoot, os.path.basename(self.dataPath) + ".cache")
+
+    return CSVCache(self.dataPath,
+                    numLabels=0, # 0 to train models in unsupervised fashion
+                    cacheDir=cacheDir)
 
 
   def train(self, model, savePath=None):
@@ -475,7 +488,8 @@ def startImbu(args):
     modelSimilarityMetric=args.modelSimilarityMetric,
     dataPath=args.dataPath,
     retina=args.imbuRetinaId,
-    apiKey=args.corticalApiKey
+    apiKey=args.corticalApiKey,
+    cacheData=args.cacheData
   )
 
   model = imbu.createModel(args.modelName,
@@ -520,6 +534,12 @@ def getArgs():
   parser.add_argument("--cacheRoot",
                       type=str,
                       help="Root directory in which to cache encodings")
+  parser.add_argument("--cacheData",
+                      action="store_true",
+                      default=False,
+                      help="Keep a columnar cache of the CSV under cacheRoot, "
+                           "or next to the CSV, and reuse it while the CSV is "
+                           "unchanged.")
   parser.add_argument("--modelSimilarityMetric",
                       default=ImbuModels.defaultSimilarityMetric,
                       type=str,
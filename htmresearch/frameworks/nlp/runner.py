@@ -21,9 +21,9 @@
 
 import cPickle as pkl
 import itertools
+import multiprocessing
 import numpy
 import os
-import random
 
 from collections import defaultdict
 
@@ -37,8 +37,8 @@ from htmresearch.frameworks.nlp.classify_keywords import (
 from htmresearch.frameworks.nlp.classify_windows import (
   ClassificationModelWindows)
 from htmresearch.support.csv_helper import (
-  readCSV, writeFromDict, mapLabelRefs)
-from htmresearch.support.data_split import KFolds
+  CSVCache, readCSV, writeFromDict, mapLabelRefs)
+from htmresearch.support.data_split import IncrementalSplit, KFolds
 from htmresearch.frameworks.nlp.classification_metrics import (
   evaluateResults, calculateClassificationResults)
 
@@ -51,6 +51,25 @@ _MODEL_MAPPING = {
   "CioEndpoint": ClassificationModelEndpoint,
   }
 
+# Runner whose trials are being run by runExperiment() worker processes; set
+# before the pool is forked so workers inherit it instead of unpickling it
+_trialRunner = None
+
+
+
+def _runTrial(args):
+  """
+  Train and test one trial in a worker process, returning its results and the
+  runner state testing() left for it, see Runner.getTrialState().
+  """
+  trial, seed = args
+  _trialRunner.resetModel(trial)
+  if _trialRunner.verbosity > 0:
+    print "\tTraining and testing for run {}.".format(trial)
+  _trialRunner.training(trial)
+  _trialRunner.testing(trial, seed)
+  return _trialRunner.results[-1], _trialRunner.getTrialState(trial)
+
 
 
 class Runner(object):
@@ -203,15 +222,21 @@ class Runner(object):
     self.model.saveModel(trial)
 
 
-  def setupData(self, preprocess=False):
+  def setupData(self, preprocess=False, cacheData=False):
     """
     Get the data from CSV and preprocess if specified. The call to readCSV()
     assumes a specific CSV format, detailed in its docstring.
 
     @param preprocess   (bool)    Whether or not to preprocess the data when
                                   reading in samples.
+    @param cacheData    (bool)    Read the CSV through a columnar CSVCache that
+                                  is reused by later runs on the same file.
     """
-    self.dataDict = readCSV(self.dataPath, numLabels=self.numClasses)
+    if cacheData:
+      corpus = CSVCache(self.dataPath, numLabels=self.numClasses)
+      self.dataDict = corpus.toDataDict()
+    else:
+      self.dataDict = readCSV(self.dataPath, numLabels=self.numClasses)
 
     if self.experimentType == "incremental":
       # stop now if the data won't work for the specified experiment
@@ -239,16 +264,70 @@ class Runner(object):
     self.patterns = self.model.encodeSamples(self.samples, write=writeEncodings)
 
 
-  def runExperiment(self, seed=42):
-    """Train and test the model for each trial specified by self.splitting."""
+  def runExperiment(self, seed=42, workers=1):
+    """
+    Train and test the model for each trial specified by self.splitting.
+
+    @param seed     (int)     Random seed for partitioning and testing.
+    @param workers  (int)     Number of processes to run trials in parallel.
+                              The last trial runs in this process, so
+                              self.model ends up the same as when running
+                              serially; the others each train a forked copy of
+                              the model. Results are appended in trial order
+                              either way, and the state testing() changes in
+                              the workers is merged back, see
+                              getTrialState().
+    """
     self.partitionIndices(seed)
 
-    for i, _ in enumerate(self.partitions):
-      self.resetModel(i)
-      if self.verbosity > 0:
-        print "\tTraining and testing for run {}.".format(i)
-      self.training(i)
-      self.testing(i, seed)
+    if workers <= 1 or len(self.partitions) <= 1:
+      for i, _ in enumerate(self.partitions):
+        self.resetModel(i)
+        if self.verbosity > 0:
+          print "\tTraining and testing for run {}.".format(i)
+        self.training(i)
+        self.testing(i, seed)
+      return
+
+    # Forked workers share self.patterns with this process copy-on-write
+    lastTrial = len(self.partitions) - 1
+
+    global _trialRunner
+    _trialRunner = self
+    pool = multiprocessing.Pool(min(workers - 1, lastTrial) or 1)
+    try:
+      pending = pool.map_async(
+        _runTrial, [(i, seed) for i in xrange(lastTrial)], chunksize=1)
+      lastResults, _ = _runTrial((lastTrial, seed))
+      trials = pending.get()
+      for trial, (_, state) in enumerate(trials):
+        self.setTrialState(trial, state)
+      self.results[-1:] = [results for results, _ in trials] + [lastResults]
+      pool.close()
+    finally:
+      pool.terminate()
+      pool.join()
+      _trialRunner = None
+
+
+  def getTrialState(self, trial):
+    """
+    Runner state that testing() may change for a trial, which is lost when the
+    trial runs in a worker process unless handed back to setTrialState(). By
+    default it's the trial's partition, which HTMRunner rewrites to the
+    indices of its network data file. State that is overwritten by every
+    trial, like HTMRunner's self.samples, ends up as the last trial leaves it,
+    as that trial runs in this process.
+
+    @param trial  (int)   Trial number.
+    @return       (dict)  Picklable state of the trial.
+    """
+    return {"partition": self.partitions[trial]}
+
+
+  def setTrialState(self, trial, state):
+    """Merge the state returned by getTrialState() in a worker process."""
+    self.partitions[trial] = state["partition"]
 
 
   def partitionIndices(self, seed=42):
@@ -259,20 +338,8 @@ class Runner(object):
       self.partitions = KFolds(self.folds).split(
         range(len(self.samples)), randomize=(not self.orderedSplit), seed=seed)
     else:
-      # TODO: use StandardSplit in data_split.py
-      length = len(self.samples)
-      if self.orderedSplit:
-        for split in self.trainSizes:
-          trainIndices = range(split)
-          testIndices = range(split, length)
-          self.partitions.append((trainIndices, testIndices))
-      else:
-        # randomly sampled, not repeated
-        random.seed(seed)
-        for split in self.trainSizes:
-          trainIndices = random.sample(xrange(length), split)
-          testIndices = [i for i in xrange(length) if i not in trainIndices]
-          self.partitions.append((trainIndices, testIndices))
+      self.partitions = IncrementalSplit(self.trainSizes).split(
+        range(len(self.samples)), randomize=(not self.orderedSplit), seed=seed)
 
 
   def training(self, trial):
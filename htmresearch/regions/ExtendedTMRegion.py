@@ -314,10 +314,14 @@ class ExtendedTMRegion(PyRegion):
       # Create the TM instance
       self._tm = createModel("extended", **args)
 
-      # numpy arrays we will use for some of the outputs
-      self.activeState = numpy.zeros(self._tm.numberOfCells())
-      self.previouslyPredictedCells = numpy.zeros(self._tm.numberOfCells())
-
+    if not hasattr(self, "_outputIndices"):
+      # Cell indices of the TM state after the last compute, and the indices
+      # last written to each output buffer so only those need to be cleared
+      self._activeCells = numpy.zeros(0, dtype=numpy.int64)
+      self._predictiveCells = numpy.flatnonzero(
+        getattr(self, "previouslyPredictedCells", ()))
+      self._predictedActiveCells = numpy.zeros(0, dtype=numpy.int64)
+      self._outputIndices = {}
 
 
   def compute(self, inputs, outputs):
@@ -329,60 +333,105 @@ class ExtendedTMRegion(PyRegion):
     representation to this point and any history will then be reset. The output
     at the next compute will start fresh, presumably with bursting columns.
     """
-
-    activeColumns = set(numpy.where(inputs["feedForwardInput"] == 1)[0])
+    activeColumns = numpy.flatnonzero(inputs["feedForwardInput"] == 1)
 
     if "externalInput" in inputs:
-      activeExternalCells = set(numpy.where(inputs["externalInput"] == 1)[0])
+      activeExternalCells = numpy.flatnonzero(inputs["externalInput"] == 1)
     else:
       activeExternalCells = None
 
     if "apicalInput" in inputs:
-      activeApicalCells = set(numpy.where(inputs["apicalInput"] == 1)[0])
+      activeApicalCells = numpy.flatnonzero(inputs["apicalInput"] == 1)
     else:
       activeApicalCells = None
 
+    self.computeSparse(activeColumns, activeExternalCells, activeApicalCells)
+
+    # Only touch the output entries that change
+    self._writeOutput(outputs, "activeCells", self._activeCells)
+    self._writeOutput(outputs, "predictiveCells", self._predictiveCells)
+    self._writeOutput(outputs, "predictedActiveCells",
+                      self._predictedActiveCells)
+    self._writeOutput(outputs, "feedForwardOutput",
+                      self.getOutputIndices(self.defaultOutputType))
+
+    # Handle reset after current input has been processed
+    if "resetIn" in inputs:
+      assert len(inputs["resetIn"]) == 1
+      if inputs["resetIn"][0] != 0:
+        self.reset()
+
+
+  def computeSparse(self, activeColumns, activeExternalCells=None,
+                    activeApicalCells=None):
+    """
+    Run one iteration of TM's compute on index inputs, without going through
+    dense arrays. Use getOutputIndices() for the resulting cell indices.
+
+    @param activeColumns        (iterable)  Indices of the active columns.
+    @param activeExternalCells  (iterable)  Indices of the active external
+                                            inputs, or None.
+    @param activeApicalCells    (iterable)  Indices of the active apical
+                                            inputs, or None.
+    """
+    activeColumns = set(activeColumns)
+    if activeExternalCells is not None:
+      activeExternalCells = set(activeExternalCells)
+    if activeApicalCells is not None:
+      activeApicalCells = set(activeApicalCells)
+
     self._tm.compute(activeColumns,
                      activeExternalCells=activeExternalCells,
                      activeApicalCells=activeApicalCells,
                      formInternalConnections=self.formInternalConnections,
                      learn=self.learningMode)
 
-    # Compute predictedActiveCells explicitly
-    self.activeState[:] = 0
-    self.activeState[self._tm.getActiveCells()] = 1
-    predictedActiveCells = self.activeState*self.previouslyPredictedCells
-
-    self.previouslyPredictedCells[:] = 0
-    self.previouslyPredictedCells[self._tm.getPredictiveCells()] = 1
-
-    # Copy numpy values into the various outputs
-    outputs["activeCells"][:] = self.activeState
-    outputs["predictiveCells"][:] = self.previouslyPredictedCells
-    outputs["predictedActiveCells"][:] = predictedActiveCells
-
-    # Send appropriate output to feedForwardOutput
-    if self.defaultOutputType == "active":
-      outputs["feedForwardOutput"][:] = self.activeState
-    elif self.defaultOutputType == "predictive":
-      outputs["feedForwardOutput"][:] = self.previouslyPredictedCells
-    elif self.defaultOutputType == "predictedActiveCells":
-      outputs["feedForwardOutput"][:] = predictedActiveCells
+    # The TM doesn't report predictedActiveCells, so intersect the active cells
+    # with the cells that were predictive before this step
+    activeCells = self._toIndices(self._tm.getActiveCells())
+    self._predictedActiveCells = numpy.intersect1d(
+      activeCells, self._predictiveCells, assume_unique=True)
+    self._activeCells = activeCells
+    self._predictiveCells = self._toIndices(self._tm.getPredictiveCells())
+
+
+  def getOutputIndices(self, outputType="active"):
+    """
+    @param outputType (str)          One of the defaultOutputType values.
+    @return           (numpy.array)  Sorted cell indices from the last compute.
+    """
+    if outputType == "active":
+      return self._activeCells
+    elif outputType == "predictive":
+      return self._predictiveCells
+    elif outputType == "predictedActiveCells":
+      return self._predictedActiveCells
     else:
-      raise Exception("Unknown outputType: " + self.defaultOutputType)
+      raise Exception("Unknown outputType: " + outputType)
 
-    # Handle reset after current input has been processed
-    if "resetIn" in inputs:
-      assert len(inputs["resetIn"]) == 1
-      if inputs["resetIn"][0] != 0:
-        self.reset()
+
+  @staticmethod
+  def _toIndices(cells):
+    return numpy.unique(numpy.fromiter(cells, dtype=numpy.int64,
+                                       count=len(cells)))
+
+
+  def _writeOutput(self, outputs, name, indices):
+    """Set the dense output to indices, clearing what was set last time."""
+    previous = self._outputIndices.get(name)
+    if previous is None:
+      outputs[name][:] = 0
+    else:
+      outputs[name][previous] = 0
+    outputs[name][indices] = 1
+    self._outputIndices[name] = indices
 
 
   def reset(self):
     """ Reset the state of the TM """
     if self._tm is not None:
       self._tm.reset()
-      self.previouslyPredictedCells[:] = 0
+      self._predictiveCells = numpy.zeros(0, dtype=numpy.int64)
 
 
   def debugPlot(self, name):
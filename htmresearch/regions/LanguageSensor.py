@@ -20,10 +20,9 @@
 #
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
-import copy
 import numpy
 
-from collections import deque
+from collections import deque, OrderedDict
 
 from nupic.bindings.regions.PyRegion import PyRegion
 
@@ -32,7 +31,9 @@ class LanguageSensor(PyRegion):
   """
   LanguageSensor (LS) is an extensible sensor for text data.
 
-  The LS obtains info from a file, csv or txt (not yet implemented).
+  The LS obtains info from a file: a network data CSV read through a
+  FileRecordStream, or a binary network data file read through a
+  htmresearch.support.network_data_file.NetworkDataFile.
 
   An LS is essentially a shell containing two objects:
 
@@ -50,18 +51,26 @@ class LanguageSensor(PyRegion):
 
   def __init__(self,
                verbosity=0,
-               numCategories=1):
+               numCategories=1,
+               cacheSize=10000):
     """Create a node without an encoder or datasource."""
     self.numCategories = numCategories
     self.verbosity = verbosity
+    self.cacheSize = cacheSize
 
     # These fields are set outside when building the region.
     self.encoder = None
     self.dataSource = None
 
-    self._outputValues = {}
+    # Outputs of the last compute, copied only when getOutputValues() asks
+    self._outputs = {}
+    self._sourceOut = None
     self._iterNum = 0
 
+    # LRU cache of token -> (active indices, values) for self._cacheEncoder
+    self._encodingCache = OrderedDict()
+    self._cacheEncoder = None
+
     self.queue = deque()
 
 
@@ -118,6 +127,13 @@ class LanguageSensor(PyRegion):
           "accessMode":"ReadWrite",
           "count":1,
           "constraints":""},
+        "cacheSize":{
+          "description":("Max number of token encodings to keep in memory; "
+                         "0 disables the cache."),
+          "dataType":"UInt32",
+          "accessMode":"ReadWrite",
+          "count":1,
+          "constraints":""},
       },
       "commands":{},
     }
@@ -151,9 +167,37 @@ class LanguageSensor(PyRegion):
       # Populate category output array by looping over the smaller of the
       # output array (size specified by numCategories) and the record's number
       # of categories.
-      [numpy.put(output, [i], cat)
-          for i, (_, cat) in enumerate(zip(output, categories))]
-      output[len(categories):] = -1
+      numCategories = min(len(output), len(categories))
+      output[:numCategories] = categories[:numCategories]
+      output[numCategories:] = -1
+
+
+  def _encodeToken(self, token, output):
+    """
+    Encode the token into output, reusing the encoding of a recent token if
+    possible. Cached encodings are dropped whenever the encoder changes.
+    """
+    if self.cacheSize <= 0:
+      self.encoder.encodeIntoArray(token, output)
+      return
+
+    if self._cacheEncoder is not self.encoder:
+      self._encodingCache.clear()
+      self._cacheEncoder = self.encoder
+
+    encoding = self._encodingCache.pop(token, None)
+    if encoding is None:
+      self.encoder.encodeIntoArray(token, output)
+      active = output.nonzero()[0]
+      encoding = (active, output[active])
+      while len(self._encodingCache) >= self.cacheSize:
+        self._encodingCache.popitem(last=False)
+    else:
+      active, values = encoding
+      output[:] = 0
+      output[active] = values
+
+    self._encodingCache[token] = encoding
 
 
   def compute(self, inputs, outputs):
@@ -179,7 +223,7 @@ class LanguageSensor(PyRegion):
     outputs["resetOut"][0] = data["_reset"]
     outputs["sequenceIdOut"][0] = data["_sequenceId"]
     self.populateCategoriesOut(data["_category"], outputs["categoryOut"])
-    self.encoder.encodeIntoArray(data["_token"], outputs["dataOut"])
+    self._encodeToken(data["_token"], outputs["dataOut"])
 
     if self.verbosity > 0:
       print "LanguageSensor outputs:"
@@ -187,12 +231,9 @@ class LanguageSensor(PyRegion):
       print "Categories out: ", outputs['categoryOut']
       print "dataOut: ", outputs["dataOut"].nonzero()[0]
 
-    # Deep copy the outputs so self._outputValues doesn't point to the values
-    # used within the Network API
-    self._outputValues = {
-      field: copy.deepcopy(value) for field, value in outputs.iteritems()
-    }
-    self._outputValues["sourceOut"] = data["_token"]
+    # Keep references only; getOutputValues() copies on demand
+    self._outputs = outputs
+    self._sourceOut = data["_token"]
 
     self._iterNum += 1
 
@@ -222,9 +263,38 @@ class LanguageSensor(PyRegion):
 
 
   def getOutputValues(self, outputName):
-    """Return the region's values for outputName.
+    """Return a copy of the region's values for outputName from the last
+    compute, so it doesn't point to the values used within the Network API.
     """
-    return self._outputValues[outputName]
+    if outputName == "sourceOut":
+      return self._sourceOut
+    return numpy.array(self._outputs[outputName])
+
+
+  def __getstate__(self):
+    # Don't serialize the Network API's output buffers or the cache
+    state = self.__dict__.copy()
+    state["_outputs"] = {name: numpy.array(value)
+                         for name, value in self._outputs.iteritems()}
+    state["_encodingCache"] = OrderedDict()
+    state["_cacheEncoder"] = None
+    return state
+
+
+  def __setstate__(self, state):
+    # Sensors pickled before the encoding cache had no cache fields
+    self.__dict__.update(state)
+    self.__dict__.setdefault("cacheSize", 10000)
+    self.__dict__.setdefault("_encodingCache", OrderedDict())
+    self.__dict__.setdefault("_cacheEncoder", None)
+
+    # and kept copies of the last outputs in _outputValues
+    if "_outputValues" in self.__dict__:
+      outputValues = dict(self.__dict__.pop("_outputValues"))
+      self._sourceOut = outputValues.pop("sourceOut", None)
+      self._outputs = outputValues
+    self.__dict__.setdefault("_outputs", {})
+    self.__dict__.setdefault("_sourceOut", None)
 
 
   def getOutputElementCount(self, name):
@@ -19,7 +19,12 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 
+import json
+
 from collections import deque
+
+import numpy
+
 from nupic.bindings.regions.PyRegion import PyRegion
 
 
@@ -27,12 +32,13 @@ class RawSensor(PyRegion):
   """
   RawSensor is a simple sensor for sending sparse data into networks.
 
-  It accepts data using the command "addDataToQueue" or through the function
-  addDataToQueue() which can be called directly from Python. Data is queued up
-  in a FIFO and each call to compute pops the top element.
+  It accepts data using the command "addDataToQueue" or through the functions
+  addDataToQueue() and addDataBatch() which can be called directly from Python.
+  Data is queued up in a FIFO and each call to compute pops the top element.
 
   Each data record consists of the non-zero indices of the sparse vector,
-  a 0/1 reset flag, and an integer sequence ID.
+  a 0/1 reset flag, and an integer sequence ID. Records are stored in CSR form,
+  as a FIFO of batches that compute() walks through with a read cursor.
   """
 
   def __init__(self,
@@ -41,8 +47,13 @@ class RawSensor(PyRegion):
     """Create an instance with the appropriate output size."""
     self.verbosity = verbosity
     self.outputWidth = outputWidth
+
+    # Each batch is a list [indices, indptr, resets, sequenceIds, next record]
     self.queue = deque()
 
+    # Non-zero indices written to dataOut by the last compute
+    self._lastNonZeros = None
+
 
   @classmethod
   def getSpec(cls):
@@ -106,18 +117,26 @@ class RawSensor(PyRegion):
     Get the next record from the queue and encode it. The fields for inputs and
     outputs are as defined in the spec above.
     """
-    if len(self.queue) > 0:
-      # Take the top element of the data queue
-      data = self.queue.pop()
-
-    else:
+    if len(self.queue) == 0:
       raise Exception("RawSensor: No data to encode: queue is empty ")
 
-    # Copy data into output vectors
-    outputs["resetOut"][0] = data["reset"]
-    outputs["sequenceIdOut"][0] = data["sequenceId"]
-    outputs["dataOut"][:] = 0
-    outputs["dataOut"][data["nonZeros"]] = 1
+    # Take the top element of the data queue
+    batch = self.queue[0]
+    indices, indptr, resets, sequenceIds, record = batch
+    nonZeros = indices[indptr[record]:indptr[record + 1]]
+    batch[4] += 1
+    if batch[4] == len(resets):
+      self.queue.popleft()
+
+    # Copy data into output vectors, only clearing the bits set last time
+    outputs["resetOut"][0] = resets[record]
+    outputs["sequenceIdOut"][0] = sequenceIds[record]
+    if self._lastNonZeros is None:
+      outputs["dataOut"][:] = 0
+    else:
+      outputs["dataOut"][self._lastNonZeros] = 0
+    outputs["dataOut"][nonZeros] = 1
+    self._lastNonZeros = nonZeros
 
     if self.verbosity > 1:
       print "RawSensor outputs:"
@@ -133,25 +152,75 @@ class RawSensor(PyRegion):
 
     @param nonZeros   A list of the non-zero elements corresponding
                       to the sparse output. This list can be specified in two
-                      ways, as a python list of integers or as a string which
-                      can evaluate to a python list of integers.
+                      ways, as a python list (or numpy array) of integers or as
+                      a JSON string of a list of integers, e.g. "[2, 4, 6]".
     @param reset      An int or string that is 0 or 1. resetOut will be set to
                       this value when this item is computed.
     @param sequenceId An int or string with an integer ID associated with this
                       token and its sequence (document).
     """
-    if type(nonZeros) == type(""):
-      nonZeroList = eval(nonZeros)
-    elif type(nonZeros) == type([]):
-      nonZeroList = nonZeros
-    else:
+    if isinstance(nonZeros, basestring):
+      try:
+        nonZeros = json.loads(nonZeros)
+      except ValueError:
+        raise Exception("RawSensor.addDataToQueue: nonZeros string is not a "
+                        "list of integers: {}".format(nonZeros))
+    elif not isinstance(nonZeros, (list, tuple, numpy.ndarray)):
       raise Exception("RawSensor.addDataToQueue: unknown type for nonZeros")
 
-    self.queue.appendleft({
-      "sequenceId": int(sequenceId),
-      "reset": int(reset),
-      "nonZeros": nonZeroList,
-    })
+    nonZeros = numpy.asarray(nonZeros, dtype=numpy.int64).ravel()
+    self.addDataBatch((nonZeros, [0, len(nonZeros)]),
+                      [int(reset)], [int(sequenceId)])
+
+
+  def addDataBatch(self, indicesCSR, resets, sequenceIds):
+    """
+    Add many data items to the sensor's internal queue at once, in FIFO order
+    after anything already queued.
+
+    @param indicesCSR   (tuple)   The non-zero indices of all records in CSR
+                                  form, as a 2-tuple (indices, indptr) where
+                                  the indices of record i are
+                                  indices[indptr[i]:indptr[i+1]]. A scipy CSR
+                                  matrix is accepted too.
+    @param resets       (list)    0/1 reset flag per record.
+    @param sequenceIds  (list)    Integer sequence ID per record.
+    """
+    if hasattr(indicesCSR, "indptr"):
+      indices, indptr = indicesCSR.indices, indicesCSR.indptr
+    else:
+      indices, indptr = indicesCSR
+
+    indices = numpy.array(indices, dtype=numpy.int64)
+    indptr = numpy.array(indptr, dtype=numpy.int64)
+    resets = numpy.array(resets, dtype=numpy.int64)
+    sequenceIds = numpy.array(sequenceIds, dtype=numpy.int64)
+
+    numRecords = len(indptr) - 1
+    if numRecords != len(resets) or numRecords != len(sequenceIds):
+      raise ValueError("RawSensor.addDataBatch: indptr, resets and sequenceIds "
+                       "describe different numbers of records.")
+    if len(indices) > 0 and (indices.min() < 0 or
+                             indices.max() >= self.outputWidth):
+      raise ValueError("RawSensor.addDataBatch: indices must be in "
+                       "[0, outputWidth).")
+    if numRecords == 0:
+      return
+
+    self.queue.append([indices, indptr, resets, sequenceIds, 0])
+
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self.__dict__.setdefault("_lastNonZeros", None)
+
+    # Sensors saved before the CSR queue hold one dict per record, newest first
+    if self.queue and isinstance(self.queue[0], dict):
+      records = list(reversed(self.queue))
+      self.queue = deque()
+      for record in records:
+        self.addDataToQueue(list(record["nonZeros"]), record["reset"],
+                            record["sequenceId"])
 
 
   def getOutputElementCount(self, name):
@@ -19,9 +19,10 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 
+import copy
+
 import numpy
 
-from nupic.bindings.math import GetNTAReal
 from nupic.support import getArgumentDescriptions
 from nupic.bindings.regions.PyRegion import PyRegion
 
@@ -38,6 +39,12 @@ class MonitoredUnionTemporalPooler(UnionTemporalPoolerMonitorMixin,
 
 uintDType = "uint32"
 
+# Constructor introspection results and specs, which don't change for a given
+# pooler class
+_argTuplesCache = {}
+_additionalSpecsCache = {}
+_specCache = {}
+
 
 
 def _getPoolerClass(name):
@@ -89,22 +96,11 @@ def _buildArgs(poolerClass, self=None, kwargs={}):
 
   Pops any values from kwargs that go to the function.
 
+  The constructor introspection is done once per pooler class.
   """
-  # Get the name, description, and default value for each argument
-  argTuples = getArgumentDescriptions(poolerClass.__init__)
-  argTuples = argTuples[1:]  # Remove "self"
-
-  # Get the names of the parameters to our own constructor and remove them
-  init = TemporalPoolerRegion.__init__
-  ourArgNames = [t[0] for t in getArgumentDescriptions(init)]
-  # Also remove a few other names that aren't in our constructor but are
-  #  computed automatically
-  ourArgNames += [
-    "inputDimensions",
-  ]
-  for argTuple in argTuples[:]:
-    if argTuple[0] in ourArgNames:
-      argTuples.remove(argTuple)
+  if poolerClass not in _argTuplesCache:
+    _argTuplesCache[poolerClass] = _getArgTuples(poolerClass)
+  argTuples = list(_argTuplesCache[poolerClass])
 
   # Build the dictionary of arguments
   if self:
@@ -126,6 +122,27 @@ def _buildArgs(poolerClass, self=None, kwargs={}):
   return argTuples
 
 
+def _getArgTuples(poolerClass):
+  """
+  Return (name, description, defaultValue) tuples for the arguments of the
+  pooler constructor that aren't handled by TemporalPoolerRegion itself.
+  """
+  # Get the name, description, and default value for each argument
+  argTuples = getArgumentDescriptions(poolerClass.__init__)
+  argTuples = argTuples[1:]  # Remove "self"
+
+  # Get the names of the parameters to our own constructor and remove them
+  init = TemporalPoolerRegion.__init__
+  ourArgNames = [t[0] for t in getArgumentDescriptions(init)]
+  # Also remove a few other names that aren't in our constructor but are
+  #  computed automatically
+  ourArgNames += [
+    "inputDimensions",
+  ]
+  return [argTuple for argTuple in argTuples
+          if argTuple[0] not in ourArgNames]
+
+
 def _getAdditionalSpecs(poolerClass=_getDefaultPoolerClass(), poolerType="union"):
   """Build the additional specs in three groups (for the inspector)
 
@@ -133,7 +150,18 @@ def _getAdditionalSpecs(poolerClass=_getDefaultPoolerClass(), poolerType="union"
   to "Byte" for None and complex types
 
   Determines the pooler parameters based on the selected implementation.
+
+  The specs are built once per pooler class and type, and copies are
+  returned.
   """
+  key = (poolerClass, poolerType)
+  if key not in _additionalSpecsCache:
+    _additionalSpecsCache[key] = _buildAdditionalSpecs(poolerClass,
+                                                       poolerType)
+  return copy.deepcopy(_additionalSpecsCache[key])
+
+
+def _buildAdditionalSpecs(poolerClass, poolerType):
   typeNames = {int: "UInt32", float: "Real32", str: "Byte", bool: "bool",
                tuple: "tuple"}
 
@@ -324,6 +352,11 @@ class TemporalPoolerRegion(PyRegion):
     # Allocate the pooler
     self._pooler = self._poolerClass(**autoArgs)
 
+    # Empty predicted input, and the indices currently set in the
+    # mostActiveCells output
+    self._noInput = numpy.array([], dtype=uintDType)
+    self._outputIndices = numpy.array([], dtype=uintDType)
+
 
   def compute(self, inputs, outputs):
     """
@@ -343,23 +376,25 @@ class TemporalPoolerRegion(PyRegion):
       if inputs['resetIn'][0] != 0:
         resetSignal = True
 
-    outputs["mostActiveCells"][:] = numpy.zeros(
-                                      self._columnCount, dtype=GetNTAReal())
-
     if self._poolerType == "simpleUnion":
+      # unionIntoArray overwrites the whole output
       self._pooler.unionIntoArray(inputs["activeCells"],
                                   outputs["mostActiveCells"],
                                   forceOutput = resetSignal)
     else:
-      predictedActiveCells = inputs["predictedActiveCells"] if (
-        "predictedActiveCells" in inputs) else numpy.zeros(self._inputWidth,
-                                                           dtype=uintDType)
+      activeCells = inputs["activeCells"].nonzero()[0]
+      predictedActiveCells = inputs["predictedActiveCells"].nonzero()[0] if (
+        "predictedActiveCells" in inputs) else self._noInput
 
-      mostActiveCellsIndices = self._pooler.compute(inputs["activeCells"],
-                                                    predictedActiveCells,
-                                                    self.learningMode)
+      self._pooler.compute(activeCells, predictedActiveCells,
+                           self.learningMode, inputIndices=True)
 
+      # Only clear the cells set at the previous step
+      mostActiveCellsIndices = numpy.asarray(self._pooler.getUnionSDR(),
+                                             dtype=uintDType)
+      outputs["mostActiveCells"][self._outputIndices] = 0
       outputs["mostActiveCells"][mostActiveCellsIndices] = 1
+      self._outputIndices = mostActiveCellsIndices
 
     if resetSignal:
         self.reset()
@@ -441,14 +476,17 @@ class TemporalPoolerRegion(PyRegion):
     Return the Spec for TemporalPoolerRegion.
 
     The parameters collection is constructed based on the parameters specified
-    by the various components (poolerSpec and otherSpec)
+    by the various components (poolerSpec and otherSpec). It is only built
+    once per class, and a copy is returned.
     """
-    spec = cls.getBaseSpec()
-    p, o = _getAdditionalSpecs()
-    spec["parameters"].update(p)
-    spec["parameters"].update(o)
-
-    return spec
+    if cls not in _specCache:
+      spec = cls.getBaseSpec()
+      p, o = _getAdditionalSpecs()
+      spec["parameters"].update(p)
+      spec["parameters"].update(o)
+      _specCache[cls] = spec
+
+    return copy.deepcopy(_specCache[cls])
 
 
   def setParameter(self, parameterName, index, parameterValue):
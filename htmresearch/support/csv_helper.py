@@ -22,8 +22,10 @@
 This file contains CSV utility functions to use with nupic.fluent experiments.
 """
 
+import array
 import csv
 import itertools
+import json
 import numpy
 import os
 
@@ -44,36 +46,283 @@ def readCSV(csvFile, numLabels=0):
                                         str), sample number (int).
   """
   try:
-    with open(csvFile, "rU") as f:
-      reader = csv.reader(f)
-      headers = next(reader, None)
-      try:
-        sampleIdx = headers.index("Sample")
-        idIdx = headers.index("ID")
-      except ValueError as e:
-        print ("Could not find 'ID' and/or 'Sample' columns, so assuming "
-               "they are 0 and 2, respectively.")
-        sampleIdx = 2
-        idIdx = 0
-      
-      dataDict = {}
-
-      if numLabels > 0:
-        labelIdx = range(sampleIdx + 1, sampleIdx + 1 + numLabels)
-        for lineNumber, line in enumerate(reader):
-          dataDict[lineNumber] = (line[sampleIdx],
-                                  [line[i] for i in labelIdx if line[i]],
-                                  line[idIdx])
-      else:
-        for lineNumber, line in enumerate(reader):
-          dataDict[lineNumber] = (line[sampleIdx], [], line[idIdx])
-
-      return dataDict
+    dataDict = {}
+    for chunk in readCSVChunks(csvFile, numLabels=numLabels):
+      dataDict.update(chunk)
+
+    return dataDict
 
   except IOError as e:
     print e
 
 
+def readCSVChunks(csvFile, numLabels=0, chunkSize=10000):
+  """
+  Stream a CSV file in the format described in readCSV(), without holding more
+  than one chunk of records in memory.
+
+  @param csvFile         (str)          File name for the input CSV.
+  @param numLabels       (int)          Number of columns of category labels.
+  @param chunkSize       (int)          Max number of records per chunk.
+  @return                (generator)    Yields lists of up to chunkSize
+                                        (line number, record) 2-tuples, where
+                                        records are the 3-tuples of readCSV().
+  """
+  with open(csvFile, "rU") as f:
+    reader = csv.reader(f)
+    headers = next(reader, None)
+    try:
+      sampleIdx = headers.index("Sample")
+      idIdx = headers.index("ID")
+    except (AttributeError, ValueError):
+      print ("Could not find 'ID' and/or 'Sample' columns, so assuming "
+             "they are 0 and 2, respectively.")
+      sampleIdx = 2
+      idIdx = 0
+
+    labelIdx = range(sampleIdx + 1, sampleIdx + 1 + numLabels)
+
+    chunk = []
+    for lineNumber, line in enumerate(reader):
+      chunk.append((lineNumber, (line[sampleIdx],
+                                 [line[i] for i in labelIdx if line[i]],
+                                 line[idIdx])))
+      if len(chunk) == chunkSize:
+        yield chunk
+        chunk = []
+
+    if chunk:
+      yield chunk
+
+
+
+def _toArray(values, dtype):
+  """Copy an array.array into a numpy array without going through Python."""
+  return numpy.frombuffer(values, dtype=values.typecode).astype(dtype)
+
+
+
+class CSVCache(object):
+  """
+  Read-only, columnar copy of a CSV file in the format described in readCSV().
+
+  The first time a file is read its records are streamed into a cache
+  directory: all the samples in one text blob with an offsets array, the IDs
+  likewise, and the labels as int32 ids into labelRefs. Later runs memory-map
+  those files instead of parsing the CSV again, as long as the size and mtime
+  of the CSV are unchanged.
+
+  Records are decoded on access, and the object can stand in for the dataDict
+  returned by readCSV() wherever the dict is only read.
+  """
+
+  version = 1
+
+
+  def __init__(self, csvFile, numLabels=0, cacheDir=None, chunkSize=10000):
+    """
+    @param csvFile         (str)          File name for the input CSV.
+    @param numLabels       (int)          Number of columns of category labels.
+    @param cacheDir        (str)          Directory for the cache files;
+                                          defaults to "<csvFile>.cache".
+    @param chunkSize       (int)          Records parsed at a time when the
+                                          cache is built.
+    """
+    self.csvFile = csvFile
+    self.numLabels = numLabels
+    self.cacheDir = cacheDir or csvFile + ".cache"
+    self.chunkSize = chunkSize
+
+    if not self._isValid():
+      self._build()
+    self._load()
+
+
+  def _sourceStats(self):
+    stats = os.stat(self.csvFile)
+    return {"version": self.version,
+            "size": stats.st_size,
+            "mtime": stats.st_mtime,
+            "numLabels": self.numLabels}
+
+
+  def _path(self, name):
+    return os.path.join(self.cacheDir, name)
+
+
+  def _isValid(self):
+    try:
+      with open(self._path("meta.json")) as f:
+        meta = json.load(f)
+    except (IOError, ValueError):
+      return False
+
+    return all(meta.get(key) == value
+               for key, value in self._sourceStats().iteritems())
+
+
+  def _build(self):
+    """Stream the CSV into the columnar files, writing the metadata last."""
+    sourceStats = self._sourceStats()
+    if not os.path.exists(self.cacheDir):
+      os.makedirs(self.cacheDir)
+
+    textOffsets = array.array("l", [0])
+    idOffsets = array.array("l", [0])
+    labelOffsets = array.array("l", [0])
+    labels = array.array("i")
+    labelToId = OrderedDict()
+
+    with open(self._path("text.bin"), "wb") as textFile, \
+         open(self._path("ids.bin"), "wb") as idFile:
+      for chunk in readCSVChunks(self.csvFile, self.numLabels, self.chunkSize):
+        for _, (text, recordLabels, docId) in chunk:
+          textFile.write(text)
+          textOffsets.append(textOffsets[-1] + len(text))
+          idFile.write(docId)
+          idOffsets.append(idOffsets[-1] + len(docId))
+          for label in recordLabels:
+            labels.append(labelToId.setdefault(label, len(labelToId)))
+          labelOffsets.append(len(labels))
+
+    # Order the labels the same way mapLabelRefs() does, so both paths assign
+    # the same ids
+    labelRefs = list(set(labelToId))
+    remap = numpy.zeros(len(labelRefs), dtype=numpy.int32)
+    for i, label in enumerate(labelRefs):
+      remap[labelToId[label]] = i
+
+    numpy.save(self._path("textOffsets.npy"),
+               _toArray(textOffsets, numpy.int64))
+    numpy.save(self._path("idOffsets.npy"),
+               _toArray(idOffsets, numpy.int64))
+    numpy.save(self._path("labelOffsets.npy"),
+               _toArray(labelOffsets, numpy.int64))
+    numpy.save(self._path("labels.npy"),
+               remap[_toArray(labels, numpy.int32)])
+
+    sourceStats["labelRefs"] = labelRefs
+    tmpPath = self._path("meta.json.tmp")
+    with open(tmpPath, "w") as f:
+      json.dump(sourceStats, f)
+    os.rename(tmpPath, self._path("meta.json"))
+
+
+  def _load(self):
+    with open(self._path("meta.json")) as f:
+      meta = json.load(f)
+    self.labelRefs = [label.encode("utf-8") if isinstance(label, unicode)
+                      else label for label in meta["labelRefs"]]
+
+    self._textOffsets = numpy.load(self._path("textOffsets.npy"),
+                                   mmap_mode="r")
+    self._idOffsets = numpy.load(self._path("idOffsets.npy"), mmap_mode="r")
+    self._labelOffsets = numpy.load(self._path("labelOffsets.npy"),
+                                    mmap_mode="r")
+    self._labels = numpy.load(self._path("labels.npy"), mmap_mode="r")
+    self._text = self._mapBlob(self._path("text.bin"))
+    self._ids = self._mapBlob(self._path("ids.bin"))
+
+
+  @staticmethod
+  def _mapBlob(path):
+    # numpy can't memory-map an empty file
+    if os.path.getsize(path) == 0:
+      return numpy.zeros(0, dtype=numpy.uint8)
+    return numpy.memmap(path, dtype=numpy.uint8, mode="r")
+
+
+  def __len__(self):
+    return len(self._textOffsets) - 1
+
+
+  def __contains__(self, lineNumber):
+    return 0 <= lineNumber < len(self)
+
+
+  def __iter__(self):
+    return iter(xrange(len(self)))
+
+
+  def __getitem__(self, lineNumber):
+    """
+    @return (tuple)   Record as in readCSV(): sample (str), categories (list of
+                      str), sample number (str).
+    """
+    return (self.getText(lineNumber),
+            [self.labelRefs[i] for i in self.getLabelIds(lineNumber)],
+            self.getId(lineNumber))
+
+
+  def getText(self, lineNumber):
+    start, end = self._textOffsets[lineNumber:lineNumber + 2]
+    return self._text[start:end].tostring()
+
+
+  def getId(self, lineNumber):
+    start, end = self._idOffsets[lineNumber:lineNumber + 2]
+    return self._ids[start:end].tostring()
+
+
+  def getLabelIds(self, lineNumber):
+    """
+    @return (numpy.array)   int32 indices into labelRefs.
+    """
+    start, end = self._labelOffsets[lineNumber:lineNumber + 2]
+    return numpy.array(self._labels[start:end])
+
+
+  def keys(self):
+    return range(len(self))
+
+
+  def iterkeys(self):
+    return iter(self)
+
+
+  def itervalues(self):
+    for lineNumber in self:
+      yield self[lineNumber]
+
+
+  def iteritems(self):
+    for lineNumber in self:
+      yield lineNumber, self[lineNumber]
+
+
+  def values(self):
+    return list(self.itervalues())
+
+
+  def items(self):
+    return list(self.iteritems())
+
+
+  def iterChunks(self, chunkSize=None):
+    """
+    @return (generator)   Yields lists of (line number, record) 2-tuples, like
+                          readCSVChunks().
+    """
+    chunkSize = chunkSize or self.chunkSize
+    for start in xrange(0, len(self), chunkSize):
+      yield [(lineNumber, self[lineNumber])
+             for lineNumber in xrange(start, min(start + chunkSize, len(self)))]
+
+
+  def toDataDict(self, mapLabels=False):
+    """
+    @param mapLabels  (bool)    Return the labels as int arrays, as after
+                                mapLabelRefs(), rather than strings.
+    @return           (dict)    Same format as readCSV().
+    """
+    if not mapLabels:
+      return dict(self.iteritems())
+    return {lineNumber: (self.getText(lineNumber),
+                         self.getLabelIds(lineNumber),
+                         self.getId(lineNumber))
+            for lineNumber in self}
+
+
 def mapLabelRefs(dataDict):
   """
   Replace the label strings in dataDict with corresponding ints.
@@ -83,10 +332,11 @@ def mapLabelRefs(dataDict):
   """
   labelRefs = [label for label in set(
     itertools.chain.from_iterable([x[1] for x in dataDict.values()]))]
+  labelToId = {label: i for i, label in enumerate(labelRefs)}
 
   for recordNumber, data in dataDict.iteritems():
     dataDict[recordNumber] = (data[0], numpy.array(
-      [labelRefs.index(label) for label in data[1]]), data[2])
+      [labelToId[label] for label in data[1]], dtype=numpy.int32), data[2])
 
   return labelRefs, dataDict
 
@@ -175,6 +425,9 @@ def readDataAndReshuffle(args, categoriesInOrderOfInterest=None):
                                      will be reshuffled to the order in this
                                      array, up to args.numLabels, if specified.
 
+  If args.cacheData is set, the file is read through a CSVCache, so repeated
+  runs on the same file skip the CSV parsing.
+
   Returns the tuple:
     (dataset, labelRefs, documentCategoryMap, documentTextMap)
 
@@ -202,8 +455,12 @@ def readDataAndReshuffle(args, categoriesInOrderOfInterest=None):
 
   """
   # Read data
-  dataDict = readCSV(args.dataPath, 1)
-  labelRefs, dataDict = mapLabelRefs(dataDict)
+  if getattr(args, "cacheData", False):
+    corpus = CSVCache(args.dataPath, numLabels=1)
+    labelRefs, dataDict = corpus.labelRefs, corpus.toDataDict(mapLabels=True)
+  else:
+    dataDict = readCSV(args.dataPath, 1)
+    labelRefs, dataDict = mapLabelRefs(dataDict)
 
   if "numLabels" in args:
     numLabels = args.numLabels
@@ -21,6 +21,7 @@
 
 """Data splitting is used to partition data into train and test sets."""
 
+import numpy
 import random
 
 # from nupic.bindings.math import Random
@@ -157,6 +158,62 @@ class StandardSplit(DataSplit):
 
 
 
+class IncrementalSplit(DataSplit):
+  """
+  Implementation of the splitting for the 'incremental' experiment: one
+  train/test split per training set size, where the test set is everything not
+  used for training.
+  """
+
+
+  def __init__(self, trainSizes):
+    if any(size < 0 for size in trainSizes):
+      raise ValueError("Training set sizes must be non-negative.")
+
+    self.trainSizes = trainSizes
+
+
+  def split(self, samples, randomize=False, seed=42):
+    """Split the given samples into one train/test set per training set size.
+
+    When randomized, each training set is sampled without replacement from all
+    of the samples, and the test set keeps the remaining samples in their
+    original order. Otherwise the first n samples are used for training.
+
+    @param samples        (list)          Sample elements of any type.
+    @param randomize      (bool)          Randomize the training samples.
+    @param seed           (int)           Random seed.
+    @return               (list)          Splits where each split is 2-tuple
+                                          (training, test) where each element is
+                                          a list of elements from samples.
+    """
+    # Make sure we have an indexable list
+    samples = list(samples)
+    length = len(samples)
+
+    if any(size > length for size in self.trainSizes):
+      raise ValueError("Training set sizes can't exceed the number of samples.")
+
+    trainTestSplits = []
+    if randomize:
+      random.seed(seed)
+      for size in self.trainSizes:
+        trainIndices = random.sample(xrange(length), size)
+        # Mark the training samples instead of searching the training list
+        # for every sample, so each split stays linear in the number of samples
+        isTest = numpy.ones(length, dtype=bool)
+        isTest[trainIndices] = False
+        trainTestSplits.append((
+          [samples[i] for i in trainIndices],
+          [sample for sample, test in zip(samples, isTest) if test]))
+    else:
+      for size in self.trainSizes:
+        trainTestSplits.append((samples[:size], samples[size:]))
+
+    return trainTestSplits
+
+
+
 class Buckets(DataSplit):
   """Split data for the 'buckets' experiment."""
 
@@ -0,0 +1,275 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Binary alternative to the token-per-row network data CSVs.
+
+A network data file is an uncompressed .npz archive holding:
+  - the token dictionary, as a byte blob with offsets,
+  - one int32 token id per record,
+  - the offsets at which each sequence starts (i.e. the resets),
+  - per sequence: the category ids, the sequence id and the unique ID string.
+
+Because the archive is uncompressed, every array is memory-mapped straight
+from the file on load, and the sequence level metadata that the CSV format
+only provides by scanning every row is available directly.
+"""
+
+import os
+import struct
+import zipfile
+
+from collections import OrderedDict
+
+import numpy
+import numpy.lib.format
+
+
+
+FORMAT_VERSION = 1
+
+# Fixed part of a zip local file header, followed by the file name and extra
+# field whose lengths are stored at offsets 26 and 28
+_ZIP_LOCAL_HEADER_SIZE = 30
+
+
+
+def _parseCategories(categories):
+  """Category field of a generator record -> list of ints."""
+  if isinstance(categories, basestring):
+    return [int(c) for c in categories.split()]
+  if isinstance(categories, (list, tuple)):
+    return [int(c) for c in categories]
+  return [int(categories)]
+
+
+
+def _packStrings(strings):
+  """Encode strings as one uint8 blob plus int64 offsets."""
+  encoded = [s.encode("utf-8") if isinstance(s, unicode) else str(s)
+             for s in strings]
+  offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.int64)
+  offsets[1:] = numpy.cumsum([len(s) for s in encoded])
+  blob = numpy.frombuffer("".join(encoded), dtype=numpy.uint8)
+  return blob, offsets
+
+
+
+def writeNetworkData(path, sequences):
+  """
+  Write network data records to a binary network data file.
+
+  @param path       (str)     Output path; should end in ".npz".
+  @param sequences  (list)    Sequences in the NetworkDataGenerator records
+                              format: lists of dicts with "_token",
+                              "_category", "_sequenceId", "_reset" and "ID".
+                              Empty sequences are skipped, as they have no
+                              rows in the CSV format either.
+  @return           (str)     path
+  """
+  tokenToId = OrderedDict()
+  tokenIds = []
+  sequenceOffsets = [0]
+  sequenceIds = []
+  categories = []
+  categoryOffsets = [0]
+  uniqueIds = []
+
+  for sequence in sequences:
+    if not sequence:
+      continue
+    first = sequence[0]
+    for record in sequence:
+      tokenIds.append(tokenToId.setdefault(record["_token"], len(tokenToId)))
+    sequenceOffsets.append(len(tokenIds))
+    sequenceIds.append(first["_sequenceId"])
+    categories.extend(_parseCategories(first["_category"]))
+    categoryOffsets.append(len(categories))
+    uniqueIds.append(first["ID"])
+
+  vocabBlob, vocabOffsets = _packStrings(tokenToId)
+  idBlob, idOffsets = _packStrings(uniqueIds)
+
+  # Don't let numpy.savez append ".npz" to some other extension
+  with open(path, "wb") as f:
+    numpy.savez(f,
+                version=numpy.array([FORMAT_VERSION], dtype=numpy.int32),
+                vocabBlob=vocabBlob,
+                vocabOffsets=vocabOffsets,
+                tokenIds=numpy.array(tokenIds, dtype=numpy.int32),
+                sequenceOffsets=numpy.array(sequenceOffsets, dtype=numpy.int64),
+                sequenceIds=numpy.array(sequenceIds, dtype=numpy.int64),
+                categories=numpy.array(categories, dtype=numpy.int32),
+                categoryOffsets=numpy.array(categoryOffsets,
+                                            dtype=numpy.int64),
+                idBlob=idBlob,
+                idOffsets=idOffsets)
+
+  return path
+
+
+
+def mapArchive(path):
+  """
+  Memory-map every array in an uncompressed .npz archive.
+
+  @return (dict)    Array name -> read-only numpy array.
+  """
+  arrays = {}
+  with open(path, "rb") as f, zipfile.ZipFile(f) as archive:
+    for info in archive.infolist():
+      name = os.path.splitext(info.filename)[0]
+      if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError("Network data file {} is compressed and can't be "
+                         "memory-mapped.".format(path))
+
+      f.seek(info.header_offset + 26)
+      nameLength, extraLength = struct.unpack("<HH", f.read(4))
+      f.seek(info.header_offset + _ZIP_LOCAL_HEADER_SIZE + nameLength +
+             extraLength)
+
+      version = numpy.lib.format.read_magic(f)
+      if version == (1, 0):
+        shape, fortranOrder, dtype = numpy.lib.format.read_array_header_1_0(f)
+      else:
+        shape, fortranOrder, dtype = numpy.lib.format.read_array_header_2_0(f)
+
+      if numpy.prod(shape) == 0:
+        arrays[name] = numpy.zeros(shape, dtype=dtype)
+      else:
+        arrays[name] = numpy.memmap(f, dtype=dtype, mode="r", offset=f.tell(),
+                                    shape=shape,
+                                    order="F" if fortranOrder else "C")
+  return arrays
+
+
+
+class NetworkDataFile(object):
+  """
+  Reader for binary network data files, see writeNetworkData().
+
+  It also implements the parts of the record stream interface LanguageSensor
+  uses, getNextRecordDict() and rewind(), so it can be set as the sensor's
+  dataSource in place of a FileRecordStream.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    arrays = mapArchive(path)
+
+    version = int(arrays["version"][0])
+    if version != FORMAT_VERSION:
+      raise ValueError("Unsupported network data file version {} in {}."
+                       .format(version, path))
+
+    self.tokenIds = arrays["tokenIds"]
+    self.sequenceOffsets = arrays["sequenceOffsets"]
+    self.sequenceIds = arrays["sequenceIds"]
+    self.categories = arrays["categories"]
+    self.categoryOffsets = arrays["categoryOffsets"]
+    self._idBlob = arrays["idBlob"]
+    self._idOffsets = arrays["idOffsets"]
+
+    vocabBlob = arrays["vocabBlob"].tostring()
+    vocabOffsets = arrays["vocabOffsets"]
+    self.vocabulary = [vocabBlob[start:end] for start, end
+                       in zip(vocabOffsets[:-1], vocabOffsets[1:])]
+
+    # Per token sequence index, for the record stream interface
+    self._tokenSequence = None
+    self._position = 0
+
+
+  def __len__(self):
+    """Number of token records."""
+    return len(self.tokenIds)
+
+
+  def getNumberOfSequences(self):
+    return len(self.sequenceIds)
+
+
+  def getId(self, sequence):
+    start, end = self._idOffsets[sequence:sequence + 2]
+    return self._idBlob[start:end].tostring()
+
+
+  def getCategories(self, sequence):
+    start, end = self.categoryOffsets[sequence:sequence + 2]
+    return self.categories[start:end].tolist()
+
+
+  def getTokens(self, sequence):
+    start, end = self.sequenceOffsets[sequence:sequence + 2]
+    return [self.vocabulary[i] for i in self.tokenIds[start:end]]
+
+
+  def getSamples(self):
+    """See NetworkDataGenerator.getSamples()."""
+    samples = OrderedDict()
+    for sequence in xrange(self.getNumberOfSequences()):
+      samples[self.getId(sequence)] = ([" ".join(self.getTokens(sequence))],
+                                       self.getCategories(sequence))
+    return samples
+
+
+  def getClassifications(self):
+    """See NetworkDataGenerator.getClassifications()."""
+    return [" ".join(str(c) for c in self.getCategories(sequence))
+            for sequence in xrange(self.getNumberOfSequences())]
+
+
+  def getNumberOfTokens(self):
+    """See NetworkDataGenerator.getNumberOfTokens()."""
+    return numpy.diff(self.sequenceOffsets).tolist()
+
+
+  def getResetsIndices(self):
+    """See NetworkDataGenerator.getResetsIndices()."""
+    return self.sequenceOffsets[:-1].tolist()
+
+
+  def rewind(self):
+    self._position = 0
+
+
+  def getNextRecordDict(self):
+    """
+    @return (dict)    The next token record, with the same fields as the rows
+                      of the CSV format, or None past the last record.
+    """
+    if self._position >= len(self.tokenIds):
+      return None
+
+    if self._tokenSequence is None:
+      self._tokenSequence = numpy.repeat(
+        numpy.arange(self.getNumberOfSequences()),
+        numpy.diff(self.sequenceOffsets))
+
+    position = self._position
+    sequence = self._tokenSequence[position]
+    self._position += 1
+
+    return {"_token": self.vocabulary[self.tokenIds[position]],
+            "_category": self.getCategories(sequence),
+            "_sequenceId": int(self.sequenceIds[sequence]),
+            "_reset": int(position == self.sequenceOffsets[sequence]),
+            "ID": self.getId(sequence)}
@@ -26,6 +26,7 @@ file in the format of the network API.
 
 import argparse
 import csv
+import itertools
 import os
 import pprint
 import random
@@ -34,6 +35,8 @@ import string
 from collections import defaultdict, OrderedDict
 
 from htmresearch.support.csv_helper import readCSV
+from htmresearch.support.network_data_file import (
+  NetworkDataFile, writeNetworkData)
 from htmresearch.support.text_preprocess import TextPreprocess
 
 import simplejson as json
@@ -106,7 +109,8 @@ class NetworkDataGenerator(object):
 
   def split(self, filePath=None, numLabels=3, textPreprocess=False, dataDict=None,
             abbrCSV="", contrCSV="", ignoreCommon=100,
-            removeStrings="[identifier deleted]", correctSpell=True):
+            removeStrings="[identifier deleted]", correctSpell=True,
+            workers=1):
     """
     Split all the comments in a file into tokens, w/ or w/o preprocessing.
     Specifying both filePath and dataDict will prefer filePath.
@@ -115,6 +119,7 @@ class NetworkDataGenerator(object):
     @param dataDict        (dict)   Data as returned by readCSV()
     @param numLabels       (int)    Number of columns of category labels.
     @param textPreprocess  (bool)   True will preprocess text while tokenizing.
+    @param workers         (int)    Number of processes to tokenize with.
     
     @return dataDict       (dict)   Data as read in from filePath.
 
@@ -131,19 +136,28 @@ class NetworkDataGenerator(object):
     expandAbbr = (abbrCSV != "")
     expandContr = (contrCSV != "")
 
-    for recordNum, record in dataDict.iteritems():
+    if isinstance(removeStrings, basestring):
+      removeStrings = [removeStrings]
+
+    if textPreprocess:
+      preprocessSpecs = dict(ignoreCommon=ignoreCommon,
+                             removeStrings=removeStrings,
+                             correctSpell=correctSpell,
+                             expandAbbr=expandAbbr,
+                             expandContr=expandContr)
+    else:
+      preprocessSpecs = {}
+    tokenized = preprocessor.tokenizeCorpus(
+      (record[0] for record in dataDict.itervalues()), workers=workers,
+      **preprocessSpecs)
+
+    for (recordNum, record), (tokens, _) in itertools.izip(
+        dataDict.iteritems(), tokenized):
       comment, categories, uniqueID = record
       
       # Convert the categories to a string of their IDs
       categories = string.join([str(self.categoryToId[c]) for c in categories])
 
-      if textPreprocess:
-        tokens, _ = preprocessor.tokenizeAndFilter(
-            comment, ignoreCommon, removeStrings, correctSpell, expandAbbr,
-            expandContr)
-      else:
-        tokens = preprocessor.tokenize(comment)
-
       data = self._formatSequence(tokens, categories, recordNum, uniqueID)
 
       self.records.append(data)
@@ -185,7 +199,10 @@ class NetworkDataGenerator(object):
   def saveData(self, dataOutputFile, categoriesOutputFile):
     """
     Save the processed data and the associated category mapping.
-    @param dataOutputFile       (str)   Location to save data
+    @param dataOutputFile       (str)   Location to save data; a ".npz" file
+                                        is written in the binary format of
+                                        network_data_file, otherwise a CSV for
+                                        FileRecordStream.
     @param categoriesOutputFile (str)   Location to save category map
     @return                     (str)   Path to the saved data file iff
                                         saveData() is successful.
@@ -193,8 +210,8 @@ class NetworkDataGenerator(object):
     if self.records is None:
       return False
 
-    if not dataOutputFile.endswith("csv"):
-      raise TypeError("data output file must be csv.")
+    if not dataOutputFile.endswith(("csv", "npz")):
+      raise TypeError("data output file must be csv or npz.")
     if not categoriesOutputFile.endswith("json"):
       raise TypeError("category output file must be json")
 
@@ -207,6 +224,21 @@ class NetworkDataGenerator(object):
     if not os.path.exists(categoriesOutputDirectory):
       os.makedirs(categoriesOutputDirectory)
 
+    if dataOutputFile.endswith("npz"):
+      writeNetworkData(dataOutputFile, self.records)
+    else:
+      self._writeCSV(dataOutputFile)
+
+    with open(categoriesOutputFile, "w") as f:
+      f.write(json.dumps(self.categoryToId,
+                         sort_keys=True,
+                         indent=4,
+                         separators=(",", ": ")))
+
+    return dataOutputFile
+
+
+  def _writeCSV(self, dataOutputFile):
     with open(dataOutputFile, "w") as f:
       # Header
       writer = csv.DictWriter(f, fieldnames=self.fieldNames)
@@ -222,14 +254,6 @@ class NetworkDataGenerator(object):
         for record in data:
           writer.writerow(record)
 
-    with open(categoriesOutputFile, "w") as f:
-      f.write(json.dumps(self.categoryToId,
-                         sort_keys=True,
-                         indent=4,
-                         separators=(",", ": ")))
-
-    return dataOutputFile
-
 
   def generateSequence(self, text, preprocess=False):
     """
@@ -251,11 +275,14 @@ class NetworkDataGenerator(object):
     """
     Returns samples joined at reset points.
     @param netDataFile  (str)         Path to file (in the FileRecordStream
-                                      format).
+                                      format, or a binary ".npz" file).
     @return samples     (OrderedDict) Keys are sample number (in order they are
                                       read in). Values are two-tuples of sample
                                       text and category ints.
     """
+    if netDataFile.endswith("npz"):
+      return NetworkDataFile(netDataFile).getSamples()
+
     try:
       with open(netDataFile) as f:
         reader = csv.reader(f)
@@ -292,11 +319,14 @@ class NetworkDataGenerator(object):
     Returns the classifications at the indices where the data sequences
     reset.
     @param networkDataFile  (str)     Path to file in the FileRecordStream
-                                      format
+                                      format, or a binary ".npz" file
     @return                 (list)    list of string versions of the
                                       classifications
     Sample output: ["0 1", "1", "1 2 3"]
     """
+    if networkDataFile.endswith("npz"):
+      return NetworkDataFile(networkDataFile).getClassifications()
+
     try:
       with open(networkDataFile) as f:
         reader = csv.reader(f)
@@ -322,9 +352,12 @@ class NetworkDataGenerator(object):
     """
     Returns the number of tokens for each sequence
     @param networkDataFile  (str)     Path to file in the FileRecordStream
-                                      format
+                                      format, or a binary ".npz" file
     @return                 (list)    list of number of tokens
     """
+    if networkDataFile.endswith("npz"):
+      return NetworkDataFile(networkDataFile).getNumberOfTokens()
+
     try:
       with open(networkDataFile) as f:
         reader = csv.reader(f)
@@ -352,6 +385,9 @@ class NetworkDataGenerator(object):
   @staticmethod
   def getResetsIndices(networkDataFile):
     """Returns the indices at which the data sequences reset."""
+    if networkDataFile.endswith("npz"):
+      return NetworkDataFile(networkDataFile).getResetsIndices()
+
     try:
       with open(networkDataFile) as f:
         reader = csv.reader(f)
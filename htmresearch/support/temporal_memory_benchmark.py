@@ -0,0 +1,406 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Benchmarks of the temporal memory implementations in temporal_memory_factory.
+
+Every implementation is run, with the same constructor parameters, through
+synthetic workloads: repeating random sequences, the high order sequences of
+sequence_prediction_dataset and random sequences with noisy inputs. For each
+one the harness reports the compute() steps per second, the growth of the
+process' resident memory, and the learning parity: the fraction of steps at
+which the implementation predicts the same columns as the reference
+implementation, nupic's Python TemporalMemory. Parity is unavailable when the
+reference fails to run.
+
+selectModel() picks the fastest implementation whose parity is good enough on
+every workload. Its choices and the benchmark results are cached in a JSON
+profile on disk, per set of parameters, benchmark arguments, minimum parity
+and nupic version, so the benchmarks only run once. createModel("auto", ...)
+uses it, but only reads the profile: benchmarking takes minutes at realistic
+sizes, so it is an explicit step, selectModel(..., benchmarkIfMissing=True) or
+projects/sequence_learning/benchmark_tm_implementations.py --profile.
+"""
+
+import gc
+import json
+import logging
+import os
+import pkg_resources
+import resource
+import timeit
+
+from collections import OrderedDict
+
+import numpy
+
+from htmresearch.algorithms import temporal_memory_factory
+from htmresearch.support.sequence_prediction_dataset import HighOrderDataset
+
+
+
+_LOGGER = logging.getLogger(__name__)
+
+PROFILE_VERSION = 2
+
+DEFAULT_PROFILE_PATH = os.path.join(os.path.expanduser("~"), ".htmresearch",
+                                    "tm_benchmark_profile.json")
+
+# Implementation the others have to agree with
+REFERENCE_MODEL = "tm"
+
+# nupic's defaults, for the parameters that shape the workloads
+DEFAULT_COLUMN_DIMENSIONS = (2048,)
+
+
+
+def _randomSdr(rng, numColumns, numActive):
+  return sorted(rng.choice(numColumns, numActive, replace=False).tolist())
+
+
+def _repeatSequences(sequences, numSteps, rng):
+  """Random order of the sequences, with None (a reset) after each one."""
+  steps = []
+  while len(steps) < numSteps:
+    steps.extend(sequences[rng.randint(len(sequences))])
+    steps.append(None)
+  return steps[:numSteps]
+
+
+
+def randomSequences(numColumns, numActive, numSteps, rng, numSequences=4,
+                    sequenceLength=10):
+  """
+  Repeating sequences of random inputs.
+
+  @param numColumns (int)         Number of columns of the TM.
+  @param numActive  (int)         Number of active columns per input.
+  @param numSteps   (int)         Number of steps, resets included.
+  @param rng        (RandomState) Random number generator.
+  @return           (list)        Sorted active columns per step, or None for
+                                  a reset.
+  """
+  sequences = [[_randomSdr(rng, numColumns, numActive)
+                for _ in xrange(sequenceLength)]
+               for _ in xrange(numSequences)]
+  return _repeatSequences(sequences, numSteps, rng)
+
+
+def highOrderSequences(numColumns, numActive, numSteps, rng,
+                       numPredictions=1):
+  """
+  The high order sequences of HighOrderDataset, which share their middle
+  elements, with a random input per symbol. See randomSequences() for the
+  parameters.
+  """
+  dataset = HighOrderDataset(numPredictions=numPredictions,
+                             seed=rng.randint(1000))
+  symbols = [_randomSdr(rng, numColumns, numActive)
+             for _ in xrange(dataset.numSymbols)]
+  sequences = [[symbols[symbol] for symbol in sequence]
+               for sequence in dataset.sequences]
+  return _repeatSequences(sequences, numSteps, rng)
+
+
+def noisyInputs(numColumns, numActive, numSteps, rng, noise=0.1):
+  """
+  Repeating sequences of random inputs, where a fraction noise of the active
+  columns of every step are replaced with random ones. See randomSequences()
+  for the other parameters.
+  """
+  numNoisy = int(round(noise * numActive))
+  steps = randomSequences(numColumns, numActive, numSteps, rng)
+
+  for i, activeColumns in enumerate(steps):
+    if activeColumns is None:
+      continue
+    kept = rng.choice(activeColumns, numActive - numNoisy, replace=False)
+    others = numpy.setdiff1d(numpy.arange(numColumns), activeColumns,
+                             assume_unique=True)
+    added = rng.choice(others, numNoisy, replace=False)
+    steps[i] = sorted(numpy.concatenate((kept, added)).tolist())
+
+  return steps
+
+
+WORKLOADS = OrderedDict([
+  ("random", randomSequences),
+  ("highOrder", highOrderSequences),
+  ("noisy", noisyInputs),
+])
+
+
+
+def _residentBytes():
+  """Current resident memory of the process, or its peak if not available."""
+  try:
+    with open("/proc/self/statm") as f:
+      return int(f.read().split()[1]) * resource.getpagesize()
+  except IOError:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def runWorkload(model, steps):
+  """
+  Feed a workload to a model, learning all along.
+
+  @param model (object) Temporal memory.
+  @param steps (list)   Workload, see randomSequences().
+  @return      (tuple)  Seconds spent in compute() and reset(), and the
+                        predicted columns (frozenset) after each input.
+  """
+  clock = timeit.default_timer
+  cellsPerColumn = model.getCellsPerColumn()
+  seconds = 0.0
+  predictedColumns = []
+
+  for activeColumns in steps:
+    if activeColumns is None:
+      start = clock()
+      model.reset()
+      seconds += clock() - start
+      continue
+
+    activeColumns = set(activeColumns)
+    start = clock()
+    model.compute(activeColumns, learn=True)
+    seconds += clock() - start
+
+    predictedColumns.append(frozenset(cell // cellsPerColumn
+                                      for cell in model.getPredictiveCells()))
+
+  return seconds, predictedColumns
+
+
+def benchmarkModel(modelName, params, steps):
+  """
+  Create a model and time it on a workload.
+
+  @param modelName (str)  A temporal_memory_factory type.
+  @param params    (dict) Constructor arguments.
+  @param steps     (list) Workload, see randomSequences().
+  @return          (dict) "stepsPerSecond", "memoryBytes" and the
+                          "predictedColumns" per step, or the "error" that
+                          kept the model from running.
+  """
+  gc.collect()
+  before = _residentBytes()
+  try:
+    model = temporal_memory_factory.createModel(modelName, **params)
+    seconds, predictedColumns = runWorkload(model, steps)
+  except Exception as e:
+    return {"error": "{}: {}".format(type(e).__name__, e)}
+  memoryBytes = max(_residentBytes() - before, 0)
+  del model
+
+  numSteps = sum(1 for activeColumns in steps if activeColumns is not None)
+  return {"stepsPerSecond": numSteps / max(seconds, 1e-9),
+          "memoryBytes": memoryBytes,
+          "predictedColumns": predictedColumns}
+
+
+def _parity(predictedColumns, referenceColumns):
+  """Fraction of the steps with the same predicted columns."""
+  if not referenceColumns:
+    return 1.0
+  numSame = sum(1 for columns, reference
+                in zip(predictedColumns, referenceColumns)
+                if columns == reference)
+  return numSame / float(len(referenceColumns))
+
+
+def runBenchmark(params, modelNames=None, workloads=None, numSteps=500,
+                 sparsity=0.02, seed=42):
+  """
+  Run workloads through temporal memory implementations.
+
+  @param params     (dict)  Constructor arguments shared by the models.
+  @param modelNames (list)  temporal_memory_factory types to report, all of
+                            them by default. REFERENCE_MODEL always runs.
+  @param workloads  (list)  Names of WORKLOADS to run, all of them by default.
+  @param numSteps   (int)   Number of steps per workload.
+  @param sparsity   (float) Fraction of the columns active per input.
+  @param seed       (int)   Seed of the workloads.
+  @return           (OrderedDict) Model name -> workload name -> result of
+                    benchmarkModel(), with the "parity" with the reference
+                    instead of the predicted columns. The parity is None if
+                    the reference failed on the workload.
+  """
+  if modelNames is None:
+    modelNames = list(temporal_memory_factory.TemporalMemoryTypes.getTypes())
+  if workloads is None:
+    workloads = WORKLOADS.keys()
+
+  numColumns = int(numpy.prod(params.get("columnDimensions",
+                                         DEFAULT_COLUMN_DIMENSIONS)))
+  numActive = max(int(round(sparsity * numColumns)), 1)
+
+  # The reference runs first, to compare the others to it as they run. It
+  # runs even if it isn't one of modelNames, since parity is relative to it.
+  runOrder = [REFERENCE_MODEL] + [modelName for modelName in modelNames
+                                  if modelName != REFERENCE_MODEL]
+
+  results = OrderedDict((modelName, OrderedDict())
+                        for modelName in modelNames)
+  for workload in workloads:
+    steps = WORKLOADS[workload](numColumns, numActive, numSteps,
+                                numpy.random.RandomState(seed))
+    referenceColumns = None
+
+    for modelName in runOrder:
+      result = benchmarkModel(modelName, params, steps)
+      predictedColumns = result.pop("predictedColumns", None)
+      if modelName == REFERENCE_MODEL:
+        referenceColumns = predictedColumns
+      if predictedColumns is not None:
+        if referenceColumns is None:
+          result["parity"] = None
+        else:
+          result["parity"] = _parity(predictedColumns, referenceColumns)
+      if modelName in results:
+        results[modelName][workload] = result
+
+  return results
+
+
+def fastestModel(results, minParity=1.0):
+  """
+  @param results   (dict)  As returned by runBenchmark().
+  @param minParity (float) Lowest parity allowed on any workload.
+  @return          (str)   Name of the model with the highest steps per second
+                           over all workloads, among those that ran every
+                           workload with enough parity, or None. Models
+                           without a parity, because they or the reference
+                           failed, never qualify.
+  """
+  fastest = None
+  fastestRate = 0.0
+  for modelName, workloadResults in results.iteritems():
+    if not workloadResults or any(
+        result.get("parity") is None or result["parity"] < minParity
+        for result in workloadResults.itervalues()):
+      continue
+
+    # Harmonic mean, i.e. the rate over the total time of the workloads
+    rate = len(workloadResults) / sum(
+      1.0 / result["stepsPerSecond"]
+      for result in workloadResults.itervalues())
+    if rate > fastestRate:
+      fastest = modelName
+      fastestRate = rate
+
+  return fastest
+
+
+def _nupicVersion():
+  try:
+    return pkg_resources.get_distribution("nupic").version
+  except pkg_resources.DistributionNotFound:
+    return None
+
+
+def _profileKey(params, minParity, benchmarkArgs):
+  """
+  Everything a cached choice depends on: the model parameters, how the
+  benchmarks were run and judged, and the implementations being compared.
+  The seed of the model is left out, all seeds share a choice.
+  """
+  params = dict((name, value) for name, value in params.iteritems()
+                if name != "seed")
+  return json.dumps({"params": params,
+                     "minParity": minParity,
+                     "benchmarkArgs": benchmarkArgs,
+                     "nupicVersion": _nupicVersion()},
+                    sort_keys=True, default=repr)
+
+
+def loadProfiles(path):
+  """
+  @return (dict) Profile key -> cached choice and results, empty if there is
+                 no profile at path or it has another version.
+  """
+  if not os.path.exists(path):
+    return {}
+  with open(path) as f:
+    data = json.load(f)
+  if data.get("version") != PROFILE_VERSION:
+    return {}
+  return data["profiles"]
+
+
+def saveProfiles(path, profiles):
+  directory = os.path.dirname(path)
+  if directory and not os.path.exists(directory):
+    os.makedirs(directory)
+
+  # Write the whole file first so readers never see a partial profile
+  tmpPath = path + ".tmp"
+  with open(tmpPath, "w") as f:
+    json.dump({"version": PROFILE_VERSION, "profiles": profiles}, f,
+              indent=2, sort_keys=True)
+  os.rename(tmpPath, path)
+
+
+def selectModel(params, profilePath=None, minParity=1.0,
+                benchmarkIfMissing=False, **benchmarkArgs):
+  """
+  Get the fastest conforming implementation for the given parameters, from the
+  profile on disk. If the profile doesn't have them, either run the benchmarks
+  and add them to the profile, or fall back to REFERENCE_MODEL.
+
+  @param params             (dict)  Constructor arguments.
+  @param profilePath        (str)   Profile to use, DEFAULT_PROFILE_PATH by
+                                    default.
+  @param minParity          (float) See fastestModel().
+  @param benchmarkIfMissing (bool)  Run the benchmarks when the profile doesn't
+                                    have these arguments, which can take
+                                    minutes. Otherwise REFERENCE_MODEL is
+                                    returned, with a warning.
+  @param benchmarkArgs      (dict)  Passed on to runBenchmark().
+  @return                   (str)   A temporal_memory_factory type.
+  """
+  if profilePath is None:
+    profilePath = DEFAULT_PROFILE_PATH
+
+  profiles = loadProfiles(profilePath)
+  key = _profileKey(params, minParity, benchmarkArgs)
+  modelNames = list(temporal_memory_factory.TemporalMemoryTypes.getTypes())
+
+  profile = profiles.get(key)
+  if profile is None or profile["selected"] not in modelNames:
+    if not benchmarkIfMissing:
+      _LOGGER.warning("No temporal memory profile for these arguments, using "
+                      "%s. Run selectModel(..., benchmarkIfMissing=True) to "
+                      "profile them: %s", REFERENCE_MODEL, key)
+      return REFERENCE_MODEL
+
+    _LOGGER.warning("Benchmarking the temporal memory implementations for: %s",
+                    key)
+    results = runBenchmark(params, modelNames=modelNames, **benchmarkArgs)
+    selected = fastestModel(results, minParity)
+    if selected is None:
+      raise RuntimeError("No temporal memory implementation conforms to the "
+                         "reference for: " + key)
+    profile = {"selected": selected, "results": results}
+    profiles[key] = profile
+    saveProfiles(profilePath, profiles)
+
+  return profile["selected"]
@@ -0,0 +1,239 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Flat binary checkpoints for the Python temporal memories (TemporalMemory in
+temporal_memory_phases and its subclasses).
+
+A checkpoint is an uncompressed .npz archive, loaded with numpy.memmap, that
+holds:
+  - for every Connections attribute: the cell of each segment, and the
+    segment, presynaptic cell and (float64) permanence of each synapse, in
+    order of creation,
+  - sets of cells and numpy arrays (active, winner, predictive cells, ...) as
+    flat int arrays,
+  - the pickled random number generator and the remaining small attributes
+    (parameters, dicts, ...).
+
+Connections don't allow choosing the indices of new segments and synapses, so
+they get renumbered on load. Segments and synapses are recreated in order of
+their original index, which preserves their relative order, and the sets of
+segments and synapses listed in the TM's `segmentAttributes` and
+`synapseAttributes` are mapped to the new indices.
+"""
+
+import cPickle as pickle
+
+import numpy
+
+from htmresearch.support.network_data_file import mapArchive
+
+
+
+FORMAT_VERSION = 1
+
+
+
+def _isCellSet(value):
+  return (isinstance(value, (set, frozenset)) and
+          all(isinstance(x, (int, long, numpy.integer)) for x in value))
+
+
+
+def _isConnections(value):
+  return all(hasattr(value, name) for name in ("createSegment",
+                                               "createSynapse",
+                                               "segmentsForCell",
+                                               "synapsesForSegment",
+                                               "dataForSynapse"))
+
+
+
+def _flattenConnections(connections):
+  """
+  @return (dict) Flat arrays describing the segments and synapses, see
+                 _buildConnections().
+  """
+  segments = []
+  for cell in xrange(connections.numCells):
+    segments.extend((segment, cell)
+                    for segment in connections.segmentsForCell(cell))
+  segments.sort()
+  segmentIds = numpy.array([s for s, _ in segments], dtype=numpy.int64)
+  segmentCells = numpy.array([c for _, c in segments], dtype=numpy.int32)
+
+  synapses = []
+  for row, segment in enumerate(segmentIds.tolist()):
+    for synapse in connections.synapsesForSegment(segment):
+      synapseData = connections.dataForSynapse(synapse)
+      synapses.append((synapse, row, synapseData.presynapticCell,
+                       synapseData.permanence))
+  synapses.sort()
+
+  return {
+    "params": numpy.array([connections.numCells,
+                           getattr(connections, "maxSegmentsPerCell", 255),
+                           getattr(connections, "maxSynapsesPerSegment",
+                                   255)],
+                          dtype=numpy.int64),
+    "segmentIds": segmentIds,
+    "segmentCells": segmentCells,
+    "synapseIds": numpy.array([s[0] for s in synapses], dtype=numpy.int64),
+    "synapseSegments": numpy.array([s[1] for s in synapses],
+                                   dtype=numpy.int32),
+    "presynapticCells": numpy.array([s[2] for s in synapses],
+                                    dtype=numpy.int32),
+    "permanences": numpy.array([s[3] for s in synapses], dtype=numpy.float64),
+  }
+
+
+
+def _buildConnections(connectionsClass, arrays):
+  """
+  Recreate Connections from the arrays written by _flattenConnections().
+
+  @return (tuple) The Connections, and dicts from the saved segment and
+                  synapse indices to the new ones.
+  """
+  numCells, maxSegmentsPerCell, maxSynapsesPerSegment = (
+    arrays["params"].tolist())
+  connections = connectionsClass(numCells,
+                                 maxSegmentsPerCell=maxSegmentsPerCell,
+                                 maxSynapsesPerSegment=maxSynapsesPerSegment)
+
+  newSegments = [connections.createSegment(cell)
+                 for cell in arrays["segmentCells"].tolist()]
+
+  newSynapses = [connections.createSynapse(newSegments[row], presynapticCell,
+                                           permanence)
+                 for row, presynapticCell, permanence in zip(
+                   arrays["synapseSegments"].tolist(),
+                   arrays["presynapticCells"].tolist(),
+                   arrays["permanences"].tolist())]
+
+  # Checkpoints written before synapse indices were saved can't map them
+  synapseMap = None
+  if "synapseIds" in arrays:
+    synapseMap = dict(zip(arrays["synapseIds"].tolist(), newSynapses))
+
+  return (connections,
+          dict(zip(arrays["segmentIds"].tolist(), newSegments)),
+          synapseMap)
+
+
+
+def writeCheckpoint(tm, path):
+  """
+  Write a temporal memory to a flat binary checkpoint.
+
+  @param tm    (TemporalMemory) Instance of TemporalMemory or a subclass.
+  @param path  (str)            Output path; should end in ".npz".
+  @return      (str)            path
+  """
+  arrays = {"version": numpy.array([FORMAT_VERSION], dtype=numpy.int32)}
+  other = {}
+  connectionsClasses = {}
+
+  for name, value in tm.__dict__.iteritems():
+    if name == "_random":
+      arrays["random"] = numpy.frombuffer(pickle.dumps(value, 2),
+                                          dtype=numpy.uint8)
+    elif _isConnections(value):
+      connectionsClasses[name] = type(value)
+      for key, array in _flattenConnections(value).iteritems():
+        arrays["connections.{}.{}".format(name, key)] = array
+    elif _isCellSet(value):
+      arrays["set." + name] = numpy.array(sorted(value), dtype=numpy.int64)
+    elif isinstance(value, numpy.ndarray) and value.dtype != object:
+      arrays["array." + name] = value
+    else:
+      other[name] = value
+
+  meta = {"class": type(tm),
+          "connectionsClasses": connectionsClasses,
+          "attributes": other}
+  arrays["meta"] = numpy.frombuffer(pickle.dumps(meta, 2), dtype=numpy.uint8)
+
+  # Don't let numpy.savez append ".npz" to some other extension
+  with open(path, "wb") as f:
+    numpy.savez(f, **arrays)
+
+  return path
+
+
+
+def readCheckpoint(path):
+  """
+  Load a temporal memory from a checkpoint written by writeCheckpoint().
+
+  @param path (str)               Checkpoint path.
+  @return     (TemporalMemory)    Instance of the class that was saved.
+  """
+  arrays = mapArchive(path)
+
+  version = int(arrays["version"][0])
+  if version != FORMAT_VERSION:
+    raise ValueError("Unsupported temporal memory checkpoint version {} in {}."
+                     .format(version, path))
+
+  meta = pickle.loads(arrays["meta"].tostring())
+  tmClass = meta["class"]
+  tm = object.__new__(tmClass)
+  tm.__dict__.update(meta["attributes"])
+  tm._random = pickle.loads(arrays["random"].tostring())
+
+  segmentMaps = {}
+  synapseMaps = {}
+  for name, connectionsClass in meta["connectionsClasses"].iteritems():
+    prefix = "connections.{}.".format(name)
+    connectionArrays = {key[len(prefix):]: array
+                        for key, array in arrays.iteritems()
+                        if key.startswith(prefix)}
+    (connections,
+     segmentMaps[name],
+     synapseMaps[name]) = _buildConnections(connectionsClass, connectionArrays)
+    setattr(tm, name, connections)
+
+  for key, array in arrays.iteritems():
+    if key.startswith("set."):
+      setattr(tm, key[len("set."):], set(array.tolist()))
+    elif key.startswith("array."):
+      setattr(tm, key[len("array."):], numpy.array(array))
+
+  # Segment indices change when the Connections are rebuilt. Indices of
+  # segments or synapses that were destroyed since they were stored are dropped.
+  for name, connectionsName in getattr(tmClass, "segmentAttributes",
+                                       {}).iteritems():
+    segmentMap = segmentMaps[connectionsName]
+    setattr(tm, name, set(segmentMap[s] for s in getattr(tm, name)
+                          if s in segmentMap))
+
+  for name, connectionsName in getattr(tmClass, "synapseAttributes",
+                                       {}).iteritems():
+    synapseMap = synapseMaps[connectionsName]
+    if synapseMap is None:
+      raise ValueError("Checkpoint {} doesn't have the synapse indices needed "
+                       "for {}.".format(path, name))
+    setattr(tm, name, set(synapseMap[s] for s in getattr(tm, name)
+                          if s in synapseMap))
+
+  return tm
@@ -0,0 +1,374 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Opt-in per phase profiling of the temporal memories.
+
+A TemporalMemoryProfiler is attached to a model instance and replaces the
+model's phase methods, on that instance only, with wrappers that time them.
+Phases called from other phases are recorded under their full call stack, e.g.
+"compute;burstColumns", so both inclusive and exclusive times are available.
+The wrappers also count the segments and synapses read during each phase,
+through the methods of the model and of its Connections that hand them out.
+
+Every call goes into a fixed size ring of records, which keeps the most recent
+calls, and into running totals per call stack. Both can be exported as JSON,
+and the totals as folded stacks for flame graph tools such as flamegraph.pl or
+speedscope.
+
+Only the methods that exist on the model are wrapped, so the same profiler
+works with every type in temporal_memory_factory.TemporalMemoryTypes. For
+compiled models, whose internals can't be wrapped, only compute() is timed and
+no segments or synapses are counted.
+"""
+
+import json
+import timeit
+
+from collections import OrderedDict
+
+
+
+# Phase methods of temporal_memory_phases.TemporalMemory and its subclasses,
+# nupic's TemporalMemory, and the classic TM and TM_SM
+PHASES = (
+  # temporal_memory_phases.TemporalMemory, ExtendedTemporalMemory
+  "compute",
+  "computeFn",
+  "activateCorrectlyPredictiveCells",
+  "burstColumns",
+  "learnOnSegments",
+  "learnOnApicalSegments",
+  "computePredictiveCells",
+  # TM, TM_SM
+  "infer",
+  "learn",
+  "computePhase2",
+  "processSegmentUpdates",
+  "trimSegments",
+  "_updateStatsInferEnd",
+)
+
+
+def _numSynapses(segment):
+  """Number of lateral and, for TM_SM, distal synapses of a TM.py segment."""
+  return len(segment.syns) + len(getattr(segment, "dsyns", ()))
+
+
+# Methods that hand out segments or synapses, with functions giving the number
+# of segments and synapses touched by a call, from its arguments and result.
+CONNECTIONS_COUNTERS = {
+  "segmentsForCell": lambda args, result: (len(result), 0),
+  "synapsesForSegment": lambda args, result: (0, len(result)),
+  "synapsesForPresynapticCell": lambda args, result: (0, len(result)),
+}
+
+MODEL_COUNTERS = {
+  # TM, TM_SM
+  "isSegmentActive": lambda args, result: (1, _numSynapses(args[0])),
+  "getSegmentActivityLevel": lambda args, result: (1, _numSynapses(args[0])),
+}
+
+# Model attributes holding Connections
+CONNECTIONS_ATTRIBUTES = ("connections", "apicalConnections")
+
+
+
+class TemporalMemoryProfiler(object):
+  """
+  Records the wall time, number of calls and segments and synapses touched by
+  each phase of a temporal memory.
+
+  Usage:
+
+    profiler = TemporalMemoryProfiler().attach(tm)
+    ...
+    profiler.detach()
+    print profiler.toFoldedStacks()
+
+  The profiler changes attributes of the model, so detach it before pickling
+  or checkpointing the model.
+  """
+
+  def __init__(self, capacity=10000, phases=PHASES):
+    """
+    @param capacity (int)  Number of most recent phase calls kept in the ring.
+    @param phases   (list) Names of the methods to time. Those the model
+                           doesn't have are skipped.
+    """
+    self.capacity = capacity
+    self.phases = tuple(phases)
+
+    self.model = None
+    self._patched = []
+    self.reset()
+
+
+  def reset(self):
+    """Forget the recorded calls."""
+    self.numRecords = 0
+    self.numSegments = 0
+    self.numSynapses = 0
+
+    self._records = [None] * self.capacity
+
+    # Call stack ids: (parent id, phase) -> id, and id -> stack names
+    self._stackIds = {}
+    self._stacks = []
+    # Per stack id: [calls, seconds, exclusive seconds, segments, synapses]
+    self._totals = []
+
+    # Open calls: [stack id, start, seconds in callees, segments, synapses]
+    self._openCalls = []
+
+
+  def attach(self, model):
+    """
+    Start profiling a model.
+
+    @param model (object) Temporal memory instance.
+    @return      (TemporalMemoryProfiler) self
+    """
+    if self.model is not None:
+      raise RuntimeError("The profiler is already attached to a model.")
+    self.model = model
+
+    for name in self.phases:
+      method = getattr(model, name, None)
+      if callable(method):
+        self._patch(model, name, self._timed(name, method))
+
+    for name, counter in MODEL_COUNTERS.iteritems():
+      method = getattr(model, name, None)
+      if callable(method):
+        self._patch(model, name, self._counted(counter, method))
+
+    for attribute in CONNECTIONS_ATTRIBUTES:
+      connections = getattr(model, attribute, None)
+      if connections is None:
+        continue
+      for name, counter in CONNECTIONS_COUNTERS.iteritems():
+        method = getattr(connections, name, None)
+        if callable(method):
+          self._patch(connections, name, self._counted(counter, method))
+
+    return self
+
+
+  def detach(self):
+    """Stop profiling, restoring the original methods of the model."""
+    for obj, name in reversed(self._patched):
+      try:
+        delattr(obj, name)
+      except AttributeError:
+        pass
+    self._patched = []
+    self.model = None
+
+
+  def getTimedPhases(self):
+    """@return (list) Names of the phases of the attached model being timed."""
+    return [name for obj, name in self._patched
+            if obj is self.model and name not in MODEL_COUNTERS]
+
+
+  def getRecords(self):
+    """
+    @return (list) Most recent phase calls, oldest first, as dicts with the
+                   call "stack" (str), "start" time, "seconds",
+                   "exclusiveSeconds", and "segments" and "synapses" touched,
+                   including by the callees.
+    """
+    if self.numRecords > self.capacity:
+      oldest = self.numRecords % self.capacity
+      records = self._records[oldest:] + self._records[:oldest]
+    else:
+      records = self._records[:self.numRecords]
+
+    return [{"stack": ";".join(self._stacks[stackId]),
+             "start": start,
+             "seconds": seconds,
+             "exclusiveSeconds": exclusive,
+             "segments": segments,
+             "synapses": synapses}
+            for stackId, start, seconds, exclusive, segments, synapses
+            in records]
+
+
+  def getStackTotals(self):
+    """
+    @return (OrderedDict) Call stack (str) -> dict with the number of "calls",
+                          the total "seconds" and "exclusiveSeconds", and the
+                          "segments" and "synapses" touched.
+    """
+    totals = OrderedDict()
+    for stackId, (calls, seconds, exclusive, segments,
+                  synapses) in enumerate(self._totals):
+      totals[";".join(self._stacks[stackId])] = {
+        "calls": calls,
+        "seconds": seconds,
+        "exclusiveSeconds": exclusive,
+        "segments": segments,
+        "synapses": synapses,
+      }
+    return totals
+
+
+  def getSummary(self):
+    """
+    @return (OrderedDict) Phase name -> totals like in getStackTotals(), over
+                          all the stacks the phase was called from.
+    """
+    summary = OrderedDict()
+    for stackId, stackTotals in enumerate(self._totals):
+      phase = self._stacks[stackId][-1]
+      phaseTotals = summary.setdefault(phase, [0, 0.0, 0.0, 0, 0])
+      for i, value in enumerate(stackTotals):
+        phaseTotals[i] += value
+
+    return OrderedDict(
+      (phase, {"calls": calls,
+               "seconds": seconds,
+               "exclusiveSeconds": exclusive,
+               "segments": segments,
+               "synapses": synapses})
+      for phase, (calls, seconds, exclusive, segments,
+                  synapses) in summary.iteritems())
+
+
+  def toJSON(self, path=None, includeRecords=True):
+    """
+    @param path           (str)  Optional file to write the JSON to.
+    @param includeRecords (bool) Whether to include the records of the ring.
+    @return               (str)  JSON with the "summary", "stacks" totals and
+                                 "records".
+    """
+    data = OrderedDict([
+      ("numRecords", self.numRecords),
+      ("capacity", self.capacity),
+      ("summary", self.getSummary()),
+      ("stacks", self.getStackTotals()),
+    ])
+    if includeRecords:
+      data["records"] = self.getRecords()
+
+    text = json.dumps(data, indent=2)
+    if path is not None:
+      with open(path, "w") as f:
+        f.write(text)
+    return text
+
+
+  def toFoldedStacks(self, path=None):
+    """
+    @param path (str) Optional file to write the stacks to.
+    @return     (str) One "phase;callee <microseconds>" line per call stack,
+                      with the exclusive time of the stack, as read by
+                      flamegraph.pl.
+    """
+    lines = ["{} {}".format(";".join(self._stacks[stackId]),
+                            int(round(totals[2] * 1e6)))
+             for stackId, totals in enumerate(self._totals)]
+    text = "\n".join(lines) + "\n" if lines else ""
+
+    if path is not None:
+      with open(path, "w") as f:
+        f.write(text)
+    return text
+
+
+  def _patch(self, obj, name, wrapper):
+    """
+    Set a wrapper as an instance attribute, shadowing the class' method.
+    Objects that don't take new attributes, like compiled extensions, are left
+    alone.
+    """
+    if name in getattr(obj, "__dict__", {}):
+      # Don't hide methods set on the instance by someone else
+      return
+    try:
+      setattr(obj, name, wrapper)
+    except (AttributeError, TypeError):
+      return
+    self._patched.append((obj, name))
+
+
+  def _timed(self, name, method):
+    clock = timeit.default_timer
+
+    def timedPhase(*args, **kwargs):
+      openCalls = self._openCalls
+      parentId = openCalls[-1][0] if openCalls else -1
+      stackId = self._stackIds.get((parentId, name))
+      if stackId is None:
+        stackId = self._addStack(parentId, name)
+
+      call = [stackId, 0.0, 0.0, self.numSegments, self.numSynapses]
+      openCalls.append(call)
+      call[1] = clock()
+      try:
+        return method(*args, **kwargs)
+      finally:
+        seconds = clock() - call[1]
+        openCalls.pop()
+        if openCalls:
+          openCalls[-1][2] += seconds
+        self._record(call, seconds)
+
+    return timedPhase
+
+
+  def _counted(self, counter, method):
+    def countedMethod(*args, **kwargs):
+      result = method(*args, **kwargs)
+      segments, synapses = counter(args, result)
+      self.numSegments += segments
+      self.numSynapses += synapses
+      return result
+
+    return countedMethod
+
+
+  def _addStack(self, parentId, name):
+    stackId = len(self._stacks)
+    parent = self._stacks[parentId] if parentId >= 0 else ()
+    self._stackIds[(parentId, name)] = stackId
+    self._stacks.append(parent + (name,))
+    self._totals.append([0, 0.0, 0.0, 0, 0])
+    return stackId
+
+
+  def _record(self, call, seconds):
+    stackId, start, calleeSeconds, segments, synapses = call
+    exclusive = seconds - calleeSeconds
+    segments = self.numSegments - segments
+    synapses = self.numSynapses - synapses
+
+    self._records[self.numRecords % self.capacity] = (
+      stackId, start, seconds, exclusive, segments, synapses)
+    self.numRecords += 1
+
+    totals = self._totals[stackId]
+    totals[0] += 1
+    totals[1] += seconds
+    totals[2] += exclusive
+    totals[3] += segments
+    totals[4] += synapses
@@ -0,0 +1,121 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Streaming prediction statistics for the temporal memories.
+
+Every update is given the sparse active and predicted columns of one time
+step. Per column counters are only touched at those indices, and the scalar
+scores are folded into exponential moving averages, so an update costs the
+same no matter how long the TM has been running and no history is kept.
+"""
+
+from collections import OrderedDict
+
+import numpy
+
+
+
+class StreamingPredictionStats(object):
+  """
+  Per column prediction counters and moving averages of prediction scores.
+
+  The moving averages use a weight of max(decay, 1 / numUpdates) for the
+  newest value, so they are plain means until 1 / decay updates have been
+  seen, and then forget old values exponentially.
+  """
+
+  def __init__(self, numColumns, decay=0.01):
+    """
+    @param numColumns (int)   Number of columns of the TM.
+    @param decay      (float) Weight of the newest value in the moving
+                              averages, once enough updates have been seen.
+    """
+    self.numColumns = numColumns
+    self.decay = decay
+    self.reset()
+
+
+  def reset(self):
+    self.numUpdates = 0
+    self.activeCounts = numpy.zeros(self.numColumns, dtype=numpy.int64)
+    self.predictedCounts = numpy.zeros(self.numColumns, dtype=numpy.int64)
+    self.correctCounts = numpy.zeros(self.numColumns, dtype=numpy.int64)
+    self.averages = OrderedDict()
+
+
+  def update(self, activeColumns, predictedColumns, **scores):
+    """
+    Add one time step.
+
+    @param activeColumns    (numpy array) Sorted, unique indices of the active
+                                          columns.
+    @param predictedColumns (numpy array) Sorted, unique indices of the columns
+                                          that were predicted for this step.
+    @param scores           (float)       Scores to average, by name.
+    """
+    self.numUpdates += 1
+    self.activeCounts[activeColumns] += 1
+    self.predictedCounts[predictedColumns] += 1
+    self.correctCounts[numpy.intersect1d(activeColumns, predictedColumns,
+                                         assume_unique=True)] += 1
+
+    weight = max(self.decay, 1.0 / self.numUpdates)
+    for name, value in scores.iteritems():
+      average = self.averages.get(name)
+      if average is None:
+        self.averages[name] = float(value)
+      else:
+        self.averages[name] = average + weight * (value - average)
+
+
+  def getColumnPrecision(self):
+    """
+    @return (numpy array) Per column fraction of the predictions that were
+                          followed by the column becoming active. Columns that
+                          were never predicted have a precision of 0.
+    """
+    return self.correctCounts / numpy.maximum(self.predictedCounts,
+                                              1).astype(float)
+
+
+  def getColumnRecall(self):
+    """
+    @return (numpy array) Per column fraction of the activations that were
+                          predicted. Columns that were never active have a
+                          recall of 0.
+    """
+    return self.correctCounts / numpy.maximum(self.activeCounts,
+                                              1).astype(float)
+
+
+  def snapshot(self):
+    """
+    @return (dict) Copies of the counters and moving averages, which don't
+                   change with further updates.
+    """
+    return {
+      "numUpdates": self.numUpdates,
+      "averages": dict(self.averages),
+      "activeCounts": self.activeCounts.copy(),
+      "predictedCounts": self.predictedCounts.copy(),
+      "correctCounts": self.correctCounts.copy(),
+    }
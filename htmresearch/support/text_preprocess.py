@@ -22,25 +22,52 @@
 This file contains text pre-processing functions for NLP experiments.
 """
 
+import cPickle as pkl
+import itertools
+import multiprocessing
 import os
 import pandas
 import re
 import string
 
-from collections import Counter
+from collections import Counter, defaultdict, deque, OrderedDict
 from functools import partial
 
 
 
+TOKEN_REGEX = re.compile("[a-z$]+")
+
+# Preprocessor and options used by the tokenizeCorpus() worker processes
+_workerPreprocessor = None
+_workerSpecs = None
+
+
+
+def _initTokenizeWorker(preprocessor, preprocessSpecs):
+  global _workerPreprocessor, _workerSpecs
+  _workerPreprocessor = preprocessor
+  _workerSpecs = preprocessSpecs
+
+
+
+def _tokenizeChunk(texts):
+  return [_workerPreprocessor.tokenizeAndFilter(text, **_workerSpecs)
+          for text in texts]
+
+
 class TextPreprocess(object):
   """Class for text pre-processing"""
 
   alphabet = string.ascii_lowercase
 
+  # Spelling corrections consider words up to this edit distance away
+  maxEditDistance = 2
+
   def __init__(self,
                corpusTxt="compilation.txt",
                abbrCSV="abbreviations.csv",
-               contrCSV="contractions.csv"):
+               contrCSV="contractions.csv",
+               spellCacheSize=100000):
     """
     @param corpusTxt      (str)       A compilation of most frequent words. The
         default file 'compilation.txt' is the most frequent words sourced from
@@ -53,10 +80,14 @@ class TextPreprocess(object):
     @param contrCSV       (str)       A compilation of common contractions. The
         file is a csv with the header "Contr,Expansion". The default file
         'contractions.csv' contains a short list of common contractions.
+
+    @param spellCacheSize (int)       Max number of spelling corrections to
+        remember, so repeated words aren't corrected again.
     """
     self.abbrCSV = abbrCSV
     self.contrCSV = contrCSV
     self.corpusTxt = corpusTxt
+    self.spellCacheSize = spellCacheSize
 
     self.abbrs = None
     self.abbrRegex = None
@@ -64,6 +95,10 @@ class TextPreprocess(object):
     self.contrs = None
     self.contrRegex = None
     self.corpus = None
+    self.corpusPath = None
+    self.deletesIndex = None
+    self.corrections = OrderedDict()
+    self.mostCommon = {}
 
 
   def _setupCorpus(self, corpusSource):
@@ -83,7 +118,50 @@ class TextPreprocess(object):
       print "Error reading in the text corpus file '{}'".format(filename)
       raise e
 
+    self.corpusPath = corpusPath
     self.bagOfWords = Counter(self.tokenize(self.corpus))
+    self.deletesIndex = None
+    self.corrections = OrderedDict()
+    self.mostCommon = {}
+
+
+  def _setupDeletesIndex(self):
+    """
+    Create the deletion-neighborhood index of the corpus, which maps every
+    string that can be made by deleting up to maxEditDistance characters from a
+    corpus word back to those corpus words. The index is saved next to the
+    corpus file and reused while the corpus file is unchanged.
+    """
+    if not self.bagOfWords:
+      self._setupCorpus(self.corpusTxt)
+
+    indexPath = "{}.deletes{}.pkl".format(self.corpusPath,
+                                          self.maxEditDistance)
+    corpusStat = os.stat(self.corpusPath)
+    corpusVersion = (corpusStat.st_size, corpusStat.st_mtime)
+
+    if os.path.isfile(indexPath):
+      try:
+        with open(indexPath, "rb") as f:
+          version, index = pkl.load(f)
+        if version == corpusVersion:
+          self.deletesIndex = index
+          return
+      except (IOError, EOFError, ValueError, pkl.UnpicklingError):
+        pass
+
+    index = defaultdict(list)
+    for word in self.bagOfWords:
+      for variant in self._deletes(word, self.maxEditDistance):
+        index[variant].append(word)
+    self.deletesIndex = dict(index)
+
+    try:
+      with open(indexPath, "wb") as f:
+        pkl.dump((corpusVersion, self.deletesIndex), f, pkl.HIGHEST_PROTOCOL)
+    except IOError:
+      # The corpus directory may be read-only; just rebuild the index next time
+      pass
 
 
   def _setupAbbrs(self, abbrsSource):
@@ -192,6 +270,73 @@ class TextPreprocess(object):
     return processedTokens, mapping
 
 
+  def tokenizeCorpus(self, texts, workers=1, chunksize=100,
+                     **preprocessSpecs):
+    """
+    Generator version of tokenizeAndFilter() for a whole corpus. The documents
+    are read from the iterable lazily and, if workers > 1, tokenized in a pool
+    of processes; only a few chunks per worker are in flight at any time, so
+    the corpus never needs to fit in memory.
+
+    @param texts            (iterable)  Documents (str) to tokenize.
+    @param workers          (int)       Number of processes; 1 tokenizes in
+                                        this process.
+    @param chunksize        (int)       Number of documents per task sent to a
+                                        worker.
+    @param preprocessSpecs              Filtering options, as for
+                                        tokenizeAndFilter().
+
+    @return                 (generator) Yields (processedTokens, mapping) for
+                                        each document, in input order.
+    """
+    # Read the corpus and expansion files and compile their regexes once,
+    # before the workers are forked
+    self._setupFilters(**preprocessSpecs)
+
+    if workers <= 1:
+      for text in texts:
+        yield self.tokenizeAndFilter(text, **preprocessSpecs)
+      return
+
+    texts = iter(texts)
+    chunks = iter(lambda: list(itertools.islice(texts, chunksize)), [])
+
+    pool = multiprocessing.Pool(workers,
+                                initializer=_initTokenizeWorker,
+                                initargs=(self, preprocessSpecs))
+    try:
+      pending = deque()
+      for chunk in chunks:
+        pending.append(pool.apply_async(_tokenizeChunk, (chunk,)))
+        if len(pending) >= 2 * workers:
+          for result in pending.popleft().get():
+            yield result
+      while pending:
+        for result in pending.popleft().get():
+          yield result
+      pool.close()
+    finally:
+      pool.terminate()
+      pool.join()
+
+
+  def _setupFilters(self,
+                    ignoreCommon=None,
+                    removeStrings=None,
+                    correctSpell=False,
+                    expandAbbr=False,
+                    expandContr=False):
+    """Load the data the given _filterStuff() options need, if not yet done."""
+    if expandAbbr and not self.abbrs:
+      self._setupAbbrs(self.abbrCSV)
+    if expandContr and not self.contrs:
+      self._setupContr(self.contrCSV)
+    if (ignoreCommon or correctSpell) and not self.bagOfWords:
+      self._setupCorpus(self.corpusTxt)
+    if correctSpell and self.deletesIndex is None:
+      self._setupDeletesIndex()
+
+
   @staticmethod
   def tokenize(text):
     """Tokenize, returning only lower-case letters and "$"."""
@@ -199,7 +344,7 @@ class TextPreprocess(object):
       raise TypeError(
           "{} is not an acceptable type for tokenization.".format(type(text)))
 
-    return re.findall("[a-z$]+", text.lower())
+    return TOKEN_REGEX.findall(text.lower())
 
 
   def _filterStuff(self,
@@ -270,12 +415,14 @@ class TextPreprocess(object):
     @param n                (int)               Will filter out the n-most
                                                 frequent terms.
     """
-    if not self.bagOfWords:
-      self._setupCorpus(self.corpusTxt)
-
-    ignoreList = [word[0] for word in self.bagOfWords.most_common(n)]
+    ignoreSet = self.mostCommon.get(n)
+    if ignoreSet is None:
+      if not self.bagOfWords:
+        self._setupCorpus(self.corpusTxt)
+      ignoreSet = {word[0] for word in self.bagOfWords.most_common(n)}
+      self.mostCommon[n] = ignoreSet
 
-    return [token for token in tokenList if token not in ignoreList]
+    return [token for token in tokenList if token not in ignoreSet]
 
 
   @staticmethod
@@ -294,22 +441,115 @@ class TextPreprocess(object):
   def correct(self, word):
     """
     Find the best spelling correction for this word. Prefer edit distance  of 0,
-    then one, then two; otherwise default to the word itself.
+    then one, then two; otherwise default to the word itself. Among candidates
+    at the same distance the most frequent word in the corpus wins, with ties
+    broken alphabetically.
+
+    Candidates are looked up in the deletion-neighborhood index of the corpus
+    (see _setupDeletesIndex()) rather than by enumerating every edit of the
+    word, and the results are memoized in a least recently used cache.
     """
+    correction = self.corrections.pop(word, None)
+    if correction is not None:
+      # Move the hit to the most recently used end
+      self.corrections[word] = correction
+      return correction
+
     if not self.bagOfWords:
       self._setupCorpus(self.corpusTxt)
 
-    candidates = (self._known({word}) or
-                  self._known(self._editDistance1(word)) or
-                  self._known(self._editDistance2(word)) or
-                  [word])
+    if word in self.bagOfWords:
+      correction = word
+    else:
+      if self.deletesIndex is None:
+        self._setupDeletesIndex()
+
+      candidatesByDistance = [set() for _ in xrange(self.maxEditDistance + 1)]
+      for variant in self._deletes(word, self.maxEditDistance):
+        for candidate in self.deletesIndex.get(variant, ()):
+          distance = self._distance(word, candidate)
+          if distance <= self.maxEditDistance:
+            candidatesByDistance[distance].add(candidate)
 
-    return max(candidates, key=self.bagOfWords.get)
+      candidates = next((c for c in candidatesByDistance if c), [word])
+      correction = max(sorted(candidates), key=self.bagOfWords.get)
 
+    self.corrections[word] = correction
+    if len(self.corrections) > self.spellCacheSize:
+      self.corrections.popitem(last=False)
 
-  def _known(self, words):
-    """Return the subset of words that are in the corpus."""
-    return {w for w in words if w in self.bagOfWords}
+    return correction
+
+
+  def _distance(self, word, candidate):
+    """
+    Edit distance between word and candidate in terms of the edits generated by
+    _editDistance1(), or maxEditDistance+1 if they are further apart.
+    """
+    if abs(len(word) - len(candidate)) > self.maxEditDistance:
+      return self.maxEditDistance + 1
+
+    distance = self._damerauLevenshtein(word, candidate)
+    if (distance <= self.maxEditDistance and
+        not set(candidate).issubset(self.alphabet)):
+      # Insertions and substitutions only produce lower-case letters, so a
+      # candidate with other characters (e.g. "$") needs the explicit edits.
+      edits1 = self._editDistance1(word)
+      if candidate in edits1:
+        distance = 1
+      elif any(candidate in self._editDistance1(e) for e in edits1):
+        distance = 2
+      else:
+        distance = self.maxEditDistance + 1
+    return distance
+
+
+  @staticmethod
+  def _damerauLevenshtein(a, b):
+    """
+    Return the (unrestricted) Damerau-Levenshtein distance between strings a and
+    b, i.e. the least number of deletions, insertions, substitutions and
+    transpositions of adjacent characters that turns a into b.
+    """
+    infinity = len(a) + len(b)
+    lastRow = {}
+    # Distance matrix with an extra border row and column of "infinity"
+    d = [[infinity] * (len(b) + 2) for _ in xrange(len(a) + 2)]
+    for i in xrange(len(a) + 1):
+      d[i + 1][1] = i
+    for j in xrange(len(b) + 1):
+      d[1][j + 1] = j
+
+    for i in xrange(1, len(a) + 1):
+      lastMatchCol = 0
+      for j in xrange(1, len(b) + 1):
+        i1 = lastRow.get(b[j - 1], 0)
+        j1 = lastMatchCol
+        cost = 1
+        if a[i - 1] == b[j - 1]:
+          cost = 0
+          lastMatchCol = j
+        d[i + 1][j + 1] = min(d[i][j] + cost,
+                              d[i + 1][j] + 1,
+                              d[i][j + 1] + 1,
+                              d[i1][j1] + (i - i1 - 1) + 1 + (j - j1 - 1))
+      lastRow[a[i - 1]] = i
+
+    return d[len(a) + 1][len(b) + 1]
+
+
+  @staticmethod
+  def _deletes(word, maxDeletes):
+    """
+    Return the set of strings made by deleting up to maxDeletes characters from
+    the word, including the word itself.
+    """
+    deletes = {word}
+    frontier = {word}
+    for _ in xrange(maxDeletes):
+      frontier = {w[:i] + w[i+1:] for w in frontier for i in xrange(len(w))}
+      deletes.update(frontier)
+    return deletes
 
 
   @staticmethod
@@ -329,7 +569,7 @@ class TextPreprocess(object):
     # Now perform the edits at every possible split location.
     # Substitution is essentially a deletion and insertion.
     delete = [a+b[1:] for a,b in splits if b]
-    insert = [a+b+c for a,b in splits for c in TextPreprocess.alphabet]
+    insert = [a+c+b for a,b in splits for c in TextPreprocess.alphabet]
     subs = [a+c+b[1:] for a,b in splits for c in TextPreprocess.alphabet if b]
     trans = [a+b[1]+b[0]+b[2:] for a,b in splits if len(b)>1]
 
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Times the data preparation steps of the NLP runners (train/test partitioning
+and label mapping) on synthetic datasets of increasing size. The time per
+sample should stay roughly constant as the number of samples grows.
+"""
+
+import argparse
+import random
+import time
+
+from htmresearch.support.csv_helper import mapLabelRefs
+from htmresearch.support.data_split import IncrementalSplit, KFolds
+
+
+
+def makeDataDict(numSamples, numLabels, seed=42):
+  """Fake records in the format returned by csv_helper.readCSV()."""
+  rng = random.Random(seed)
+  labels = ["label{}".format(i) for i in xrange(numLabels)]
+  return {i: ("sample text", rng.sample(labels, rng.randint(1, 3)), i)
+          for i in xrange(numSamples)}
+
+
+
+def timeIt(function, *args, **kwargs):
+  start = time.time()
+  function(*args, **kwargs)
+  return time.time() - start
+
+
+
+def run(args):
+  print "{:>10} {:>18} {:>18} {:>18}".format(
+    "samples", "incremental us/row", "k-folds us/row", "labels us/row")
+
+  for numSamples in args.sizes:
+    indices = range(numSamples)
+    trainSizes = [numSamples / 4, numSamples / 2]
+    dataDict = makeDataDict(numSamples, args.numLabels)
+
+    times = (
+      timeIt(IncrementalSplit(trainSizes).split, indices, randomize=True),
+      timeIt(KFolds(args.folds).split, indices, randomize=True),
+      timeIt(mapLabelRefs, dataDict),
+    )
+    print "{:>10} {:>18.2f} {:>18.2f} {:>18.2f}".format(
+      numSamples, *[1e6 * t / numSamples for t in times])
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--sizes",
+                      default=[10000, 100000, 1000000],
+                      type=int,
+                      nargs="+",
+                      help="Dataset sizes to benchmark.")
+  parser.add_argument("--numLabels",
+                      default=100,
+                      type=int,
+                      help="Number of distinct labels in the fake dataset.")
+  parser.add_argument("--folds",
+                      default=5,
+                      type=int,
+                      help="Number of folds for the k-folds split.")
+
+  run(parser.parse_args())
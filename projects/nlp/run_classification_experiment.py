@@ -63,7 +63,7 @@ def run(args):
 
   print "Reading in data and preprocessing."
   dataTime = time.time()
-  runner.setupData(args.textPreprocess)
+  runner.setupData(args.textPreprocess, cacheData=args.cacheData)
   print ("Data setup complete; elapsed time is {0:.2f} seconds.\nNow encoding "
          "the data".format(time.time() - dataTime))
 
@@ -72,7 +72,7 @@ def run(args):
   print ("Encoding complete; elapsed time is {0:.2f} seconds.\nNow running the "
          "experiment.".format(time.time() - encodeTime))
 
-  runner.runExperiment(args.seed)
+  runner.runExperiment(args.seed, workers=args.workers)
 
   runner.writeOutClassifications()
 
@@ -136,6 +136,16 @@ if __name__ == "__main__":
                       action="store_true",
                       default=False,
                       help="Whether or not to use text preprocessing.")
+  parser.add_argument("--cacheData",
+                      action="store_true",
+                      default=False,
+                      help="Keep a columnar cache of the CSV next to it, and "
+                           "reuse it while the CSV is unchanged.")
+  parser.add_argument("--networkDataFormat",
+                      default="csv",
+                      choices=["csv", "npz"],
+                      help="File format of the generated network data, for "
+                           "the HTMNetwork model.")
   parser.add_argument("--loadPath",
                       help="Path from which to load the serialized model.",
                       type=str,
@@ -160,6 +170,10 @@ if __name__ == "__main__":
                       default=42,
                       type=int,
                       help="Random seed, used in partitioning the data.")
+  parser.add_argument("--workers",
+                      default=1,
+                      type=int,
+                      help="Number of processes to run the trials in parallel.")
   parser.add_argument("--writeEncodings",
                       default=False,
                       action="store_true",
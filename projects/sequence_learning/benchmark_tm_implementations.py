@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Compares the temporal memory implementations of temporal_memory_factory on
+the synthetic workloads of htmresearch.support.temporal_memory_benchmark, and
+shows which one createModel("auto", ...) would pick for these parameters.
+With --profile, the choice is also saved for createModel("auto", ...), which
+doesn't run the benchmarks itself.
+"""
+
+import argparse
+
+from htmresearch.support import temporal_memory_benchmark
+
+
+
+def run(args):
+  params = {"columnDimensions": (args.columns,),
+            "cellsPerColumn": args.cellsPerColumn,
+            "activationThreshold": args.activationThreshold,
+            "minThreshold": args.minThreshold,
+            "maxNewSynapseCount": args.maxNewSynapseCount,
+            "seed": args.seed}
+
+  results = temporal_memory_benchmark.runBenchmark(
+    params, modelNames=args.models, numSteps=args.steps,
+    sparsity=args.sparsity, seed=args.seed)
+
+  print "{:>10} {:>10} {:>12} {:>12} {:>8}".format(
+    "model", "workload", "steps/sec", "memory MB", "parity")
+  for modelName, workloadResults in results.iteritems():
+    for workload, result in workloadResults.iteritems():
+      if "error" in result:
+        print "{:>10} {:>10} {}".format(modelName, workload, result["error"])
+      else:
+        # No parity if the reference failed
+        parity = result["parity"]
+        print "{:>10} {:>10} {:>12.1f} {:>12.2f} {:>8}".format(
+          modelName, workload, result["stepsPerSecond"],
+          result["memoryBytes"] / 2.0**20,
+          "n/a" if parity is None else "{:.3f}".format(parity))
+
+  print
+  print "Fastest conforming implementation:", (
+    temporal_memory_benchmark.fastestModel(results, args.minParity))
+
+  if args.profile:
+    # createModel("auto") looks up choices made with the default benchmark
+    # arguments
+    print 'createModel("auto") will use:', (
+      temporal_memory_benchmark.selectModel(params, benchmarkIfMissing=True))
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--columns",
+                      default=2048,
+                      type=int,
+                      help="Number of columns.")
+  parser.add_argument("--cellsPerColumn",
+                      default=32,
+                      type=int,
+                      help="Number of cells per column.")
+  parser.add_argument("--activationThreshold",
+                      default=13,
+                      type=int)
+  parser.add_argument("--minThreshold",
+                      default=10,
+                      type=int)
+  parser.add_argument("--maxNewSynapseCount",
+                      default=20,
+                      type=int)
+  parser.add_argument("--sparsity",
+                      default=0.02,
+                      type=float,
+                      help="Fraction of the columns active per input.")
+  parser.add_argument("--steps",
+                      default=500,
+                      type=int,
+                      help="Number of steps per workload.")
+  parser.add_argument("--models",
+                      nargs="+",
+                      default=None,
+                      help="Implementations to run, all of them by default.")
+  parser.add_argument("--minParity",
+                      default=1.0,
+                      type=float,
+                      help="Lowest learning parity with the reference "
+                           "implementation to be conforming.")
+  parser.add_argument("--seed",
+                      default=42,
+                      type=int)
+  parser.add_argument("--profile",
+                      default=False,
+                      action="store_true",
+                      help="Also benchmark these parameters with the default "
+                           "benchmark arguments, if they aren't profiled yet, "
+                           'and save the choice for createModel("auto").')
+
+  run(parser.parse_args())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Measures the cost of collectStats in the Python TM (htmresearch.algorithms.TM)
+on noisy repeating sequences. The time spent updating the stats is reported as
+a percentage of the rest of the time spent in compute(), and should stay under
+--budget.
+"""
+
+import argparse
+import time
+
+import numpy
+
+from htmresearch.algorithms.TM import TM
+
+
+
+class TimedStatsTM(TM):
+  """TM that adds up the time spent in its stats update."""
+
+  def __init__(self, *args, **kwargs):
+    TM.__init__(self, *args, **kwargs)
+    self.statsSeconds = 0.0
+
+
+  def _updateStatsInferEnd(self, *args):
+    start = time.time()
+    TM._updateStatsInferEnd(self, *args)
+    self.statsSeconds += time.time() - start
+
+
+
+def timeStats(args, collectSequenceStats, seed=42):
+  """
+  @return (tuple) Seconds spent in compute() and, of those, in the stats
+                  update.
+  """
+  tm = TimedStatsTM(numberOfCols=args.columns,
+                    cellsPerColumn=args.cellsPerColumn,
+                    activationThreshold=13,
+                    minThreshold=10,
+                    newSynapseCount=20,
+                    initialPerm=0.21,
+                    connectedPerm=0.5,
+                    globalDecay=0.0,
+                    collectStats=True,
+                    seed=seed)
+  tm.collectSequenceStats = collectSequenceStats
+  tm.resetStats()
+
+  rng = numpy.random.RandomState(seed)
+  sequences = [[rng.choice(args.columns, args.activeColumns, replace=False)
+                for _ in xrange(args.sequenceLength)]
+               for _ in xrange(args.sequences)]
+
+  computeSeconds = 0.0
+  for repetition in xrange(args.repetitions):
+    for sequence in sequences:
+      for columns in sequence:
+        bottomUpInput = numpy.zeros(args.columns, dtype="float32")
+        bottomUpInput[columns] = 1
+        bottomUpInput[rng.randint(args.columns, size=args.noise)] = 1
+
+        start = time.time()
+        tm.compute(bottomUpInput, enableLearn=repetition < args.repetitions - 1)
+        computeSeconds += time.time() - start
+      tm.reset()
+
+  return computeSeconds, tm.statsSeconds
+
+
+
+def run(args):
+  print "{:>16} {:>16} {:>16} {:>10} {:>12}".format(
+    "sequence stats", "compute seconds", "stats seconds", "overhead", "")
+
+  for collectSequenceStats in (False, True):
+    computeSeconds, statsSeconds = timeStats(args, collectSequenceStats)
+    overhead = 100.0 * statsSeconds / (computeSeconds - statsSeconds)
+    print "{:>16} {:>16.3f} {:>16.4f} {:>9.2f}% {:>12}".format(
+      str(collectSequenceStats), computeSeconds, statsSeconds, overhead,
+      "ok" if overhead < args.budget else "over budget")
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--columns",
+                      default=2048,
+                      type=int,
+                      help="Number of columns.")
+  parser.add_argument("--cellsPerColumn",
+                      default=32,
+                      type=int,
+                      help="Number of cells per column.")
+  parser.add_argument("--activeColumns",
+                      default=40,
+                      type=int,
+                      help="Number of active columns per input.")
+  parser.add_argument("--noise",
+                      default=4,
+                      type=int,
+                      help="Number of random extra columns per input.")
+  parser.add_argument("--sequences",
+                      default=4,
+                      type=int,
+                      help="Number of distinct sequences.")
+  parser.add_argument("--sequenceLength",
+                      default=5,
+                      type=int,
+                      help="Number of inputs per sequence.")
+  parser.add_argument("--repetitions",
+                      default=8,
+                      type=int,
+                      help="Number of passes over the sequences. Learning is "
+                           "off for the last one.")
+  parser.add_argument("--budget",
+                      default=5.0,
+                      type=float,
+                      help="Maximal stats overhead, in percent of compute.")
+
+  run(parser.parse_args())
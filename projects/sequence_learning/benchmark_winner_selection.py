@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Times the Temporal Memory on novel (never repeating) random inputs, where every
+active column bursts and a winner cell and learning candidates are chosen for
+each of them. The time per bursting column should stay roughly constant as the
+number of active columns and the number of steps grow.
+"""
+
+import argparse
+import time
+
+import numpy
+
+from htmresearch.algorithms.temporal_memory_phases import TemporalMemory
+
+
+
+def timeNovelInputs(numColumns, numActiveColumns, cellsPerColumn, numSteps,
+                    seed=42):
+  """
+  @return (float) Seconds spent in compute() over numSteps random inputs.
+  """
+  tm = TemporalMemory(columnDimensions=(numColumns,),
+                      cellsPerColumn=cellsPerColumn,
+                      seed=seed)
+  rng = numpy.random.RandomState(seed)
+  inputs = [
+    set(rng.choice(numColumns, numActiveColumns, replace=False).tolist())
+    for _ in xrange(numSteps)]
+
+  start = time.time()
+  for activeColumns in inputs:
+    tm.compute(activeColumns, learn=True)
+  return time.time() - start
+
+
+
+def run(args):
+  print "{:>14} {:>10} {:>16} {:>18}".format(
+    "active columns", "steps", "seconds", "us/burst column")
+
+  for numActiveColumns in args.activeColumns:
+    for numSteps in args.steps:
+      seconds = timeNovelInputs(args.columns, numActiveColumns,
+                                args.cellsPerColumn, numSteps)
+      print "{:>14} {:>10} {:>16.3f} {:>18.2f}".format(
+        numActiveColumns, numSteps, seconds,
+        1e6 * seconds / (numActiveColumns * numSteps))
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--columns",
+                      default=2048,
+                      type=int,
+                      help="Number of columns.")
+  parser.add_argument("--cellsPerColumn",
+                      default=32,
+                      type=int,
+                      help="Number of cells per column.")
+  parser.add_argument("--activeColumns",
+                      default=[10, 40, 160],
+                      type=int,
+                      nargs="+",
+                      help="Numbers of active columns per input to benchmark.")
+  parser.add_argument("--steps",
+                      default=[100, 400],
+                      type=int,
+                      nargs="+",
+                      help="Numbers of inputs to benchmark.")
+
+  run(parser.parse_args())
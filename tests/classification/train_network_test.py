@@ -0,0 +1,125 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the partition scheduling in trainNetwork."""
+
+import unittest
+
+import numpy
+
+from htmresearch.frameworks.classification.classification_network import (
+  _getPartitionSchedule, trainNetwork, TEST_PARTITION_NAME)
+
+
+
+class FakeRegion(object):
+
+  def __init__(self, network, name, regionType, outputName, width):
+    self.network = network
+    self.name = name
+    self.type = regionType
+    self.outputName = outputName
+    self.output = numpy.zeros(width, dtype="float32")
+
+
+  def setParameter(self, name, value):
+    self.network.events.append((self.network.recordNumber, self.name, name,
+                                value))
+
+
+  def getOutputData(self, name):
+    assert name == self.outputName
+    return self.output
+
+
+
+class FakeNetwork(object):
+  """Sensor outputs category r % 3; the classifier gets every 4th one wrong."""
+
+  def __init__(self):
+    self.recordNumber = 0
+    self.runs = []
+    self.events = []
+    self.regions = {
+      "sensor": FakeRegion(self, "sensor", "py.RecordSensor", "categoryOut",
+                           1),
+      "SP": FakeRegion(self, "SP", "py.SPRegion", None, 0),
+      "TM": FakeRegion(self, "TM", "py.TMRegion", None, 0),
+      "classifier": FakeRegion(self, "classifier", "py.CLAClassifierRegion",
+                               "categoriesOut", 3),
+    }
+
+
+  def run(self, n):
+    self.runs.append(n)
+    for _ in xrange(n):
+      category = self.recordNumber % 3
+      self.regions["sensor"].output[0] = category
+      self.regions["classifier"].output[0] = (
+        category if self.recordNumber % 4 else category + 1)
+      self.recordNumber += 1
+
+
+
+class TrainNetworkTest(unittest.TestCase):
+
+  def setUp(self):
+    self.networkConfig = {"sensorRegionConfig": {"regionName": "sensor"},
+                          "classifierRegionConfig": {"regionName": "classifier"}}
+
+
+  def testPartitionSchedule(self):
+    self.assertEqual(
+      _getPartitionSchedule([("SP", 0), ("TM", 20), (TEST_PARTITION_NAME, 80)],
+                            100),
+      [(0, "SP"), (20, "TM"), (80, TEST_PARTITION_NAME)])
+
+    # A partition that doesn't come after the previous one blocks the rest
+    self.assertEqual(
+      _getPartitionSchedule([("SP", 10), ("TM", 10), (TEST_PARTITION_NAME, 80)],
+                            100),
+      [(10, "SP")])
+    self.assertEqual(
+      _getPartitionSchedule([("SP", 0), (TEST_PARTITION_NAME, 100)], 100),
+      [(0, "SP")])
+
+
+  def testRunsBetweenBoundaries(self):
+    network = FakeNetwork()
+    accuracy = trainNetwork(network, self.networkConfig,
+                            [("SP", 0), ("TM", 20), (TEST_PARTITION_NAME, 80)],
+                            100)
+
+    self.assertEqual(network.runs, [1, 20, 59] + [1] * 20)
+    self.assertEqual(network.events,
+                     [(1, "SP", "learningMode", True),
+                      (21, "TM", "learningMode", True),
+                      (81, "SP", "learningMode", False),
+                      (81, "TM", "learningMode", False),
+                      (81, "classifier", "inferenceMode", True)])
+
+    # Records 80, 84, ..., 96 are misclassified
+    self.assertEqual(accuracy, 75.0)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
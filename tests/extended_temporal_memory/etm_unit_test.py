@@ -23,17 +23,32 @@
 Unit tests for Extended Temporal Memory.
 """
 
+import random
 import tempfile
 import unittest
 
 from nupic.data.generators.pattern_machine import PatternMachine
 from nupic.data.generators.sequence_machine import SequenceMachine
+from nupic.bindings.math import Random
 from htmresearch.algorithms.extended_temporal_memory import ExtendedTemporalMemory
 
 # No serialization for now, skip corresponding tests
 capnp = None
 
 
+class ScriptedRandom(object):
+  """Returns the given draws in order and records the bounds asked for."""
+
+  def __init__(self, values, bounds):
+    self.values = list(values)
+    self.bounds = bounds
+
+
+  def getUInt32(self, n):
+    self.bounds.append(n)
+    return self.values.pop(0)
+
+
 class ExtendedTemporalMemoryTest(unittest.TestCase):
 
   def setUp(self):
@@ -545,8 +560,23 @@ class ExtendedTemporalMemoryTest(unittest.TestCase):
 
     winnerCells = set([4, 47, 58, 93])
 
+    # Candidates are sorted, [4, 47, 58, 93]. The first draw swaps 47 with the
+    # last candidate and picks it, the second swaps 4 with 58 and picks it.
+    draws = []
+    realRandom = tm._random
+    tm._random = ScriptedRandom([1, 0], draws)
     self.assertEqual(tm.pickCellsToLearnOn(2, 0, winnerCells, connections),
-                     set([4, 93]))  # randomly picked
+                     set([4, 47]))
+    self.assertEqual(draws, [4, 3])
+
+    # Seed 42 picks the cells of its first two draws
+    seedRandom = Random(42)
+    expectedDraws = [seedRandom.getUInt32(4), seedRandom.getUInt32(3)]
+    tm._random = ScriptedRandom(expectedDraws, [])
+    expected = tm.pickCellsToLearnOn(2, 0, winnerCells, connections)
+    tm._random = realRandom
+    self.assertEqual(tm.pickCellsToLearnOn(2, 0, winnerCells, connections),
+                     expected)
 
     self.assertEqual(tm.pickCellsToLearnOn(100, 0, winnerCells, connections),
                      set([4, 47, 58, 93]))
@@ -569,6 +599,48 @@ class ExtendedTemporalMemoryTest(unittest.TestCase):
                      set())
 
 
+  def testPickCellsToLearnOnIsDeterministic(self):
+    # Multiples of 512 collide in a set's hash table, so the order a set of
+    # them iterates in depends on the order they were added in
+    winnerCells = set(range(512, 512 * 59, 512))
+
+    def pickAll(seed, cells):
+      tm = ExtendedTemporalMemory(seed=seed)
+      connections = tm.connections
+      connections.createSegment(0)
+      connections.createSynapse(0, 512, 0.6)
+      return [tm.pickCellsToLearnOn(n, 0, cells, connections)
+              for n in (0, 1, 5, 20, 100)]
+
+    picks = pickAll(42, winnerCells)
+    self.assertEqual([len(cells) for cells in picks], [0, 1, 5, 20, 57])
+    for cells in picks:
+      self.assertTrue(cells <= winnerCells - set([512]))
+
+    # Same picks for the same seed, whatever the order of the winner cells
+    shuffled = sorted(winnerCells)
+    random.Random(1).shuffle(shuffled)
+    self.assertEqual(pickAll(42, shuffled), picks)
+    self.assertEqual(pickAll(42, sorted(winnerCells, reverse=True)), picks)
+    self.assertNotEqual(pickAll(43, winnerCells), picks)
+
+
+  def testSegmentCounts(self):
+    tm = ExtendedTemporalMemory(columnDimensions=[4], cellsPerColumn=4)
+
+    connections = tm.connections
+    for cell in (1, 1, 2, 5):
+      connections.createSegment(cell)
+
+    self.assertEqual(connections.segmentCounts.tolist(),
+                     [0, 2, 1, 0, 0, 1] + [0] * 10)
+
+    # The two unused cells of column 0 are picked between
+    picked = set(tm.leastUsedCell(tm.cellsForColumn(0), connections)
+                 for _ in xrange(100))
+    self.assertEqual(picked, set([0, 3]))
+
+
   def testColumnForCell1D(self):
     tm = ExtendedTemporalMemory(
       columnDimensions=[2048],
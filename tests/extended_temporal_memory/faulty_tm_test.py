@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Tests for the fault masks of FaultyTemporalMemory."""
+
+import copy
+import random
+import unittest
+
+import numpy
+
+from htmresearch.algorithms.faulty_temporal_memory import FaultyTemporalMemory
+
+
+
+class FaultyTemporalMemoryTest(unittest.TestCase):
+
+  def setUp(self):
+    numpy.random.seed(42)
+    self.tm = FaultyTemporalMemory(columnDimensions=(100,),
+                                   cellsPerColumn=4,
+                                   activationThreshold=4,
+                                   minThreshold=3,
+                                   maxNewSynapseCount=6,
+                                   initialPermanence=0.51,
+                                   seed=42)
+    rng = random.Random(42)
+    self.sequence = [set(rng.sample(xrange(100), 8)) for _ in xrange(10)]
+    for _ in xrange(5):
+      self.feed(learn=True)
+
+
+  def feed(self, learn=False):
+    """@return (list) Number of predicted active cells at each step."""
+    self.tm.reset()
+    numPredicted = []
+    for columns in self.sequence:
+      predictiveCells = self.tm.predictiveCells
+      self.tm.compute(columns, learn=learn)
+      numPredicted.append(len(predictiveCells & self.tm.activeCells))
+    return numPredicted
+
+
+  def testKillColumns(self):
+    self.tm.killColumns(0.2)
+    deadColumns = set(numpy.flatnonzero(self.tm.deadColumnMask).tolist())
+    self.assertEqual(len(deadColumns), 20)
+    self.assertEqual(self.tm.deadCells,
+                     set(cell for column in deadColumns
+                         for cell in self.tm.cellsForColumn(column)))
+
+    self.feed()
+    self.assertFalse(self.tm.activeCells & self.tm.deadCells)
+    self.assertFalse(self.tm.predictiveCells & self.tm.deadCells)
+
+    # Higher levels kill more columns, keeping the dead ones
+    self.tm.killColumns(0.5)
+    self.assertTrue(deadColumns <= set(
+      numpy.flatnonzero(self.tm.deadColumnMask).tolist()))
+    self.assertEqual(self.tm.deadColumnMask.sum(), 50)
+
+
+  def testKillSegments(self):
+    self.assertGreater(sum(self.feed()), 0)
+    numSegments = len(self.tm._allSegments())
+
+    self.tm.killSegments(1.0)
+    self.assertEqual(len(self.tm.deadSegments), numSegments)
+    self.assertEqual(sum(self.feed()), 0)
+
+    self.tm.killSegments(0.0)
+    self.assertEqual(self.tm.deadSegments, set())
+    self.assertGreater(sum(self.feed()), 0)
+
+
+  def testKillSynapses(self):
+    self.tm.killSynapses(1.0)
+    self.assertEqual(sum(self.feed()), 0)
+
+    self.tm.killSynapses(0.5)
+    self.assertEqual(
+      len(self.tm.deadSynapses),
+      int(round(0.5 * sum(len(self.tm.connections.synapsesForSegment(s))
+                          for s in self.tm._allSegments()))))
+
+
+  def testKillCellsKeepsSegments(self):
+    numSegments = len(self.tm._allSegments())
+    expected = self.feed()
+
+    self.tm.killCells(0.5, keepSegments=True)
+    self.assertEqual(len(self.tm.deadCells), 200)
+    self.assertEqual(len(self.tm._allSegments()), numSegments)
+
+    self.tm.killCells(0.0, keepSegments=True)
+    self.assertEqual(self.feed(), expected)
+
+
+  def testKillCellsDestroysSegments(self):
+    keeping = copy.deepcopy(self.tm)
+    destroying = self.tm
+
+    numpy.random.seed(1)
+    keeping.killCells(0.3, keepSegments=True)
+    numpy.random.seed(1)
+    destroying.killCells(0.3)
+    deadCells = destroying.deadCells
+    self.assertEqual(keeping.deadCells, deadCells)
+    self.assertTrue(any(keeping.connections.segmentsForCell(cell)
+                        for cell in deadCells))
+    self.assertFalse(any(destroying.connections.segmentsForCell(cell)
+                         for cell in deadCells))
+
+    # Same predictions while the cells are dead, learning included
+    for learn in (True, True, False):
+      for tm in (keeping, destroying):
+        tm.reset()
+      for columns in self.sequence:
+        for tm in (keeping, destroying):
+          tm.compute(columns, learn=learn)
+        self.assertEqual(keeping.activeCells, destroying.activeCells)
+        self.assertEqual(keeping.winnerCells, destroying.winnerCells)
+        self.assertEqual(keeping.predictiveCells, destroying.predictiveCells)
+
+    # Revived cells only get their segments back with keepSegments
+    keeping.killCells(0.1, keepSegments=True)
+    destroying.killCells(0.1)
+    revived = deadCells - destroying.deadCells
+    self.assertEqual(len(revived), 80)
+    self.assertTrue(any(keeping.connections.segmentsForCell(cell)
+                        for cell in revived))
+    self.assertFalse(any(destroying.connections.segmentsForCell(cell)
+                         for cell in revived))
+
+
+  def testSweepFaults(self):
+    self.tm.killSegments(0.1)
+    deadSegments = self.tm.deadSegments
+
+    results = self.tm.sweepFaults([0.0, 0.3, 1.0], lambda tm: sum(self.feed()),
+                                  faultType="columns")
+    self.assertEqual(results[-1], 0)
+    self.assertGreaterEqual(results[0], results[1])
+
+    # The faults from before the sweep are back
+    self.assertEqual(self.tm.deadSegments, deadSegments)
+    self.assertFalse(self.tm.deadColumnMask.any())
+
+    # Copies can learn without changing the base TM
+    numSegments = len(self.tm._allSegments())
+    self.tm.sweepFaults([0.5], lambda tm: tm.compute(self.sequence[0]),
+                        faultType="cells", copyModel=True)
+    self.assertEqual(len(self.tm._allSegments()), numSegments)
+
+    self.assertRaises(ValueError, self.tm.sweepFaults, [0.1], len, "dendrites")
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Tests for the temporal memory benchmarks and createModel("auto")."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from htmresearch.algorithms import temporal_memory_factory
+from htmresearch.support import temporal_memory_benchmark as benchmark
+
+
+
+PARAMS = {
+  "columnDimensions": (128,),
+  "cellsPerColumn": 4,
+  "activationThreshold": 3,
+  "minThreshold": 2,
+  "maxNewSynapseCount": 5,
+  "initialPermanence": 0.51,
+  "seed": 42,
+}
+
+
+
+class TemporalMemoryBenchmarkTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpDir = tempfile.mkdtemp()
+    self.profilePath = os.path.join(self.tmpDir, "profile.json")
+
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpDir)
+
+
+  def testWorkloads(self):
+    for name, workload in benchmark.WORKLOADS.iteritems():
+      steps = workload(128, 5, 100, numpy.random.RandomState(42))
+      self.assertEqual(len(steps), 100, name)
+      self.assertIn(None, steps, name)
+      for activeColumns in steps:
+        if activeColumns is not None:
+          self.assertEqual(len(set(activeColumns)), 5, name)
+          self.assertEqual(activeColumns, sorted(activeColumns), name)
+          self.assertLess(activeColumns[-1], 128, name)
+
+    # Same sequences, with one column in ten replaced
+    clean = benchmark.randomSequences(128, 10, 50,
+                                      numpy.random.RandomState(42))
+    noisy = benchmark.noisyInputs(128, 10, 50, numpy.random.RandomState(42))
+    for cleanColumns, noisyColumns in zip(clean, noisy):
+      if cleanColumns is None:
+        self.assertIsNone(noisyColumns)
+      else:
+        self.assertEqual(len(set(cleanColumns) & set(noisyColumns)), 9)
+
+
+  def testRunBenchmark(self):
+    results = benchmark.runBenchmark(PARAMS, modelNames=["extended", "tm"],
+                                     numSteps=60, sparsity=0.04)
+    self.assertEqual(results.keys(), ["extended", "tm"])
+    for workload in benchmark.WORKLOADS:
+      self.assertEqual(results["tm"][workload]["parity"], 1.0)
+      self.assertGreater(results["extended"][workload]["stepsPerSecond"], 0)
+      self.assertGreaterEqual(results["extended"][workload]["memoryBytes"], 0)
+
+    results = benchmark.runBenchmark(dict(PARAMS, cellsPerColumn=0),
+                                     modelNames=["tm"], workloads=["random"],
+                                     numSteps=10)
+    self.assertIn("ValueError", results["tm"]["random"]["error"])
+
+    # The reference runs for the parity of the others, even if not asked for
+    results = benchmark.runBenchmark(PARAMS, modelNames=["extended"],
+                                     workloads=["random"], numSteps=30)
+    self.assertEqual(results.keys(), ["extended"])
+    self.assertIsNotNone(results["extended"]["random"]["parity"])
+
+
+  def testRunBenchmarkWithoutReference(self):
+    benchmarkModel = benchmark.benchmarkModel
+
+    def failingReference(modelName, params, steps):
+      if modelName == benchmark.REFERENCE_MODEL:
+        return {"error": "RuntimeError: no reference"}
+      return benchmarkModel(modelName, params, steps)
+
+    benchmark.benchmarkModel = failingReference
+    try:
+      results = benchmark.runBenchmark(PARAMS, modelNames=["extended", "tm"],
+                                       workloads=["random"], numSteps=30)
+    finally:
+      benchmark.benchmarkModel = benchmarkModel
+
+    self.assertIn("error", results["tm"]["random"])
+    self.assertGreater(results["extended"]["random"]["stepsPerSecond"], 0)
+    self.assertIsNone(results["extended"]["random"]["parity"])
+    self.assertIsNone(benchmark.fastestModel(results, minParity=0.0))
+
+
+  def testFastestModel(self):
+    results = {
+      "slow": {"a": {"stepsPerSecond": 10.0, "parity": 1.0},
+               "b": {"stepsPerSecond": 10.0, "parity": 1.0}},
+      "uneven": {"a": {"stepsPerSecond": 1000.0, "parity": 1.0},
+                 "b": {"stepsPerSecond": 5.0, "parity": 1.0}},
+      "wrong": {"a": {"stepsPerSecond": 100.0, "parity": 1.0},
+                "b": {"stepsPerSecond": 100.0, "parity": 0.5}},
+      "broken": {"a": {"error": "RuntimeError: "}},
+      "unknown": {"a": {"stepsPerSecond": 1000.0, "parity": None}},
+    }
+    self.assertEqual(benchmark.fastestModel(results), "slow")
+    self.assertEqual(benchmark.fastestModel(results, minParity=0.5), "wrong")
+    self.assertIsNone(benchmark.fastestModel({"broken": results["broken"]}))
+    self.assertIsNone(benchmark.fastestModel({"unknown": results["unknown"]},
+                                             minParity=0.0))
+
+
+  def testProfileKey(self):
+    key = benchmark._profileKey(PARAMS, 1.0, {"numSteps": 30})
+    self.assertEqual(key, benchmark._profileKey(dict(PARAMS), 1.0,
+                                                {"numSteps": 30}))
+    self.assertEqual(key, benchmark._profileKey(dict(PARAMS, seed=1), 1.0,
+                                                {"numSteps": 30}))
+    self.assertNotEqual(key, benchmark._profileKey(
+      dict(PARAMS, cellsPerColumn=8), 1.0, {"numSteps": 30}))
+    self.assertNotEqual(key, benchmark._profileKey(PARAMS, 0.9,
+                                                   {"numSteps": 30}))
+    self.assertNotEqual(key, benchmark._profileKey(PARAMS, 1.0,
+                                                   {"numSteps": 60}))
+
+    nupicVersion = benchmark._nupicVersion
+    benchmark._nupicVersion = lambda: "0.0.0"
+    try:
+      self.assertNotEqual(key, benchmark._profileKey(PARAMS, 1.0,
+                                                     {"numSteps": 30}))
+    finally:
+      benchmark._nupicVersion = nupicVersion
+
+
+  def testSelectModelIsCached(self):
+    selected = benchmark.selectModel(PARAMS, profilePath=self.profilePath,
+                                     benchmarkIfMissing=True, numSteps=30)
+    modelNames = temporal_memory_factory.TemporalMemoryTypes.getTypes()
+    self.assertIn(selected, list(modelNames))
+    profiles = benchmark.loadProfiles(self.profilePath)
+    self.assertEqual(len(profiles), 1)
+
+    # Later calls with the same arguments read the choice from the profile
+    profile = profiles.values()[0]
+    profile["selected"] = "tmMixin"
+    benchmark.saveProfiles(self.profilePath, profiles)
+    self.assertEqual(benchmark.selectModel(PARAMS,
+                                           profilePath=self.profilePath,
+                                           benchmarkIfMissing=True,
+                                           numSteps=30),
+                     "tmMixin")
+    self.assertEqual(benchmark.selectModel(dict(PARAMS, seed=7),
+                                           profilePath=self.profilePath,
+                                           numSteps=30),
+                     "tmMixin")
+
+    # but other benchmark arguments or parity requirements are profiled anew
+    benchmark.selectModel(PARAMS, profilePath=self.profilePath,
+                          benchmarkIfMissing=True, numSteps=20)
+    benchmark.selectModel(PARAMS, profilePath=self.profilePath,
+                          benchmarkIfMissing=True, numSteps=20, minParity=0.5)
+    self.assertEqual(len(benchmark.loadProfiles(self.profilePath)), 3)
+
+    # createModel("auto") profiles with the default benchmark arguments
+    profiles = benchmark.loadProfiles(self.profilePath)
+    profiles[benchmark._profileKey(PARAMS, 1.0, {})] = profile
+    benchmark.saveProfiles(self.profilePath, profiles)
+
+    defaultPath = benchmark.DEFAULT_PROFILE_PATH
+    benchmark.DEFAULT_PROFILE_PATH = self.profilePath
+    try:
+      tm = temporal_memory_factory.createModel("auto", **PARAMS)
+    finally:
+      benchmark.DEFAULT_PROFILE_PATH = defaultPath
+    self.assertIsInstance(tm, temporal_memory_factory.MonitoredTemporalMemory)
+
+
+  def testSelectModelWithoutProfile(self):
+    runBenchmark = benchmark.runBenchmark
+    def failingRunBenchmark(*args, **kwargs):
+      raise AssertionError("Benchmarks run without benchmarkIfMissing")
+
+    benchmark.runBenchmark = failingRunBenchmark
+    try:
+      self.assertEqual(benchmark.selectModel(PARAMS,
+                                             profilePath=self.profilePath),
+                       benchmark.REFERENCE_MODEL)
+
+      defaultPath = benchmark.DEFAULT_PROFILE_PATH
+      benchmark.DEFAULT_PROFILE_PATH = self.profilePath
+      try:
+        tm = temporal_memory_factory.createModel("auto", **PARAMS)
+      finally:
+        benchmark.DEFAULT_PROFILE_PATH = defaultPath
+    finally:
+      benchmark.runBenchmark = runBenchmark
+
+    referenceType = getattr(temporal_memory_factory.TemporalMemoryTypes,
+                            benchmark.REFERENCE_MODEL)
+    self.assertIsInstance(tm, referenceType)
+    self.assertFalse(os.path.exists(self.profilePath))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Tests for the flat binary temporal memory checkpoints."""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from htmresearch.algorithms.extended_temporal_memory import (
+  ExtendedTemporalMemory)
+from htmresearch.algorithms.faulty_temporal_memory import FaultyTemporalMemory
+from htmresearch.algorithms.temporal_memory_phases import TemporalMemory
+
+
+
+def connectionsState(connections):
+  """Segments of every cell as sorted (presynaptic cell, permanence) lists."""
+  state = []
+  for cell in xrange(connections.numCells):
+    segments = []
+    for segment in sorted(connections.segmentsForCell(cell)):
+      synapses = [connections.dataForSynapse(synapse)
+                  for synapse in connections.synapsesForSegment(segment)]
+      segments.append(sorted((s.presynapticCell, s.permanence)
+                             for s in synapses))
+    state.append(segments)
+  return state
+
+
+
+class TemporalMemoryCheckpointTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpDir = tempfile.mkdtemp()
+    self.path = os.path.join(self.tmpDir, "tm.npz")
+
+    rng = random.Random(42)
+    self.sequences = [[set(rng.sample(xrange(100), 8)) for _ in xrange(5)]
+                      for _ in xrange(3)]
+
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpDir)
+
+
+  def _feed(self, tm, numRepeats):
+    history = []
+    for _ in xrange(numRepeats):
+      for sequence in self.sequences:
+        for activeColumns in sequence:
+          tm.compute(activeColumns)
+          history.append((set(tm.activeCells), set(tm.predictiveCells),
+                          set(tm.winnerCells)))
+        tm.reset()
+      # Stop halfway through a sequence so there is state to restore
+      tm.compute(self.sequences[0][0])
+    return history
+
+
+  def _checkRoundTrip(self, tm):
+    self._feed(tm, 3)
+    tm.writeCheckpoint(self.path)
+    restored = type(tm).readCheckpoint(self.path)
+
+    self.assertIs(type(restored), type(tm))
+    for connectionsName in set(type(tm).segmentAttributes.values()):
+      self.assertEqual(connectionsState(getattr(restored, connectionsName)),
+                       connectionsState(getattr(tm, connectionsName)))
+    self.assertEqual(restored.activeCells, tm.activeCells)
+    self.assertEqual(restored.winnerCells, tm.winnerCells)
+    self.assertEqual(restored.predictiveCells, tm.predictiveCells)
+    self.assertEqual(len(restored.activeSegments), len(tm.activeSegments))
+
+    # Both continue identically, including the random draws
+    self.assertEqual(self._feed(restored, 2), self._feed(tm, 2))
+    return restored
+
+
+  def testTemporalMemory(self):
+    self._checkRoundTrip(TemporalMemory(columnDimensions=(100,),
+                                        cellsPerColumn=4,
+                                        activationThreshold=3,
+                                        minThreshold=2,
+                                        predictedSegmentDecrement=0.01))
+
+
+  def testExtendedTemporalMemory(self):
+    restored = self._checkRoundTrip(
+      ExtendedTemporalMemory(columnDimensions=(100,),
+                             cellsPerColumn=4,
+                             activationThreshold=3,
+                             minThreshold=2,
+                             learnOnOneCell=True))
+    self.assertTrue(restored.learnOnOneCell)
+
+
+  def testFaultyTemporalMemory(self):
+    tm = FaultyTemporalMemory(columnDimensions=(100,),
+                              cellsPerColumn=4,
+                              activationThreshold=3,
+                              minThreshold=2)
+    tm.killCells(0.1)
+    restored = self._checkRoundTrip(tm)
+    self.assertEqual(restored.deadCells, tm.deadCells)
+    self.assertEqual(restored.zombiePermutation.tolist(),
+                     tm.zombiePermutation.tolist())
+
+
+  def testFaultyTemporalMemoryDeadSegmentsAndSynapses(self):
+    tm = FaultyTemporalMemory(columnDimensions=(100,),
+                              cellsPerColumn=4,
+                              activationThreshold=3,
+                              minThreshold=2)
+    self._feed(tm, 2)
+    tm.killSegments(0.3)
+    tm.killSynapses(0.3)
+    restored = self._checkRoundTrip(tm)
+
+    def deadState(tm):
+      # Learning after the faults were set may have destroyed some of them
+      connections = tm.connections
+      liveSegments = set(tm._allSegments().tolist())
+      liveSynapses = set(synapse for segment in liveSegments
+                         for synapse in connections.synapsesForSegment(segment))
+      segments = sorted(connections.cellForSegment(segment)
+                        for segment in tm.deadSegments & liveSegments)
+      synapses = sorted((connections.dataForSynapse(synapse).presynapticCell,
+                         connections.dataForSynapse(synapse).permanence)
+                        for synapse in tm.deadSynapses & liveSynapses)
+      return segments, synapses
+
+    self.assertGreater(len(tm.deadSegments), 0)
+    self.assertEqual(deadState(restored), deadState(tm))
+
+
+  def testWrongClass(self):
+    TemporalMemory(columnDimensions=(10,)).writeCheckpoint(self.path)
+    self.assertRaises(TypeError, FaultyTemporalMemory.readCheckpoint,
+                      self.path)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
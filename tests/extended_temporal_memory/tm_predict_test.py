@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Tests for the multistep predictions of TM."""
+
+import unittest
+
+import numpy
+
+from htmresearch.algorithms.TM import TM
+
+
+
+NUM_COLUMNS = 64
+CELLS_PER_COLUMN = 4
+STATE_NAMES = ["activeState", "predictedState", "confidence", "learnState"]
+
+
+
+def deepCopyPredict(tm, nSteps):
+  """predict() as it was when the whole dynamic state was deep copied."""
+  multiStepColumnPredictions = numpy.zeros((nSteps, tm.numberOfCols),
+                                           dtype="float32")
+  pristineTPDynamicState = tm._getTPDynamicState()
+
+  step = 0
+  while True:
+    multiStepColumnPredictions[step,:] = tm.topDownCompute()
+    if step == nSteps-1:
+      break
+    step += 1
+    tm.activeState['t-1'][:,:] = tm.activeState['t'][:,:]
+    tm.predictedState['t-1'][:,:] = tm.predictedState['t'][:,:]
+    tm.confidence['t-1'][:,:] = tm.confidence['t'][:,:]
+    tm.activeState['t'][:,:] = tm.predictedState['t-1'][:,:]
+    tm.predictedState['t'].fill(0)
+    tm.confidence['t'].fill(0.0)
+    tm.computePhase2(doLearn=False)
+
+  tm._setTPDynamicState(pristineTPDynamicState)
+  return multiStepColumnPredictions
+
+
+def getStateArrays(tm):
+  """The state dicts of a TM and the arrays in them, by name."""
+  return dict((name, (tm.__dict__[name], dict(tm.__dict__[name])))
+              for name in STATE_NAMES)
+
+
+def copyState(tm):
+  return dict((name, dict((key, value.copy()) for key, value
+                          in tm.__dict__[name].iteritems()))
+              for name in STATE_NAMES)
+
+
+
+class TMPredictTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tm = TM(numberOfCols=NUM_COLUMNS,
+                 cellsPerColumn=CELLS_PER_COLUMN,
+                 initialPerm=0.5,
+                 connectedPerm=0.5,
+                 newSynapseCount=6,
+                 activationThreshold=3,
+                 minThreshold=3,
+                 globalDecay=0.0,
+                 seed=42)
+
+    rng = numpy.random.RandomState(1)
+    self.sequence = [(rng.rand(NUM_COLUMNS) < 0.1).astype("uint32")
+                     for _ in xrange(6)]
+    for _ in xrange(10):
+      for bottomUpInput in self.sequence:
+        self.tm.compute(bottomUpInput, enableLearn=True, computeInfOutput=False)
+      self.tm.reset()
+
+
+  def assertStateUnchanged(self, arrays, contents):
+    for name in STATE_NAMES:
+      stateDict, stateArrays = arrays[name]
+      self.assertIs(self.tm.__dict__[name], stateDict)
+      for key, value in stateArrays.iteritems():
+        self.assertIs(self.tm.__dict__[name][key], value)
+        numpy.testing.assert_array_equal(value, contents[name][key])
+
+
+  def testSameAsDeepCopy(self):
+    numPredicted = 0
+    for bottomUpInput in self.sequence[:4]:
+      self.tm.compute(bottomUpInput, enableLearn=False, computeInfOutput=True)
+      for nSteps in (1, 2, 5):
+        predictions = self.tm.predict(nSteps)
+        numpy.testing.assert_array_equal(predictions,
+                                         deepCopyPredict(self.tm, nSteps))
+        numPredicted += predictions[1:].sum() > 0
+
+    self.assertGreater(numPredicted, 0)
+
+
+  def testStateIsRestored(self):
+    self.tm.compute(self.sequence[0], enableLearn=False, computeInfOutput=True)
+    arrays = getStateArrays(self.tm)
+    contents = copyState(self.tm)
+
+    self.tm.predict(5)
+    self.assertStateUnchanged(arrays, contents)
+
+    # Again with the scratch arrays of the first call
+    self.tm.predict(3)
+    self.assertStateUnchanged(arrays, contents)
+
+
+  def testStateIsRestoredAfterException(self):
+    self.tm.compute(self.sequence[0], enableLearn=False, computeInfOutput=True)
+    arrays = getStateArrays(self.tm)
+    contents = copyState(self.tm)
+    expected = self.tm.predict(4)
+
+    def failingPhase2(doLearn=False):
+      raise RuntimeError("phase 2")
+
+    self.tm.computePhase2 = failingPhase2
+    self.assertRaises(RuntimeError, self.tm.predict, 4)
+    del self.tm.computePhase2
+
+    self.assertStateUnchanged(arrays, contents)
+    numpy.testing.assert_array_equal(self.tm.predict(4), expected)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
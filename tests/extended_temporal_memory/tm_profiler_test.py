@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Tests for the per phase profiler of the temporal memories."""
+
+import json
+import random
+import unittest
+
+import numpy
+
+from htmresearch.algorithms.extended_temporal_memory import (
+  ExtendedTemporalMemory)
+from htmresearch.algorithms.TM import TM
+from htmresearch.support.temporal_memory_profiler import (
+  TemporalMemoryProfiler)
+
+
+
+class TemporalMemoryProfilerTest(unittest.TestCase):
+
+  def runExtended(self, tm, numSteps=20):
+    rng = random.Random(42)
+    sequence = [set(rng.sample(xrange(100), 8)) for _ in xrange(5)]
+    for step in xrange(numSteps):
+      tm.compute(sequence[step % len(sequence)])
+
+
+  def testExtendedTemporalMemoryPhases(self):
+    tm = ExtendedTemporalMemory(columnDimensions=(100,),
+                                cellsPerColumn=4,
+                                activationThreshold=3,
+                                minThreshold=2,
+                                maxNewSynapseCount=6,
+                                initialPermanence=0.51,
+                                seed=42)
+    profiler = TemporalMemoryProfiler().attach(tm)
+    self.assertIn("burstColumns", profiler.getTimedPhases())
+    self.runExtended(tm)
+
+    summary = profiler.getSummary()
+    self.assertEqual(summary["compute"]["calls"], 20)
+    self.assertEqual(summary["computeFn"]["calls"], 20)
+    self.assertEqual(summary["burstColumns"]["calls"], 20)
+    self.assertGreater(summary["computePredictiveCells"]["synapses"], 0)
+    self.assertGreater(summary["burstColumns"]["segments"], 0)
+
+    # Callees are included in the time and counts of their callers
+    stacks = profiler.getStackTotals()
+    compute = stacks["compute"]
+    callees = [totals for stack, totals in stacks.iteritems()
+               if stack.count(";") == 1]
+    self.assertAlmostEqual(compute["seconds"] - compute["exclusiveSeconds"],
+                           sum(totals["seconds"] for totals in callees))
+    self.assertEqual(compute["synapses"],
+                     sum(totals["synapses"] for totals in callees))
+    self.assertIn("compute;computeFn;burstColumns", stacks)
+
+    profiler.detach()
+    self.assertNotIn("compute", vars(tm))
+    self.assertNotIn("synapsesForSegment", vars(tm.connections))
+    self.runExtended(tm)
+    self.assertEqual(profiler.getSummary()["compute"]["calls"], 20)
+
+
+  def testRingKeepsMostRecentCalls(self):
+    tm = ExtendedTemporalMemory(columnDimensions=(100,), seed=42)
+    profiler = TemporalMemoryProfiler(capacity=10,
+                                      phases=["compute", "burstColumns"])
+    profiler.attach(tm)
+    self.runExtended(tm, numSteps=7)
+
+    records = profiler.getRecords()
+    self.assertEqual(profiler.numRecords, 14)
+    self.assertEqual(len(records), 10)
+    self.assertEqual([record["stack"] for record in records[-2:]],
+                     ["compute;burstColumns", "compute"])
+    starts = [record["start"] for record in records if
+              record["stack"] == "compute"]
+    self.assertEqual(starts, sorted(starts))
+
+
+  def testExports(self):
+    tm = ExtendedTemporalMemory(columnDimensions=(100,), seed=42)
+    profiler = TemporalMemoryProfiler(phases=["compute", "burstColumns"])
+    profiler.attach(tm)
+    self.runExtended(tm, numSteps=3)
+
+    data = json.loads(profiler.toJSON())
+    self.assertEqual(data["summary"]["compute"]["calls"], 3)
+    self.assertEqual(len(data["records"]), 6)
+
+    lines = profiler.toFoldedStacks().splitlines()
+    self.assertEqual([line.split()[0] for line in lines],
+                     ["compute", "compute;burstColumns"])
+    for line in lines:
+      self.assertGreaterEqual(int(line.split()[1]), 0)
+
+
+  def testClassicTM(self):
+    tm = TM(numberOfCols=50, cellsPerColumn=4, activationThreshold=3,
+            minThreshold=2, newSynapseCount=5, initialPerm=0.6,
+            connectedPerm=0.5, globalDecay=0.0)
+    profiler = TemporalMemoryProfiler().attach(tm)
+
+    rng = numpy.random.RandomState(42)
+    sequence = [rng.choice(50, 5, replace=False) for _ in xrange(4)]
+    for _ in xrange(3):
+      for columns in sequence:
+        bottomUpInput = numpy.zeros(50, dtype="float32")
+        bottomUpInput[columns] = 1
+        tm.compute(bottomUpInput, enableLearn=True)
+
+    stacks = profiler.getStackTotals()
+    self.assertEqual(stacks["compute"]["calls"], 12)
+    self.assertEqual(stacks["compute;learn"]["calls"], 12)
+    self.assertIn("compute;learn;computePhase2", stacks)
+    self.assertGreater(stacks["compute;learn;computePhase2"]["segments"], 0)
+
+    profiler.detach()
+    self.assertNotIn("isSegmentActive", vars(tm))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
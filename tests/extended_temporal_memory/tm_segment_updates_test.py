@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Tests for the segment update queue of TM and TM_SM."""
+
+import unittest
+
+import numpy
+
+from htmresearch.algorithms.TM import TM
+from htmresearch.algorithms.TM_SM import TM_SM
+
+
+
+NUM_COLUMNS = 64
+CELLS_PER_COLUMN = 4
+NUM_DISTAL_INPUTS = 32
+
+
+
+class ScanningQueueMixin(object):
+  """
+  Keeps the segment updates the way TM and TM_SM did before they were
+  bucketed, by scanning every pending update on each step.
+  """
+
+  def _queueSegmentUpdate(self, c, i, segUpdate):
+    self.segmentUpdates.setdefault((c, i), []).append((self.lrnIterationIdx,
+                                                       segUpdate))
+
+
+  def removeSegmentUpdate(self, updateInfo):
+    (creationDate, segUpdate) = updateInfo
+    key = (segUpdate.columnIdx, segUpdate.cellIdx)
+    self.segmentUpdates[key].remove(updateInfo)
+
+
+  def cleanUpdatesList(self, col, cellIdx, seg):
+    for key, updateList in self.segmentUpdates.items():
+      if key == (col, cellIdx):
+        for update in list(updateList):
+          if update[1].segment == seg:
+            self.removeSegmentUpdate(update)
+
+
+  def processSegmentUpdates(self):
+    removeKeys = []
+    trimSegments = []
+    for key, updateList in self.segmentUpdates.items():
+      c, i = key
+      positiveReinforcement = self.defaultReinforcement
+      if self.learnState['t'][c, i] == 1:
+        positiveReinforcement = True
+      elif (self.predictedState['t'][c, i] == 0 and
+            self.predictedState['t-1'][c, i] == 1):
+        positiveReinforcement = False
+
+      updateListKeep = []
+      for (createDate, segUpdate) in updateList:
+        if self.iterationIdx - createDate > self.segUpdateValidDuration:
+          pass
+        elif ((not self.waitForNextPass or segUpdate.phase1Flag or
+               self.iterationIdx > createDate) and
+              positiveReinforcement is not None):
+          if self.adaptSegment(segUpdate, positiveReinforcement):
+            trimSegments.append((c, i, segUpdate.segment))
+        else:
+          updateListKeep.append((createDate, segUpdate))
+
+      self.segmentUpdates[key] = updateListKeep
+      if len(updateListKeep) == 0:
+        removeKeys.append(key)
+
+    for key in removeKeys:
+      self.segmentUpdates.pop(key)
+
+    for (c, i, segment) in trimSegments:
+      self.trimSegmentsInCell(c, i, [segment], minPermanence=0.00001,
+                              minNumSyns=0)
+
+
+
+class ScanningTM(ScanningQueueMixin, TM):
+  defaultReinforcement = None
+  waitForNextPass = True
+
+
+
+class ScanningTM_SM(ScanningQueueMixin, TM_SM):
+  defaultReinforcement = True
+  waitForNextPass = False
+
+
+
+def createTM(cls=TM, **kwargs):
+  return cls(numberOfCols=NUM_COLUMNS,
+             cellsPerColumn=CELLS_PER_COLUMN,
+             initialPerm=0.5,
+             connectedPerm=0.5,
+             newSynapseCount=6,
+             activationThreshold=3,
+             minThreshold=3,
+             globalDecay=0.0,
+             seed=42,
+             **kwargs)
+
+
+def createTM_SM(cls=TM_SM):
+  return cls(numberOfCols=NUM_COLUMNS,
+             cellsPerColumn=CELLS_PER_COLUMN,
+             numberOfDistalInput=NUM_DISTAL_INPUTS,
+             initialPerm=0.5,
+             connectedPerm=0.5,
+             newSynapseCount=6,
+             newDistalSynapseCount=6,
+             activationThreshold=3,
+             minThreshold=3,
+             globalDecay=0.0,
+             learnLateralConnections=True,
+             seed=42)
+
+
+def getState(tm):
+  """Cell states, segments and pending updates, comparable across instances."""
+  segments = [[(s.segID, sorted(map(tuple, s.syns)),
+                sorted(map(tuple, getattr(s, "dsyns", []))))
+               for s in tm.cells[c][i]]
+              for c in xrange(NUM_COLUMNS) for i in xrange(CELLS_PER_COLUMN)]
+  updates = sorted((key, [(createDate, sorted(map(str, u.activeSynapses)))
+                          for createDate, u in updateList])
+                   for key, updateList in tm.segmentUpdates.iteritems())
+  return (tm.activeState['t'].tolist(), tm.predictedState['t'].tolist(),
+          tm.learnState['t'].tolist(), repr(segments), updates)
+
+
+def queue(tm, lrnIterationIdx, c, i):
+  """Queue an update for cell (c, i) created in the given iteration."""
+  tm.lrnIterationIdx = lrnIterationIdx
+  update = TM.SegmentUpdate(c, i, None, [(0, 0)])
+  tm.addToSegmentUpdates(c, i, update)
+  return update
+
+
+def pending(tm):
+  """Pending updates as a set of (createDate, column, cell)."""
+  return set((createDate, c, i)
+             for (c, i), updateList in tm.segmentUpdates.iteritems()
+             for createDate, _ in updateList)
+
+
+
+class TMSegmentUpdatesTest(unittest.TestCase):
+
+  def testSameAsScanningQueue(self):
+    rng = numpy.random.RandomState(1)
+    sequence = [(rng.rand(NUM_COLUMNS) < 0.1).astype("uint32")
+                for _ in xrange(6)]
+
+    tm = createTM()
+    scanning = createTM(ScanningTM)
+    numUpdates = 0
+    for step in xrange(300):
+      if rng.rand() < 0.2:
+        bottomUpInput = (rng.rand(NUM_COLUMNS) < 0.1).astype("uint32")
+      else:
+        bottomUpInput = sequence[step % 6]
+      learn = step < 250
+      for t in (tm, scanning):
+        t.compute(bottomUpInput, enableLearn=learn, computeInfOutput=not learn)
+      self.assertEqual(getState(tm), getState(scanning), step)
+      self.assertEqual(tm._numSegmentUpdates,
+                       sum(len(u) for u in tm.segmentUpdates.itervalues()))
+      numUpdates = max(numUpdates, tm._numSegmentUpdates)
+
+      if step % 41 == 40:
+        tm.reset()
+        scanning.reset()
+
+    self.assertGreater(numUpdates, 0)
+    self.assertGreater(sum(len(segments) for column in tm.cells
+                           for segments in column), 0)
+
+
+  def testTM_SMSameAsScanningQueue(self):
+    rng = numpy.random.RandomState(1)
+    sequence = [(rng.rand(NUM_COLUMNS) < 0.1).astype("uint32")
+                for _ in xrange(6)]
+    distalInputs = [(rng.rand(NUM_DISTAL_INPUTS) < 0.2).astype("uint32")
+                    for _ in xrange(6)]
+
+    tm = createTM_SM()
+    scanning = createTM_SM(ScanningTM_SM)
+    for step in xrange(150):
+      if rng.rand() < 0.2:
+        bottomUpInput = (rng.rand(NUM_COLUMNS) < 0.1).astype("uint32")
+      else:
+        bottomUpInput = sequence[step % 6]
+      learn = step < 120
+      for t in (tm, scanning):
+        t.compute(bottomUpInput, distalInputs[step % 6], enableLearn=learn,
+                  computeInfOutput=not learn)
+      self.assertEqual(getState(tm), getState(scanning), step)
+
+      if step % 37 == 36:
+        tm.reset()
+        scanning.reset()
+
+    self.assertGreater(sum(len(segments) for column in tm.cells
+                           for segments in column), 0)
+
+
+  def testMaxSegmentUpdatesDropsOldestFirst(self):
+    tm = createTM(maxSegmentUpdates=3)
+
+    queue(tm, 0, 1, 0)
+    queue(tm, 1, 2, 0)
+    queue(tm, 1, 1, 0)
+    self.assertEqual(pending(tm), set([(0, 1, 0), (1, 2, 0), (1, 1, 0)]))
+
+    queue(tm, 2, 3, 1)
+    self.assertEqual(tm._numSegmentUpdates, 3)
+    self.assertEqual(pending(tm), set([(1, 2, 0), (1, 1, 0), (2, 3, 1)]))
+
+    queue(tm, 2, 4, 2)
+    queue(tm, 2, 5, 3)
+    self.assertEqual(tm._numSegmentUpdates, 3)
+    self.assertEqual(pending(tm), set([(2, 3, 1), (2, 4, 2), (2, 5, 3)]))
+
+
+  def testUnboundedByDefault(self):
+    tm = createTM()
+    for idx in xrange(50):
+      queue(tm, 0, idx % NUM_COLUMNS, idx % CELLS_PER_COLUMN)
+    self.assertEqual(tm._numSegmentUpdates, 50)
+
+
+  def testUpdatesExpireAfterValidDuration(self):
+    tm = createTM()
+    duration = tm.segUpdateValidDuration
+
+    queue(tm, 0, 1, 0)
+    queue(tm, 0, 2, 1)
+    queue(tm, 1, 1, 0)
+
+    tm.iterationIdx = duration
+    tm._expireSegmentUpdates()
+    self.assertEqual(pending(tm), set([(0, 1, 0), (0, 2, 1), (1, 1, 0)]))
+
+    tm.iterationIdx = duration + 1
+    tm._expireSegmentUpdates()
+    self.assertEqual(pending(tm), set([(1, 1, 0)]))
+    self.assertEqual(tm._numSegmentUpdates, 1)
+
+    tm.iterationIdx = duration + 2
+    tm._expireSegmentUpdates()
+    self.assertEqual(pending(tm), set())
+    self.assertEqual(tm._numSegmentUpdates, 0)
+
+
+  def testBucketSlotsAreReused(self):
+    tm = createTM()
+    numSlots = len(tm._segmentUpdateBuckets)
+
+    # An update left in a slot that gets reused has expired by then
+    queue(tm, 0, 1, 0)
+    queue(tm, numSlots, 2, 0)
+    self.assertEqual(pending(tm), set([(numSlots, 2, 0)]))
+    self.assertEqual(tm._numSegmentUpdates, 1)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Tests for the sparse segment activity of TM_SM."""
+
+import cPickle as pickle
+import unittest
+
+import numpy
+
+from htmresearch.algorithms.TM_SM import TM_SM
+
+
+
+NUM_COLUMNS = 64
+CELLS_PER_COLUMN = 4
+NUM_DISTAL_INPUTS = 32
+
+
+
+def createTM(sparseSegmentActivity):
+  return TM_SM(numberOfCols=NUM_COLUMNS,
+               cellsPerColumn=CELLS_PER_COLUMN,
+               numberOfDistalInput=NUM_DISTAL_INPUTS,
+               initialPerm=0.5,
+               connectedPerm=0.5,
+               newSynapseCount=6,
+               newDistalSynapseCount=6,
+               activationThreshold=3,
+               minThreshold=3,
+               globalDecay=0.0,
+               learnLateralConnections=True,
+               sparseSegmentActivity=sparseSegmentActivity,
+               seed=42)
+
+
+def getState(tm):
+  """Cell states and segments of a TM_SM, comparable across instances."""
+  segments = [[(s.segID, sorted(map(tuple, s.syns)),
+                sorted(map(tuple, s.dsyns)))
+               for s in tm.cells[c][i]]
+              for c in xrange(NUM_COLUMNS) for i in xrange(CELLS_PER_COLUMN)]
+  return (tm.activeState['t'].tolist(), tm.predictedState['t'].tolist(),
+          tm.learnState['t'].tolist(), repr(segments))
+
+
+
+class TMSMSparseSegmentActivityTest(unittest.TestCase):
+
+  def testSameAsDense(self):
+    rng = numpy.random.RandomState(1)
+    sequence = [(rng.rand(NUM_COLUMNS) < 0.1).astype("uint32")
+                for _ in xrange(6)]
+    distalInputs = [(rng.rand(NUM_DISTAL_INPUTS) < 0.2).astype("uint32")
+                    for _ in xrange(6)]
+
+    sparse = createTM(sparseSegmentActivity=True)
+    dense = createTM(sparseSegmentActivity=False)
+    for step in xrange(150):
+      if rng.rand() < 0.1:
+        bottomUpInput = (rng.rand(NUM_COLUMNS) < 0.1).astype("uint32")
+      else:
+        bottomUpInput = sequence[step % 6]
+      learn = step < 120
+      for tm in (sparse, dense):
+        tm.compute(bottomUpInput, distalInputs[step % 6], enableLearn=learn,
+                   computeInfOutput=not learn)
+      self.assertEqual(getState(sparse), getState(dense), step)
+
+      if step % 50 == 49:
+        # Removed synapses and segments leave the index
+        for tm in (sparse, dense):
+          for c in xrange(NUM_COLUMNS):
+            for i in xrange(CELLS_PER_COLUMN):
+              tm.trimSegmentsInCell(c, i, list(tm.cells[c][i]),
+                                    minPermanence=0.45, minNumSyns=3)
+      if step % 37 == 36:
+        sparse.reset()
+        dense.reset()
+
+    self.assertGreater(sum(len(segments) for column in sparse.cells
+                           for segments in column), 0)
+
+
+  def testIndexMatchesSegments(self):
+    rng = numpy.random.RandomState(1)
+    sequence = [(rng.rand(NUM_COLUMNS) < 0.1).astype("uint32")
+                for _ in xrange(6)]
+    distalInputs = [(rng.rand(NUM_DISTAL_INPUTS) < 0.2).astype("uint32")
+                    for _ in xrange(6)]
+
+    tm = createTM(sparseSegmentActivity=True)
+    for step in xrange(60):
+      tm.compute(sequence[step % 6], distalInputs[step % 6], enableLearn=True,
+                 computeInfOutput=False)
+
+    def asDicts(index):
+      return dict((source, dict(counts))
+                  for source, counts in index.iteritems() if counts)
+
+    index = asDicts(tm._getPresynapticIndex())
+    segmentCells = dict(tm._segmentCells)
+    self.assertGreater(len(index), 0)
+
+    # The index kept up to date is the one built from scratch
+    tm._presynapticIndex = None
+    self.assertEqual(asDicts(tm._getPresynapticIndex()), index)
+    self.assertEqual(tm._segmentCells, segmentCells)
+
+    # and it isn't pickled, but rebuilt after loading
+    restored = pickle.loads(pickle.dumps(tm))
+    self.assertIsNone(restored._presynapticIndex)
+    numpy.testing.assert_array_equal(restored._activeDistalInputs['t'],
+                                     tm._activeDistalInputs['t'])
+    self.assertEqual(len(asDicts(restored._getPresynapticIndex())),
+                     len(index))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
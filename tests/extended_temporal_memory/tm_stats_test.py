@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Tests for the streaming prediction stats of the Python TM."""
+
+import unittest
+
+import numpy
+
+from htmresearch.algorithms.TM import TM
+from htmresearch.support.temporal_memory_stats import StreamingPredictionStats
+
+
+
+class StreamingPredictionStatsTest(unittest.TestCase):
+
+  def testColumnCounters(self):
+    stats = StreamingPredictionStats(5)
+    stats.update(numpy.array([0, 2]), numpy.array([2, 3]))
+    stats.update(numpy.array([2, 3]), numpy.array([], dtype=int))
+
+    numpy.testing.assert_array_equal(stats.activeCounts, [1, 0, 2, 1, 0])
+    numpy.testing.assert_array_equal(stats.predictedCounts, [0, 0, 1, 1, 0])
+    numpy.testing.assert_array_equal(stats.correctCounts, [0, 0, 1, 0, 0])
+    numpy.testing.assert_array_equal(stats.getColumnPrecision(),
+                                     [0, 0, 1, 0, 0])
+    numpy.testing.assert_array_equal(stats.getColumnRecall(),
+                                     [0, 0, 0.5, 0, 0])
+
+
+  def testMovingAverages(self):
+    stats = StreamingPredictionStats(1, decay=0.5)
+    empty = numpy.array([], dtype=int)
+
+    # Plain mean until the decay takes over
+    stats.update(empty, empty, score=1.0)
+    stats.update(empty, empty, score=0.0)
+    self.assertEqual(stats.averages["score"], 0.5)
+
+    stats.update(empty, empty, score=1.0)
+    self.assertEqual(stats.averages["score"], 0.75)
+
+
+  def testSnapshotIsACopy(self):
+    stats = StreamingPredictionStats(3)
+    stats.update(numpy.array([1]), numpy.array([1]), score=1.0)
+    snapshot = stats.snapshot()
+
+    stats.update(numpy.array([1]), numpy.array([1]), score=0.0)
+    self.assertEqual(snapshot["numUpdates"], 1)
+    self.assertEqual(snapshot["averages"], {"score": 1.0})
+    numpy.testing.assert_array_equal(snapshot["correctCounts"], [0, 1, 0])
+
+
+  def testTMStatsMatchCheckPrediction(self):
+    tm = TM(numberOfCols=60, cellsPerColumn=4, activationThreshold=3,
+            minThreshold=2, newSynapseCount=5, initialPerm=0.6,
+            connectedPerm=0.5, globalDecay=0.0, burnIn=0, collectStats=True)
+    rng = numpy.random.RandomState(42)
+    sequence = [rng.choice(60, 6, replace=False) for _ in xrange(5)]
+
+    numPredictions = 0
+    for _ in xrange(10):
+      for columns in sequence:
+        predictedState = tm.predictedState["t"].copy()
+        confidence = tm.confidence["t"].copy()
+
+        bottomUpInput = numpy.zeros(60, dtype="float32")
+        bottomUpInput[columns] = 1
+        tm.compute(bottomUpInput, enableLearn=True)
+        numPredictions += 1
+
+        activeColumns = sorted(columns)
+        numExtra, numMissing, confidences = tm.checkPrediction2(
+          [activeColumns], output=predictedState, confidence=confidence)
+        stats = tm.getStats()
+        self.assertEqual(stats["curExtra"], numExtra)
+        self.assertEqual(stats["curMissing"], numMissing)
+        self.assertAlmostEqual(stats["curPredictionScore2"],
+                               confidences[0][0])
+      tm.reset()
+
+    snapshot = tm.getStatsSnapshot()
+    self.assertEqual(snapshot["numUpdates"], numPredictions)
+    self.assertEqual(snapshot["activeCounts"].sum(), 6 * numPredictions)
+    self.assertGreater(snapshot["correctCounts"].sum(), 0)
+    self.assertIn("predictionScoreEma", tm.getStats())
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -268,6 +268,23 @@ class TestImbu(unittest.TestCase):
       "Cio encoder cache dir did not set properly.")
 
 
+  def testDataCacheIsOptIn(self):
+    cacheRoot = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, cacheRoot)
+
+    imbu = ImbuModels(dataPath=self.dataPath, cacheRoot=cacheRoot)
+    self.assertEqual([], os.listdir(cacheRoot))
+    self.assertFalse(os.path.exists(self.dataPath + ".cache"))
+
+    cached = ImbuModels(dataPath=self.dataPath, cacheRoot=cacheRoot,
+                        cacheData=True)
+    self.assertEqual(["sample_reviews_subset.csv.cache"],
+                     os.listdir(cacheRoot))
+    self.assertEqual(imbu.dataDict.keys(), cached.dataDict.keys())
+    for key in imbu.dataDict:
+      self.assertEqual(imbu.dataDict[key], cached.dataDict[key])
+
+
   def _checkResultsFormatting(self, results, modelName, windowSize=0):
     for result in results.values():
       self.assertEqual(
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Offline tests for the CioEncoder union and window encodings."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from htmresearch.encoders import EncoderTypes
+from htmresearch.encoders.cio_encoder import CioEncoder
+from htmresearch.encoders.fingerprint_store import (CorticalClientBackend,
+                                                    FingerprintStore,
+                                                    RandomFingerprintBackend)
+
+
+
+class CioEncoderOfflineTest(unittest.TestCase):
+
+  def setUp(self):
+    # These tests run without an API key
+    self.apiKey = os.environ.pop("CORTICAL_API_KEY", None)
+    self.tmpDir = tempfile.mkdtemp()
+    store = FingerprintStore(os.path.join(self.tmpDir, "fingerprints.sqlite"))
+    self.encoder = CioEncoder(retina="en_associative_64_univ",
+                              fingerprintType=EncoderTypes.word,
+                              unionSparsity=0.1,
+                              fingerprintStore=store)
+    store.backend = RandomFingerprintBackend(self.encoder.n,
+                                             int(0.02 * self.encoder.n))
+    self.tokens = ("the quick brown fox jumps over the lazy dog and the "
+                   "quick cat").split()
+
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpDir)
+    if self.apiKey is not None:
+      os.environ["CORTICAL_API_KEY"] = self.apiKey
+
+
+  def testUnionEncodingPicksMostFrequentBits(self):
+    positions = self.encoder.getUnionEncodingFromTokens(self.tokens)
+
+    counts = numpy.zeros(self.encoder.n)
+    for token in self.tokens:
+      counts[self.encoder._getWordBitmap(token)] += 1
+
+    w = min(numpy.count_nonzero(counts),
+            int(self.encoder.unionSparsity * self.encoder.n))
+    self.assertEqual(len(positions), w)
+    self.assertEqual(len(set(positions)), w)
+
+    # Positions come in order of decreasing count, and no unselected bit is
+    # more popular than a selected one
+    selected = counts[list(positions)]
+    self.assertTrue(numpy.all(numpy.diff(selected) <= 0))
+    unselected = numpy.ones(self.encoder.n, dtype=bool)
+    unselected[list(positions)] = False
+    self.assertLessEqual(counts[unselected].max(), selected.min())
+
+
+  def testUnionEncodingOfNoTokens(self):
+    self.assertEqual(self.encoder.getUnionEncodingFromTokens([]), ())
+
+
+  def testWindowEncodingsMatchExplicitUnions(self):
+    windows = self.encoder.getWindowEncoding(self.tokens)
+    bitmaps = [self.encoder._getWordBitmap(t) for t in self.tokens]
+    maxBits = self.encoder.unionSparsity * self.encoder.n
+
+    self.assertEqual(len(windows), len(self.tokens))
+    for end, window in enumerate(windows):
+      # Grow the window backwards the same way the encoder describes it
+      union = numpy.array(bitmaps[end])
+      for i in reversed(xrange(end)):
+        if len(union) + len(bitmaps[i]) > maxBits:
+          break
+        union = numpy.union1d(union, bitmaps[i])
+
+      self.assertEqual(window["bitmap"].tolist(), sorted(union.tolist()))
+      self.assertEqual(window["sparsity"], len(union) / float(self.encoder.n))
+      self.assertLessEqual(window["sparsity"], self.encoder.unionSparsity)
+      self.assertEqual(window["text"][-1], self.tokens[end])
+
+
+  def testEncodeWithoutApiKey(self):
+    self.assertIsNone(self.encoder.client)
+
+    encoding = self.encoder.encode("the quick brown fox")
+    positions = encoding["fingerprint"]["positions"]
+    self.assertGreater(len(positions), 0)
+    self.assertLessEqual(encoding["sparsity"], self.encoder.unionSparsity)
+
+    # Everything else needs the Cortical.io API
+    with self.assertRaises(OSError):
+      self.encoder.decode(positions.tolist())
+    with self.assertRaises(OSError):
+      self.encoder.compare([1, 2], [2, 3])
+    with self.assertRaises(OSError):
+      self.encoder.createCategory("label", [[1, 2]])
+
+
+  def testDocumentEncoderNeedsApiKey(self):
+    with self.assertRaises(OSError):
+      CioEncoder(retina="en_associative_64_univ",
+                 fingerprintType=EncoderTypes.document,
+                 fingerprintStore=self.encoder.fingerprintStore)
+
+
+  def testStoreFetchesFromClient(self):
+    store = FingerprintStore(os.path.join(self.tmpDir, "client.sqlite"))
+    encoder = CioEncoder(retina="en_associative_64_univ",
+                         fingerprintType=EncoderTypes.word,
+                         apiKey="key",
+                         fingerprintStore=store)
+
+    self.assertIsInstance(store.backend, CorticalClientBackend)
+    self.assertIs(store.backend.client, encoder.client)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
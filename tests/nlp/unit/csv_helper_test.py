@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Tests for the chunked CSV reader and the columnar CSV cache."""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from htmresearch.support.csv_helper import (
+  CSVCache, mapLabelRefs, readCSV, readCSVChunks, writeCSV)
+
+
+
+class CSVHelperTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpDir = tempfile.mkdtemp()
+    self.csvFile = os.path.join(self.tmpDir, "data.csv")
+
+    rng = random.Random(42)
+    labels = ["fruit", "vegetable", "meat", "dairy", "grain", ""]
+    rows = []
+    for i in xrange(57):
+      text = " ".join(rng.choice(["apple", "k\xc3\xa4se", "bread, and", "ham"])
+                      for _ in xrange(rng.randint(0, 5)))
+      rows.append([str(1000 + i), "x", text] +
+                  [rng.choice(labels) for _ in xrange(3)])
+    writeCSV(rows, ["ID", "Other", "Sample", "L1", "L2", "L3"], self.csvFile)
+
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpDir)
+
+
+  def testReadCSVChunks(self):
+    chunks = list(readCSVChunks(self.csvFile, numLabels=3, chunkSize=10))
+
+    self.assertEqual([len(chunk) for chunk in chunks], [10] * 5 + [7])
+    self.assertEqual(dict(sum(chunks, [])), readCSV(self.csvFile, numLabels=3))
+
+
+  def testCacheMatchesReadCSV(self):
+    expected = readCSV(self.csvFile, numLabels=3)
+    cache = CSVCache(self.csvFile, numLabels=3, chunkSize=8)
+
+    self.assertEqual(len(cache), len(expected))
+    self.assertEqual(cache.toDataDict(), expected)
+    self.assertEqual(dict(sum(cache.iterChunks(5), [])), expected)
+
+    # Label ids are the same as the ones mapLabelRefs() assigns
+    labelRefs, mapped = mapLabelRefs(expected)
+    self.assertEqual(cache.labelRefs, labelRefs)
+    for lineNumber, (text, labelIds, docId) in (
+        cache.toDataDict(mapLabels=True).iteritems()):
+      self.assertEqual(labelIds.dtype, numpy.int32)
+      numpy.testing.assert_array_equal(labelIds, mapped[lineNumber][1])
+
+
+  def testCacheIsReused(self):
+    CSVCache(self.csvFile, numLabels=3)
+    with open(os.path.join(self.csvFile + ".cache", "meta.json")) as f:
+      meta = f.read()
+
+    cache = CSVCache(self.csvFile, numLabels=3)
+    with open(os.path.join(self.csvFile + ".cache", "meta.json")) as f:
+      self.assertEqual(f.read(), meta)
+    self.assertEqual(cache[0], readCSV(self.csvFile, numLabels=3)[0])
+
+
+  def testCacheIsRebuiltWhenSourceChanges(self):
+    cache = CSVCache(self.csvFile, numLabels=3)
+    self.assertEqual(len(cache), 57)
+
+    writeCSV([["1", "x", "new text", "fresh", "", ""]],
+             ["ID", "Other", "Sample", "L1", "L2", "L3"], self.csvFile)
+    stats = os.stat(self.csvFile)
+    os.utime(self.csvFile, (stats.st_atime, stats.st_mtime + 10))
+
+    cache = CSVCache(self.csvFile, numLabels=3)
+    self.assertEqual(len(cache), 1)
+    self.assertEqual(cache[0], ("new text", ["fresh"], "1"))
+
+
+  def testEmptyCSV(self):
+    writeCSV([], ["ID", "Other", "Sample"], self.csvFile)
+    cache = CSVCache(self.csvFile)
+
+    self.assertEqual(len(cache), 0)
+    self.assertEqual(cache.toDataDict(), {})
+
+
+
+if __name__ == "__main__":
+  unittest.main()
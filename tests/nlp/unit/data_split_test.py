@@ -22,6 +22,7 @@
 
 """Tests for data_split module."""
 
+import random
 import unittest
 #import pdb; pdb.set_trace()
 import pprint
@@ -126,5 +127,34 @@ class DataSplitTest(unittest.TestCase):
       partition1[0]+partition1[1], partition2[0]+partition2[1])
 
 
+  def testIncrementalSplit(self):
+    splitter = data_split.IncrementalSplit([0, 2, 5])
+
+    self.assertSequenceEqual(
+      splitter.split(xrange(5)),
+      [([], [0, 1, 2, 3, 4]), ([0, 1], [2, 3, 4]), ([0, 1, 2, 3, 4], [])])
+
+    with self.assertRaises(ValueError):
+      splitter.split(xrange(4))
+
+
+  def testIncrementalSplitRandomize(self):
+    splitter = data_split.IncrementalSplit([3, 7])
+    partitions = splitter.split(range(10), randomize=True, seed=3)
+
+    for size, (train, test) in zip([3, 7], partitions):
+      self.assertEqual(len(train), size)
+      self.assertItemsEqual(train + test, range(10))
+      self.assertEqual(test, sorted(test))
+
+    # Same training samples as drawing them one split at a time, and the same
+    # result every time for a fixed seed
+    random.seed(3)
+    self.assertEqual([random.sample(xrange(10), size) for size in [3, 7]],
+                     [train for train, _ in partitions])
+    self.assertEqual(partitions,
+                     splitter.split(range(10), randomize=True, seed=3))
+
+
 if __name__ == "__main__":
   unittest.main()
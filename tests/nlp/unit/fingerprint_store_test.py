@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Tests for the persistent fingerprint store."""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from htmresearch.encoders.fingerprint_store import (FingerprintStore,
+                                                    RandomFingerprintBackend)
+
+
+
+class CountingBackend(RandomFingerprintBackend):
+
+  def __init__(self, *args, **kwargs):
+    super(CountingBackend, self).__init__(*args, **kwargs)
+    self.calls = 0
+
+
+  def getPositions(self, term):
+    self.calls += 1
+    return super(CountingBackend, self).getPositions(term)
+
+
+
+class FingerprintStoreTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpDir = tempfile.mkdtemp()
+    self.path = os.path.join(self.tmpDir, "fingerprints.sqlite")
+    self.backend = CountingBackend(n=1024, w=20)
+
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpDir)
+
+
+  def testRandomBackendIsDeterministic(self):
+    other = RandomFingerprintBackend(n=1024, w=20)
+    positions = self.backend.getPositions("cat")
+
+    self.assertEqual(len(positions), 20)
+    self.assertEqual(len(set(positions)), 20)
+    numpy.testing.assert_array_equal(positions, other.getPositions("cat"))
+    self.assertFalse(numpy.array_equal(positions,
+                                       other.getPositions("dog")))
+
+
+  def testGetPositionsFetchesOnce(self):
+    store = FingerprintStore(self.path, backend=self.backend)
+
+    first = store.getPositions("cat")
+    second = store.getPositions("cat")
+
+    self.assertEqual(self.backend.calls, 1)
+    numpy.testing.assert_array_equal(first, second)
+    numpy.testing.assert_array_equal(first, self.backend.getPositions("cat"))
+
+
+  def testPrefetchDeduplicatesTerms(self):
+    store = FingerprintStore(self.path, backend=self.backend)
+
+    fetched = store.prefetch(["the", "cat", "the", "sat", "cat"])
+
+    self.assertEqual(fetched, 3)
+    self.assertEqual(self.backend.calls, 3)
+    self.assertEqual(len(store), 3)
+
+    # Everything is now cached, so nothing else goes to the backend
+    self.assertEqual(store.prefetch(["the", "cat"]), 0)
+    store.getPositions("sat")
+    self.assertEqual(self.backend.calls, 3)
+
+
+  def testStoreIsPersistent(self):
+    store = FingerprintStore(self.path, backend=self.backend)
+    expected = store.getPositions("cat")
+    store.close()
+
+    reopened = FingerprintStore(self.path)
+    self.assertIn("cat", reopened)
+    numpy.testing.assert_array_equal(reopened.getPositions("cat"), expected)
+    self.assertEqual(reopened.prefetch(["cat"]), 0)
+
+
+  def testMissingTermWithoutBackend(self):
+    store = FingerprintStore(self.path)
+
+    with self.assertRaises(KeyError):
+      store.getPositions("cat")
+
+
+  def testCacheIsBounded(self):
+    store = FingerprintStore(self.path, backend=self.backend, cacheSize=2)
+    store.prefetch(["a", "b", "c", "d"])
+
+    self.assertEqual(len(store._cache), 2)
+    self.assertEqual(len(store), 4)
+
+    # Evicted terms come back from the file, not the backend
+    store.getPositions("a")
+    self.assertEqual(self.backend.calls, 4)
+
+
+  def testPickle(self):
+    store = FingerprintStore(self.path, backend=self.backend)
+    expected = store.getPositions("cat")
+
+    restored = pickle.loads(pickle.dumps(store))
+    numpy.testing.assert_array_equal(restored.getPositions("cat"), expected)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Tests for the binary network data format."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from htmresearch.support.network_data_file import NetworkDataFile
+from htmresearch.support.network_text_data_generator import (
+  NetworkDataGenerator)
+
+
+
+class NetworkDataFileTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpDir = tempfile.mkdtemp()
+
+    self.dataDict = {
+      0: ("The fox eats carrots", ["animal", "food"], "a1"),
+      1: ("", ["food"], "a2"),
+      2: ("carrots are healthy, foxes too", ["food"], "a3"),
+      3: ("Fox", ["animal"], "a4"),
+    }
+    self.generator = NetworkDataGenerator()
+    self.generator.split(dataDict=self.dataDict, numLabels=2)
+    self.generator.randomizeData(seed=3)
+
+    self.csvFile = self._save("data.csv")
+    self.npzFile = self._save("data.npz")
+
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpDir)
+
+
+  def _save(self, name):
+    return self.generator.saveData(os.path.join(self.tmpDir, name),
+                                   os.path.join(self.tmpDir, "categories.json"))
+
+
+  def testAccessorsMatchCSV(self):
+    for accessor in (NetworkDataGenerator.getClassifications,
+                     NetworkDataGenerator.getNumberOfTokens,
+                     NetworkDataGenerator.getResetsIndices):
+      self.assertEqual(accessor(self.npzFile), accessor(self.csvFile))
+
+
+  def testSamples(self):
+    samples = NetworkDataGenerator.getSamples(self.npzFile)
+
+    expected = [(sequence[0]["ID"],
+                 ([" ".join(record["_token"] for record in sequence)],
+                  [int(c) for c in sequence[0]["_category"].split()]))
+                for sequence in self.generator.records if sequence]
+    self.assertEqual(samples.items(), expected)
+
+
+  def testRecordStream(self):
+    dataFile = NetworkDataFile(self.npzFile)
+    self.assertIsInstance(dataFile.tokenIds, numpy.memmap)
+
+    expected = [record for sequence in self.generator.records
+                for record in sequence]
+    self.assertEqual(len(dataFile), len(expected))
+
+    for _ in xrange(2):
+      for record in expected:
+        actual = dataFile.getNextRecordDict()
+        self.assertEqual(actual["_token"], record["_token"])
+        self.assertEqual(actual["_reset"], record["_reset"])
+        self.assertEqual(actual["_sequenceId"], record["_sequenceId"])
+        self.assertEqual(actual["ID"], record["ID"])
+        self.assertEqual(actual["_category"],
+                         [int(c) for c in record["_category"].split()])
+      self.assertIsNone(dataFile.getNextRecordDict())
+      dataFile.rewind()
+
+
+  def testStrippedCategories(self):
+    self.generator.stripCategories()
+    dataFile = NetworkDataFile(self._save("stripped.npz"))
+
+    self.assertEqual(
+      dataFile.getClassifications(),
+      [str(sequence[0]["_sequenceId"])
+       for sequence in self.generator.records if sequence])
+
+
+
+if __name__ == "__main__":
+  unittest.main()
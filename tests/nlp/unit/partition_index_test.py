@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Tests for the per-partition distance reduction in ClassificationModel."""
+
+import unittest
+
+import numpy
+
+from htmresearch.frameworks.nlp.classification_model import (
+  ClassificationModel, PartitionIndex)
+
+
+
+class FakeClassifier(object):
+
+  exact = False
+
+
+
+class FakeModel(ClassificationModel):
+  """Returns canned distances to a fixed set of stored patterns per token."""
+
+  def __init__(self, idList, tokenDistances):
+    super(FakeModel, self).__init__(numLabels=2, verbosity=0)
+    self.idList = idList
+    self.tokenDistances = tokenDistances
+    self.classifier = FakeClassifier()
+
+
+  def getClassifier(self):
+    return self.classifier
+
+
+  def inferToken(self, token, resetSequence=0, returnDetailedResults=False,
+                 sortResults=True):
+    distances = numpy.array(self.tokenDistances[token], dtype=float)
+    return numpy.array([1.0, 0.0]), list(self.idList), distances
+
+
+
+class PartitionIndexTest(unittest.TestCase):
+
+  def testMinDistances(self):
+    partitions = PartitionIndex([7, 3, 7, 5, 3, 7])
+
+    self.assertEqual(partitions.ids, [3, 5, 7])
+    numpy.testing.assert_array_equal(
+      partitions.minDistances(numpy.array([0.4, 0.9, 0.2, 0.5, 0.3, 0.8])),
+      [0.3, 0.5, 0.2])
+
+
+  def testEmpty(self):
+    partitions = PartitionIndex([])
+
+    self.assertEqual(partitions.ids, [])
+    self.assertEqual(len(partitions.minDistances(numpy.zeros(0))), 0)
+
+
+  def testInferDocumentDetailed(self):
+    rng = numpy.random.RandomState(42)
+    idList = rng.randint(0, 20, size=200).tolist()
+    tokenDistances = {t: rng.rand(200) for t in ("a", "b", "c")}
+    model = FakeModel(idList, tokenDistances)
+
+    votes, protoIds, distances = model._inferDocumentDetailed(["a", "b", "c"])
+
+    expected = {}
+    for protoId in set(idList):
+      patternIds = [i for i, p in enumerate(idList) if p == protoId]
+      expected[protoId] = numpy.mean(
+        [tokenDistances[t][patternIds].min() for t in ("a", "b", "c")])
+
+    numpy.testing.assert_array_equal(votes, [1.0, 0.0])
+    self.assertEqual(sorted(protoIds), sorted(expected))
+    numpy.testing.assert_allclose(distances,
+                                  [expected[p] for p in protoIds])
+    self.assertTrue(numpy.all(numpy.diff(distances) >= 0))
+
+
+  def testPartitionIndexIsReused(self):
+    model = FakeModel([1, 2, 1], {"a": [0.1, 0.2, 0.3]})
+    model._inferDocumentDetailed(["a"])
+    partitions = model._partitionIndex
+
+    model._inferDocumentDetailed(["a", "a"])
+    self.assertIs(model._partitionIndex, partitions)
+
+    # Learning a new prototype changes the ids, so the index is rebuilt
+    model.idList = [1, 2, 1, 3]
+    model.tokenDistances = {"a": [0.1, 0.2, 0.3, 0.0]}
+    _, protoIds, distances = model._inferDocumentDetailed(["a"])
+    self.assertIsNot(model._partitionIndex, partitions)
+    self.assertEqual(protoIds, [3, 1, 2])
+    numpy.testing.assert_array_equal(distances, [0.0, 0.1, 0.2])
+
+
+
+if __name__ == "__main__":
+  unittest.main()
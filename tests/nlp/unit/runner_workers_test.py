@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Tests for running nlp.Runner trials in worker processes."""
+
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from collections import OrderedDict
+
+from htmresearch.frameworks.nlp.runner import Runner
+
+
+
+class FakeModel(object):
+  """Predicts the label of the closest trained sample."""
+
+  def __init__(self, labels):
+    self.labels = labels
+    self.trained = []
+
+
+  def resetModel(self):
+    self.trained = []
+
+
+  def trainModel(self, i):
+    self.trained.append(i)
+
+
+  def testModel(self, i, seed):
+    closest = min(self.trained, key=lambda j: (abs(i - j), j))
+    return [self.labels[closest]]
+
+
+
+class RewritingRunner(Runner):
+  """Rewrites its partitions and samples in testing(), like HTMRunner."""
+
+  def testing(self, trial, seed):
+    super(RewritingRunner, self).testing(trial, seed)
+
+    numTrain = len(self.partitions[trial][0])
+    numTest = len(self.partitions[trial][1])
+    self.partitions[trial] = (range(numTrain),
+                              range(numTrain, numTrain + numTest))
+    self.samples = OrderedDict((i, (["trial{}".format(trial)], [0], i))
+                               for i in xrange(numTrain + numTest))
+
+
+
+class RunnerWorkersTest(unittest.TestCase):
+
+  def setUp(self):
+    self.resultsDir = tempfile.mkdtemp()
+
+
+  def tearDown(self):
+    shutil.rmtree(self.resultsDir)
+
+
+  def runExperiment(self, workers):
+    runner = RewritingRunner(dataPath=None,
+                             resultsDir=self.resultsDir,
+                             experimentName="workers",
+                             experimentType="k-folds",
+                             modelName="Keywords",
+                             folds=4)
+    labels = [i % 3 for i in xrange(20)]
+    runner.model = FakeModel(labels)
+    runner.samples = OrderedDict((i, (["token"], [labels[i]], i))
+                                 for i in xrange(20))
+    runner.patterns = [{"labels": [label],
+                        "pattern": {"bitmap": numpy.array([i, i + 1])}}
+                       for i, label in enumerate(labels)]
+
+    runner.runExperiment(seed=42, workers=workers)
+    return runner
+
+
+  def testParallelMatchesSerial(self):
+    serial = self.runExperiment(workers=1)
+    parallel = self.runExperiment(workers=3)
+
+    self.assertEqual(len(serial.results), 4)
+    self.assertEqual(parallel.results, serial.results)
+    self.assertEqual(parallel.partitions, serial.partitions)
+    self.assertEqual(parallel.samples, serial.samples)
+    self.assertEqual(parallel.model.trained, serial.model.trained)
+
+
+  def testPatternsAreLeftAlone(self):
+    runner = self.runExperiment(workers=3)
+
+    for i, pattern in enumerate(runner.patterns):
+      bitmap = pattern["pattern"]["bitmap"]
+      self.assertIs(type(bitmap), numpy.ndarray)
+      self.assertTrue(bitmap.flags.writeable)
+      self.assertEqual(bitmap.tolist(), [i, i + 1])
+
+
+
+if __name__ == "__main__":
+  unittest.main()
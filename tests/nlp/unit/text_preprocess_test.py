@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for TextPreprocess."""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from htmresearch.support.text_preprocess import TextPreprocess
+
+
+
+class TextPreprocessSpellingTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpDir = tempfile.mkdtemp()
+    self.corpusPath = os.path.join(self.tmpDir, "corpus.txt")
+
+    rng = random.Random(42)
+    words = ["".join(rng.choice("abcde$") for _ in xrange(rng.randint(1, 6)))
+             for _ in xrange(300)]
+    with open(self.corpusPath, "w") as f:
+      f.write(" ".join(rng.choice(words) for _ in xrange(2000)))
+
+    self.rng = rng
+
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpDir)
+
+
+  def _bruteForceCandidates(self, textPreprocess, word):
+    bagOfWords = textPreprocess.bagOfWords
+    edits1 = textPreprocess._editDistance1(word)
+    return ({word} & set(bagOfWords) or
+            edits1 & set(bagOfWords) or
+            textPreprocess._editDistance2(word) & set(bagOfWords) or
+            {word})
+
+
+  def testCorrectMatchesExplicitEdits(self):
+    textPreprocess = TextPreprocess(corpusTxt=self.corpusPath)
+    textPreprocess._setupCorpus(self.corpusPath)
+
+    for _ in xrange(100):
+      word = "".join(self.rng.choice("abcdefg$")
+                     for _ in xrange(self.rng.randint(1, 6)))
+      candidates = self._bruteForceCandidates(textPreprocess, word)
+      expected = max(sorted(candidates), key=textPreprocess.bagOfWords.get)
+
+      self.assertEqual(textPreprocess.correct(word), expected)
+
+
+  def testDeletesIndexIsPersisted(self):
+    textPreprocess = TextPreprocess(corpusTxt=self.corpusPath)
+    textPreprocess.correct("abcdefg")
+    index = textPreprocess.deletesIndex
+
+    self.assertEqual(len(os.listdir(self.tmpDir)), 2)
+
+    reloaded = TextPreprocess(corpusTxt=self.corpusPath)
+    reloaded._setupCorpus(self.corpusPath)
+    reloaded._setupDeletesIndex()
+    self.assertEqual(reloaded.deletesIndex, index)
+
+
+  def testCorrectionsCacheIsBounded(self):
+    textPreprocess = TextPreprocess(corpusTxt=self.corpusPath,
+                                    spellCacheSize=5)
+    for word in ("xa", "xb", "xc", "xd", "xe", "xf", "xg"):
+      textPreprocess.correct(word)
+
+    self.assertEqual(textPreprocess.corrections.keys(),
+                     ["xc", "xd", "xe", "xf", "xg"])
+
+
+  def testCorrectionsCacheEvictsLeastRecentlyUsed(self):
+    textPreprocess = TextPreprocess(corpusTxt=self.corpusPath,
+                                    spellCacheSize=3)
+    for word in ("xa", "xb", "xc", "xa", "xd"):
+      textPreprocess.correct(word)
+
+    self.assertEqual(textPreprocess.corrections.keys(), ["xc", "xa", "xd"])
+
+
+
+
+class TextPreprocessCorpusTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = random.Random(42)
+    words = ["WFH", "don't", "they'll", "smoking", "stopped", "quit", "$5",
+             "the", "a", "immediately!", "Jane", "John"]
+    self.texts = [" ".join(rng.choice(words)
+                           for _ in xrange(rng.randint(0, 12)))
+                  for _ in xrange(250)]
+
+
+  def testTokenizeCorpusMatchesTokenizeAndFilter(self):
+    textPreprocess = TextPreprocess()
+    specs = dict(expandAbbr=True, expandContr=True)
+    expected = [textPreprocess.tokenizeAndFilter(text, **specs)
+                for text in self.texts]
+
+    self.assertEqual(list(textPreprocess.tokenizeCorpus(self.texts, **specs)),
+                     expected)
+
+    # Documents come back in input order from the worker processes too
+    self.assertEqual(
+      list(textPreprocess.tokenizeCorpus(iter(self.texts), workers=3,
+                                         chunksize=7, **specs)),
+      expected)
+
+
+  def testTokenizeCorpusWithoutFilters(self):
+    textPreprocess = TextPreprocess()
+    for text, (tokens, _) in zip(self.texts,
+                                 textPreprocess.tokenizeCorpus(self.texts,
+                                                               workers=2)):
+      self.assertEqual(tokens, textPreprocess.tokenize(text))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,147 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+import cPickle as pickle
+import unittest
+
+import numpy
+
+from htmresearch.regions.LanguageSensor import LanguageSensor
+
+
+
+class CountingEncoder(object):
+  """Encodes each token as a few bits picked from its hash."""
+
+  def __init__(self, width=64):
+    self.width = width
+    self.calls = 0
+
+
+  def getWidth(self):
+    return self.width
+
+
+  def encodeIntoArray(self, token, output):
+    self.calls += 1
+    output[:] = 0
+    output[[hash(token) % self.width, len(token) % self.width]] = 1
+
+
+
+class LanguageSensorTest(unittest.TestCase):
+
+  def setUp(self):
+    self.sensor = LanguageSensor(numCategories=2, cacheSize=2)
+    self.sensor.encoder = CountingEncoder()
+    self.outputs = {"dataOut": numpy.zeros(64, dtype="float32"),
+                    "categoryOut": numpy.zeros(2, dtype="float32"),
+                    "resetOut": numpy.zeros(1, dtype="float32"),
+                    "sequenceIdOut": numpy.zeros(1, dtype="float32")}
+
+
+  def _compute(self, token):
+    self.sensor.addDataToQueue(token, [1], 7)
+    self.sensor.compute({}, self.outputs)
+    return self.outputs["dataOut"].copy()
+
+
+  def testRepeatedTokensAreCached(self):
+    encoder = self.sensor.encoder
+    expected = {}
+    for token in ("cat", "dog"):
+      expected[token] = numpy.zeros(64, dtype="float32")
+      CountingEncoder().encodeIntoArray(token, expected[token])
+
+    for token in ("cat", "dog", "cat", "cat", "dog"):
+      numpy.testing.assert_array_equal(self._compute(token), expected[token])
+    self.assertEqual(encoder.calls, 2)
+
+    # "cat" is the least recently used, so it's evicted first
+    self._compute("fox")
+    self._compute("dog")
+    self.assertEqual(encoder.calls, 3)
+    self._compute("cat")
+    self.assertEqual(encoder.calls, 4)
+
+
+  def testNewEncoderClearsCache(self):
+    self._compute("cat")
+    self.sensor.encoder = CountingEncoder()
+    self._compute("cat")
+
+    self.assertEqual(self.sensor.encoder.calls, 1)
+
+
+  def testOutputValuesAreSnapshots(self):
+    self._compute("cat")
+    values = self.sensor.getOutputValues("dataOut")
+    numpy.testing.assert_array_equal(values, self.outputs["dataOut"])
+    self.assertEqual(self.sensor.getOutputValues("sourceOut"), "cat")
+    numpy.testing.assert_array_equal(
+      self.sensor.getOutputValues("categoryOut"), [1, -1])
+
+    self.outputs["dataOut"][:] = 0
+    self.assertTrue(values.any())
+
+
+  def testPickle(self):
+    self._compute("cat")
+    restored = pickle.loads(pickle.dumps(self.sensor))
+
+    self.assertEqual(restored.getOutputValues("sourceOut"), "cat")
+    numpy.testing.assert_array_equal(restored.getOutputValues("dataOut"),
+                                     self.outputs["dataOut"])
+    self.assertEqual(len(restored._encodingCache), 0)
+
+
+  def testUnpickleWithoutEncodingCache(self):
+    # State of a sensor pickled before outputs were copied lazily
+    self._compute("cat")
+    state = self.sensor.__getstate__()
+    for name in ("cacheSize", "_encodingCache", "_cacheEncoder", "_outputs",
+                 "_sourceOut"):
+      del state[name]
+    state["_outputValues"] = {
+      "dataOut": self.outputs["dataOut"].copy(),
+      "categoryOut": numpy.array([1, -1], dtype="float32"),
+      "sourceOut": "cat"}
+
+    restored = LanguageSensor.__new__(LanguageSensor)
+    restored.__setstate__(state)
+
+    self.assertFalse(hasattr(restored, "_outputValues"))
+    self.assertEqual(restored.getOutputValues("sourceOut"), "cat")
+    numpy.testing.assert_array_equal(restored.getOutputValues("dataOut"),
+                                     self.outputs["dataOut"])
+    numpy.testing.assert_array_equal(restored.getOutputValues("categoryOut"),
+                                     [1, -1])
+    self.assertEqual(restored.cacheSize, 10000)
+
+    # and it keeps working after the next compute
+    restored.addDataToQueue("dog", [2], 8)
+    restored.compute({}, self.outputs)
+    self.assertEqual(restored.getOutputValues("sourceOut"), "dog")
+
+
+
+if __name__ == "__main__":
+  unittest.main()
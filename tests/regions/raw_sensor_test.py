@@ -25,7 +25,10 @@ import shutil
 import tempfile
 import unittest
 
+import numpy
+
 from nupic.engine import Network
+from htmresearch.regions.RawSensor import RawSensor
 from htmresearch.support.register_regions import registerAllResearchRegions
 
 
@@ -105,6 +108,49 @@ class RawSensorTest(unittest.TestCase):
                       "Value of sequenceIdOut incorrect")
 
 
+
+class RawSensorQueueTest(unittest.TestCase):
+  """ Tests of the RawSensor queue, calling compute() directly """
+
+  def setUp(self):
+    self.sensor = RawSensor(outputWidth=50)
+    self.outputs = {"dataOut": numpy.zeros(50, dtype="float32"),
+                    "resetOut": numpy.zeros(1, dtype="float32"),
+                    "sequenceIdOut": numpy.zeros(1, dtype="float32")}
+
+
+  def _compute(self):
+    self.sensor.compute({}, self.outputs)
+    return (self.outputs["dataOut"].nonzero()[0].tolist(),
+            int(self.outputs["resetOut"][0]),
+            int(self.outputs["sequenceIdOut"][0]))
+
+
+  def testBatchAndSingleRecordsKeepFIFOOrder(self):
+    self.sensor.addDataToQueue("[1, 2, 3]", "1", "7")
+    self.sensor.addDataBatch(([4, 5, 40, 41, 42], [0, 2, 2, 5]),
+                             [0, 1, 0], [8, 9, 10])
+    self.sensor.addDataToQueue([49], 0, 11)
+
+    self.assertEqual(self._compute(), ([1, 2, 3], 1, 7))
+    self.assertEqual(self._compute(), ([4, 5], 0, 8))
+    self.assertEqual(self._compute(), ([], 1, 9))
+    self.assertEqual(self._compute(), ([40, 41, 42], 0, 10))
+    self.assertEqual(self._compute(), ([49], 0, 11))
+
+    with self.assertRaises(Exception):
+      self._compute()
+
+
+  def testBadInput(self):
+    with self.assertRaises(Exception):
+      self.sensor.addDataToQueue("__import__('os')", 0, 0)
+    with self.assertRaises(ValueError):
+      self.sensor.addDataBatch(([1, 2], [0, 1, 2]), [0], [0, 1])
+    with self.assertRaises(ValueError):
+      self.sensor.addDataBatch(([1, 50], [0, 2]), [0], [0])
+
+
 if __name__ == "__main__":
   unittest.main()
 
@@ -0,0 +1,98 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+import unittest
+
+import numpy
+
+from htmresearch.regions.TMRegion import TMRegion
+
+
+
+class TMRegionTest(unittest.TestCase):
+  """ Checks the incrementally written TMRegion outputs against the TM """
+
+  def _outputs(self, numCells):
+    return {name: numpy.zeros(numCells, dtype="float32")
+            for name in ("bottomUpOut", "activeCells", "predictiveCells",
+                         "predictedActiveCells")}
+
+
+  def _denseCells(self, cells, numCells):
+    dense = numpy.zeros(numCells, dtype="float32")
+    dense[list(cells)] = 1
+    return dense
+
+
+  def testOutputsMatchTMState(self):
+    region = TMRegion(columnCount=64, cellsPerColumn=4, activationThreshold=3,
+                      initialPermanence=0.6, connectedPermanence=0.5,
+                      minThreshold=2, maxNewSynapseCount=6,
+                      defaultOutputType="predictedActiveCells")
+    numCells = 64 * 4
+    outputs = self._outputs(numCells)
+    region.initialize({}, outputs)
+
+    sequence = [numpy.arange(i * 5, i * 5 + 6) % 64 for i in xrange(8)]
+    previouslyPredicted = set()
+    for repetition in xrange(4):
+      for i, columns in enumerate(sequence):
+        bottomUpIn = numpy.zeros(64, dtype="float32")
+        bottomUpIn[columns] = 1
+        reset = int(i == len(sequence) - 1)
+        region.compute({"bottomUpIn": bottomUpIn,
+                        "resetIn": numpy.array([reset])}, outputs)
+
+        activeCells = set(region._tm.getActiveCells())
+        numpy.testing.assert_array_equal(
+          outputs["activeCells"], self._denseCells(activeCells, numCells))
+        numpy.testing.assert_array_equal(
+          outputs["predictedActiveCells"],
+          self._denseCells(activeCells & previouslyPredicted, numCells))
+        numpy.testing.assert_array_equal(outputs["bottomUpOut"],
+                                         outputs["predictedActiveCells"])
+
+        if reset:
+          previouslyPredicted = set()
+        else:
+          previouslyPredicted = set(region._tm.getPredictiveCells())
+          numpy.testing.assert_array_equal(
+            outputs["predictiveCells"],
+            self._denseCells(previouslyPredicted, numCells))
+
+    # The sequence has been learned, so it ends up predicted
+    self.assertTrue(outputs["predictedActiveCells"].any())
+
+
+  def testComputeSparse(self):
+    region = TMRegion(columnCount=32, cellsPerColumn=2)
+    region.initialize({}, self._outputs(64))
+
+    region.computeSparse([1, 5, 9])
+
+    numpy.testing.assert_array_equal(region.getOutputIndices("active"),
+                                     [2, 3, 10, 11, 18, 19])
+    self.assertEqual(len(region.getOutputIndices("predictedActiveCells")), 0)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -53,6 +53,31 @@ class TemporalPoolerRegionTest(unittest.TestCase):
 		                    {1, 5, 10, 3, 17, 40})
 
 
+	def testSpecIsBuiltOnce(self):
+		spec = TemporalPoolerRegion.getSpec()
+		spec["parameters"].pop("columnCount")
+
+		self.assertIn("columnCount", TemporalPoolerRegion.getSpec()["parameters"])
+		self.assertEqual(TemporalPoolerRegion.getSpec(),
+		                 TemporalPoolerRegion.getSpec())
+
+
+	def testUnionOutputIsCleared(self):
+		self.tpRegion = TemporalPoolerRegion(1024, 1024, 10, 0, "union",
+		                                     maxUnionActivity=0.02)
+		self.tpRegion.initialize([], [])
+		outputs = {"mostActiveCells": numpy.zeros(1024, dtype="float32")}
+
+		for active in ([1, 5, 10], [3, 17, 40], [100, 200, 300]):
+			activeCells = numpy.zeros(1024, dtype="float32")
+			activeCells[active] = 1
+			self.tpRegion.compute({"activeCells": activeCells}, outputs)
+
+			self.assertEqual(
+				numpy.flatnonzero(outputs["mostActiveCells"]).tolist(),
+				list(self.tpRegion._pooler.getUnionSDR()))
+
+
 
 if __name__ == "__main__":
 	unittest.main()